@@ -3,41 +3,90 @@
 # номера документа и создания уникального идентификатора.
 
 import re
+from datetime import datetime
+
+# Колонки строки документа в порядке таблицы documents и DataFrame
+COLUMNS = (
+    'number', 'admission_date', 'debited_date',
+    'payer_name', 'payer_inn', 'payer_kpp', 'payer_account',
+    'recipient_name', 'recipient_inn', 'recipient_kpp', 'recipient_account',
+    'summa',
+    'payer_bank_name', 'payer_bank_bik', 'payer_bank_account',
+    'recipient_bank_name', 'recipient_bank_bik', 'recipient_bank_account',
+    'purpose', 'file_path', 'unique_identifier', 'file_hash',
+)
+
+ENTITY_KEYS = ('name', 'inn', 'kpp', 'account')  # Поля плательщика и получателя
+BANK_KEYS = ('name', 'bik', 'account')           # Поля банков
+
+DATE_FORMAT = '%d.%m.%Y'
+
+# Полное наименование организационно-правовой формы, сокращаемое до "ООО"
+LEGAL_FORM_PATTERN = re.compile(r'общество\s+с\s+ограниченной\s*ответственностью', re.IGNORECASE)
+
+# Плоские поля плательщика, получателя и банков, очищаемые clean_newlines
+ENTITY_FIELDS = tuple(f"{prefix}_{key}" for prefix in ('payer', 'recipient') for key in ENTITY_KEYS) + \
+    tuple(f"{prefix}_{key}" for prefix in ('payer_bank', 'recipient_bank') for key in BANK_KEYS)
+
+
+def entity_property(prefix, keys):
+    # Свойство-словарь над плоскими полями с общим префиксом (например, payer -> payer_name, payer_inn, ...).
+    # Возвращает новый словарь при каждом чтении: изменения возвращенного словаря в документ не попадают,
+    # для изменения нужно присвоить словарь целиком или изменить плоское поле.
+    fields = tuple(f"{prefix}_{key}" for key in keys)
+
+    def getter(self):
+        return {key: getattr(self, field) for key, field in zip(keys, fields)}
+
+    def setter(self, values):
+        for key, field in zip(keys, fields):
+            setattr(self, field, values.get(key))
+
+    return property(getter, setter)
 
 
 class PaymentDocument:
     # Содержит информацию о плательщике, получателе, банках, сумме и другие детали платежа.
+    # Данные хранятся в плоских полях (__slots__) без словаря атрибутов на каждый объект;
+    # payer, recipient, payer_bank и recipient_bank доступны как словари для совместимости.
+
+    __slots__ = COLUMNS + ('page_number',)  # page_number - номер страницы в исходном PDF файле, с единицы
+
+    payer = entity_property('payer', ENTITY_KEYS)                  # Информация о плательщике
+    recipient = entity_property('recipient', ENTITY_KEYS)          # Информация о получателе
+    payer_bank = entity_property('payer_bank', BANK_KEYS)          # Банк плательщика
+    recipient_bank = entity_property('recipient_bank', BANK_KEYS)  # Банк получателя
 
     def __init__(self):
-        self.payer = {  # Информация о плательщике
-            "name": None,
-            "inn": None,
-            "kpp": None,
-            "account": None
-        }
-        self.recipient = {  # Информация о получателе
-            "name": None,
-            "inn": None,
-            "kpp": None,
-            "account": None
-        }
-        self.payer_bank = {  # Банк плательщика
-            "name": None,
-            "bik": None,
-            "account": None
-        }
-        self.recipient_bank = {  # Банк получателя
-            "name": None,
-            "bik": None,
-            "account": None
-        }
-        self.summa = None
-        self.admission_date = None
-        self.debited_date = None
-        self.number = None
-        self.purpose = None
-        self.file_path = None
-        self.unique_identifier = None  # Уникальный идентификатор документа
+        for column in COLUMNS:
+            setattr(self, column, None)
+        self.page_number = None
+        # file_hash - SHA-256 исходного PDF файла, unique_identifier - уникальный идентификатор документа
+
+    def as_tuple(self):
+        # Необработанные значения полей в порядке COLUMNS, без очистки и разбора дат.
+        return tuple(getattr(self, column) for column in COLUMNS)
+
+    def __getstate__(self):
+        # Компактное состояние для передачи между процессами: кортеж значений в порядке COLUMNS и номер страницы.
+        return self.as_tuple() + (self.page_number,)
+
+    def __setstate__(self, state):
+        for column, value in zip(COLUMNS + ('page_number',), state):
+            setattr(self, column, value)
+
+    def as_row(self):
+        # Преобразование документа в строку для записи в базу данных: даты в формате datetime.
+        # Аргументы:
+        #   self: Экземпляр класса PaymentDocument.
+
+        # Возвращает:
+        #   dict: Словарь с ключами COLUMNS
+
+        row = {column: getattr(self, column) for column in COLUMNS}
+        row['admission_date'] = datetime.strptime(self.admission_date, DATE_FORMAT) if self.admission_date else None
+        row['debited_date'] = datetime.strptime(self.debited_date, DATE_FORMAT) if self.debited_date else None
+        return row
 
     @staticmethod
     def process_entity_data(entity_str, account_info):
@@ -111,18 +160,13 @@ class PaymentDocument:
         # Возвращает:
         #   None: Производится изменение в атрибутах объекта на месте
 
-        for attr in [self.payer, self.recipient, self.payer_bank, self.recipient_bank]:
-            updated_attr = {}
-            for key, value in attr.items():  # Перебор ключей и значений в каждом атрибуте
-                if isinstance(value, str):
-                    # Сокращение длинного названия
-                    value = re.sub(r'общество\s+с\s+ограниченной\s*ответственностью', 'ООО', value, flags=re.IGNORECASE)
+        for field in ENTITY_FIELDS:
+            value = getattr(self, field)
+            if isinstance(value, str):
+                # Сокращение длинного названия
+                value = LEGAL_FORM_PATTERN.sub('ООО', value)
 
-                    value = value.replace('\n', '')  # Удаление переносов строк
-                updated_attr[key] = value  # Добавление обновленного значения в словарь
-            attr.clear()
-            attr.update(updated_attr)  # Обновление оригинального словаря новыми значениями
+                setattr(self, field, value.replace('\n', ''))  # Удаление переносов строк
 
         if isinstance(self.purpose, str):
             self.purpose = self.purpose.replace('\n', '')  # Удаление переносов строк в назначении платежа
-
@@ -0,0 +1,201 @@
+# backends: Способы чтения страниц PDF для process_page.
+# Страница любого способа предоставляет bbox, chars (словари символов с координатами в системе pdfplumber)
+# и extract_words(), поэтому индекс символов, кэш шаблонов и определение областей работают одинаково.
+#   pdfplumber - страницы pdfplumber со всеми атрибутами объектов (способ по умолчанию).
+#   pdfminer   - облегченный способ: символы собираются напрямую из интерпретатора pdfminer без построения
+#                объектов LTChar и страниц pdfplumber; у символа только поля, нужные для извлечения текста.
+
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+from pdfminer.utils import apply_matrix_rect
+import pdfplumber
+from pdfplumber.page import _invert_box, _normalize_box
+from pdfplumber.utils import extract_words
+
+from sources import open_input
+
+DEFAULT_BACKEND = 'pdfplumber'
+
+
+class PdfplumberBackend:
+    # Чтение страниц через pdfplumber.
+
+    name = 'pdfplumber'
+
+    @staticmethod
+    def open(pdf_path, page_range=None):
+        # Аргументы:
+        #   pdf_path (str): Путь к PDF файлу, в том числе внутри архива (см. sources).
+        #   page_range (range): Номера страниц с нуля, которые нужно прочитать; None - все страницы.
+
+        # Возвращает:
+        #   pdfplumber.PDF: Объект PDF файла, открытый для чтения (контекстный менеджер со списком pages)
+        stream = open_input(pdf_path)
+        try:
+            pages = None if page_range is None else [number + 1 for number in page_range]
+            pdf = pdfplumber.open(stream, pages=pages)
+        except Exception:
+            stream.close()
+            raise
+        pdf.stream_is_external = False  # Поток закрывается вместе с PDF файлом
+        return pdf
+
+
+class CharCollector(PDFTextDevice):
+    # Устройство вывода pdfminer, сохраняющее только символы страницы в виде кортежей
+    # (текст, x0, y0, x1, y1, upright, size) в координатах PDF.
+
+    def __init__(self, rsrcmgr):
+        PDFTextDevice.__init__(self, rsrcmgr)
+        self.chars = []
+
+    def begin_page(self, page, ctm):
+        self.chars = []
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate):
+        # Расчет положения символа так же, как в конструкторе pdfminer LTChar.
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = f"(cid:{cid})"
+        adv = font.char_width(cid) * fontsize * scaling
+        if font.is_vertical():
+            vx, vy = font.char_disp(cid)
+            vx = fontsize * 0.5 if vx is None else vx * fontsize * 0.001
+            vy = (1000 - vy) * fontsize * 0.001
+            bbox = (-vx, vy + rise + adv, -vx + fontsize, vy + rise)
+        else:
+            descent = font.get_descent() * fontsize
+            bbox = (0, descent + rise, adv, descent + rise + fontsize)
+        a, b, c, d = matrix[:4]
+        x0, y0, x1, y1 = apply_matrix_rect(matrix, bbox)
+        if x1 < x0:
+            x0, x1 = x1, x0
+        if y1 < y0:
+            y0, y1 = y1, y0
+        size = x1 - x0 if font.is_vertical() else y1 - y0
+        self.chars.append((text, x0, y0, x1, y1, a * d * scaling > 0 and b * c <= 0, size))
+        return adv
+
+
+class LeanPage:
+    # Страница облегченного способа: размер страницы и символы в системе координат pdfplumber.
+
+    def __init__(self, page_obj, raw_chars, initial_doctop=0):
+        # Аргументы:
+        #   page_obj (pdfminer.pdfpage.PDFPage): Страница pdfminer.
+        #   raw_chars (list): Символы CharCollector.
+        #   initial_doctop (float): Смещение страницы от начала документа, как у pdfplumber.
+
+        rotation = page_obj.rotate % 360
+        mb_raw = _normalize_box(page_obj.mediabox, rotation)
+        self.bbox = _invert_box(mb_raw, mb_raw[3] - mb_raw[1])  # Совпадает с pdfplumber Page.bbox
+        mb_x0, mb_top = self.bbox[:2]
+        height = self.bbox[3] - self.bbox[1]
+        self.chars = [
+            {'text': text, 'x0': x0 + mb_x0, 'x1': x1 + mb_x0,
+             'top': height - y1 + mb_top, 'bottom': height - y0 + mb_top,
+             'doctop': initial_doctop + height - y1 + mb_top, 'upright': upright, 'size': size}
+            for text, x0, y0, x1, y1, upright, size in raw_chars
+        ]
+
+    @property
+    def height(self):
+        return self.bbox[3] - self.bbox[1]
+
+    def extract_words(self, **kwargs):
+        # Группировка символов в слова тем же алгоритмом, что и pdfplumber Page.extract_words().
+        return extract_words(self.chars, **kwargs)
+
+    def close(self):
+        self.chars = []
+
+
+class LeanDocument:
+    # PDF файл облегченного способа; страницы разбираются по одной при обходе pages.
+
+    def __init__(self, pdf_path, page_range=None):
+        self.page_range = page_range
+        self.file = open_input(pdf_path)
+        try:
+            self.document = PDFDocument(PDFParser(self.file))
+        except Exception:
+            self.file.close()
+            raise
+        self.resource_manager = PDFResourceManager(caching=True)
+
+    @property
+    def pages(self):
+        collector = CharCollector(self.resource_manager)
+        interpreter = PDFPageInterpreter(self.resource_manager, collector)
+        doctop = 0
+        for number, page_obj in enumerate(PDFPage.create_pages(self.document)):
+            if self.page_range is not None:
+                if number >= self.page_range.stop:
+                    break
+                if number not in self.page_range:
+                    continue
+            interpreter.process_page(page_obj)
+            page = LeanPage(page_obj, collector.chars, doctop)
+            doctop += page.height
+            yield page
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class PdfminerBackend:
+    # Облегченное чтение страниц напрямую через интерпретатор pdfminer.
+
+    name = 'pdfminer'
+
+    @staticmethod
+    def open(pdf_path, page_range=None):
+        # Аргументы:
+        #   pdf_path (str): Путь к PDF файлу.
+        #   page_range (range): Номера страниц с нуля, которые нужно прочитать; None - все страницы.
+
+        # Возвращает:
+        #   LeanDocument: Объект PDF файла, открытый для чтения (контекстный менеджер с итератором pages)
+        return LeanDocument(pdf_path, page_range)
+
+
+def page_count(pdf_path):
+    # Количество страниц PDF файла по каталогу документа, без разбора содержимого страниц.
+    # Аргументы:
+    #   pdf_path (str): Путь к PDF файлу, в том числе внутри архива.
+
+    # Возвращает:
+    #   int: Количество страниц
+
+    with open_input(pdf_path) as file:
+        document = PDFDocument(PDFParser(file))
+        count = resolve1(resolve1(document.catalog.get('Pages')) or {}).get('Count')
+        if isinstance(count, int):
+            return count
+        return sum(1 for _ in PDFPage.create_pages(document))  # Дерево страниц без /Count
+
+
+BACKENDS = {backend.name: backend for backend in (PdfplumberBackend, PdfminerBackend)}
+
+
+def get_backend(name=DEFAULT_BACKEND):
+    # Получение способа чтения по названию; название, а не объект, передается в процессы пула.
+    # Исключения:
+    #   ValueError: Неизвестное название способа.
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный способ чтения PDF: {name}; доступны: {', '.join(BACKENDS)}")
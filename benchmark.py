@@ -0,0 +1,284 @@
+# benchmark: Измерение производительности разбора PDF и сохранения в базу данных.
+# Генерирует синтетические платежные поручения с теми же опорными словами и разметкой, которые ожидает
+# determine_coordinates, измеряет скорость (страниц в секунду) и пиковый RSS каждого этапа
+# и сохраняет результаты в JSON для сравнения запусков.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import pdfplumber
+
+import bd
+import dataframe
+import main
+import pdf_parser
+from memory import peak_rss_kb, reset_peak_rss
+from page_index import PageCharIndex
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # Размер страницы A4 в пунктах
+FONT_SIZE = 8
+CHAR_WIDTH = 600  # Ширина каждого символа шрифта в тысячных долях кегля
+
+# Однобайтовая кодировка генерируемого шрифта: коды 128 и выше - кириллица и знак номера
+CYRILLIC = [chr(code) for code in range(0x410, 0x450)] + ['Ё', 'ё', '№']
+ENCODING = {char: 128 + i for i, char in enumerate(CYRILLIC)}
+
+STAGES = ('word_extraction', 'rect_resolution', 'field_extraction', 'dataframe_build', 'db_write')
+
+
+def encode_text(text):
+    # Кодирование строки в шестнадцатеричную строку PDF в кодировке генерируемого шрифта.
+    data = bytes(ENCODING.get(char, ord(char)) for char in text)
+    return '<' + data.hex() + '>'
+
+
+def payment_order_items(rnd, number):
+    # Формирование текстовых элементов одной страницы платежного поручения.
+    # Координаты подобраны под смещения областей в determine_coordinates.
+    # Аргументы:
+    #   rnd (random.Random): Генератор случайных чисел.
+    #   number (int): Номер платежного поручения.
+
+    # Возвращает:
+    #   list: Список кортежей (x, top, текст)
+
+    date = f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.2024"
+    payer_inn = str(rnd.randint(10 ** 9, 10 ** 10 - 1))
+    recipient_inn = str(rnd.randint(10 ** 9, 10 ** 10 - 1))
+
+    def digits(count):
+        return ''.join(rnd.choice('0123456789') for _ in range(count))
+
+    return [
+        (42, 58, date), (182, 58, date),
+        (40, 72, "Поступ. в банк плат."), (180, 72, "Списано со сч. плат."),
+        (40, 110, f"ПЛАТЕЖНОЕ ПОРУЧЕНИЕ № {number}"),
+        (40, 140, "Сумма прописью"), (120, 140, "Двадцать тысяч рублей 00 копеек"),
+        (40, 180, f"ИНН {payer_inn} КПП {payer_inn[:4]}01001"),
+        (330, 180, "Сумма"), (370, 180, f"{rnd.randint(100, 999999)}-{rnd.randint(0, 99):02d}"),
+        (40, 195, "Общество с ограниченной"), (40, 205, f"ответственностью \"Ромашка-{number}\""),
+        (370, 212, digits(20)),
+        (40, 225, "Плательщик"),
+        (40, 245, "АО БАНК ПЕРВЫЙ Г. МОСКВА"), (330, 245, "БИК"), (370, 245, '04' + digits(7)),
+        (330, 262, "Сч. №"), (370, 262, digits(20)),
+        (40, 265, "Банк плательщика"),
+        (40, 285, "ПАО БАНК ВТОРОЙ Г. КАЗАНЬ"),
+        (40, 300, "Банк получателя"), (330, 300, "БИК"), (370, 300, '04' + digits(7)),
+        (330, 318, "Сч. №"), (370, 318, digits(20)),
+        (40, 345, f"ИНН {recipient_inn} КПП {recipient_inn[:4]}01001"),
+        (370, 352, digits(20)),
+        (40, 360, f"ООО \"Лютик-{number}\""),
+        (40, 385, "Получатель"),
+        (40, 410, f"Оплата по договору № {number} от {date}"), (40, 420, "НДС не облагается"),
+        (40, 440, "Назначение платежа"),
+    ]
+
+
+def build_payment_order_pdf(path, pages, seed=0, first_number=1):
+    # Генерация PDF файла с платежными поручениями, по одному на страницу, без внешних библиотек.
+    # Аргументы:
+    #   path (str): Путь к создаваемому файлу.
+    #   pages (int): Количество страниц.
+    #   seed (int): Начальное значение генератора случайных чисел.
+    #   first_number (int): Номер первого платежного поручения.
+
+    # Возвращает:
+    #   None
+
+    rnd = random.Random(seed)
+    differences = ' '.join(f"/uni{ord(char):04X}" for char in CYRILLIC)
+    widths = ' '.join([str(CHAR_WIDTH)] * 224)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Дерево страниц заполняется после создания страниц
+        (f"<< /Type /Font /Subtype /Type1 /BaseFont /PPBenchMono /FirstChar 32 /LastChar 255 /Widths [{widths}] "
+         f"/FontDescriptor 4 0 R /Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding "
+         f"/Differences [128 {differences}] >> >>").encode('latin-1'),
+        (b"<< /Type /FontDescriptor /FontName /PPBenchMono /Flags 33 /FontBBox [0 -200 600 800] "
+         b"/ItalicAngle 0 /Ascent 800 /Descent -200 /CapHeight 700 /StemV 80 >>"),
+    ]
+    kids = []
+    for i in range(pages):
+        lines = ["BT", f"/F1 {FONT_SIZE} Tf"]
+        for x, top, text in payment_order_items(rnd, first_number + i):
+            lines.append(f"1 0 0 1 {x} {PAGE_HEIGHT - top - FONT_SIZE} Tm {encode_text(text)} Tj")
+        lines.append("ET")
+        stream = "\n".join(lines).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>").encode('latin-1'))
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode('latin-1')
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, 'wb') as file:
+        file.write(output)
+
+
+def generate_dataset(folder, files, pages, seed=0):
+    # Генерация набора PDF файлов для измерений.
+    # Аргументы:
+    #   folder (str): Папка для файлов.
+    #   files (int): Количество файлов.
+    #   pages (int): Количество страниц в каждом файле.
+    #   seed (int): Начальное значение генератора случайных чисел.
+
+    # Возвращает:
+    #   None
+
+    os.makedirs(folder, exist_ok=True)
+    for i in range(files):
+        build_payment_order_pdf(os.path.join(folder, f"payment_orders_{i:04d}.pdf"), pages,
+                                seed=seed + i, first_number=i * pages + 1)
+
+
+class StageMeter:
+    # Накопление времени и пикового RSS по этапам.
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.peak_rss_kb = dict.fromkeys(STAGES, 0)
+
+    def measure(self, stage, func, *args):
+        # Выполнение func(*args) с учетом времени и пикового RSS в этапе stage.
+        reset_peak_rss()
+        start = time.perf_counter()
+        result = func(*args)
+        self.seconds[stage] += time.perf_counter() - start
+        self.peak_rss_kb[stage] = max(self.peak_rss_kb[stage], peak_rss_kb())
+        return result
+
+
+def run_benchmark(folder, con_string):
+    # Прогон всех этапов по файлам папки.
+    # Аргументы:
+    #   folder (str): Папка с PDF файлами.
+    #   con_string (str): Строка подключения к базе данных для этапа записи.
+
+    # Возвращает:
+    #   dict: Результаты по этапам: время, страниц в секунду, пиковый RSS
+
+    meter = StageMeter()
+    pages_total = 0
+    documents = []
+    for filename in pdf_parser.get_pdf_files(folder):
+        pdf_path = os.path.join(folder, filename)
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                pages_total += 1
+                word_categories = meter.measure('word_extraction', pdf_parser.extract_words_from_page, page)
+                rects = meter.measure('rect_resolution', pdf_parser.determine_coordinates, word_categories)
+                if rects is not None:
+                    meter.measure('field_extraction', lambda: PageCharIndex(page).texts_in_rects(rects))
+        # Документы для этапов DataFrame и записи в базу данных
+        documents += pdf_parser.process_pdf_file(filename, folder)
+
+    df = meter.measure('dataframe_build', dataframe.create_dataframe, documents)
+
+    engine = bd.get_engine(con_string)
+    bd.ensure_schema(engine)  # Создание таблиц вне замера этапа записи
+    meter.measure('db_write', main.save_to_database_bulk, df, con_string, 1000, engine)
+    engine.dispose()
+
+    return {
+        stage: {
+            'seconds': round(meter.seconds[stage], 4),
+            'pages_per_second': round(pages_total / meter.seconds[stage], 2) if meter.seconds[stage] else None,
+            'peak_rss_kb': meter.peak_rss_kb[stage],
+        } for stage in STAGES
+    }, pages_total
+
+
+def git_revision():
+    # Текущая ревизия git для привязки результатов к коду.
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(current, previous):
+    # Вывод изменения скорости этапов относительно предыдущего запуска.
+    # Аргументы:
+    #   current (dict): Результаты текущего запуска.
+    #   previous (dict): Результаты предыдущего запуска.
+
+    # Возвращает:
+    #   None
+
+    print(f"Сравнение с запуском {previous.get('revision')} от {previous.get('started_at')}:")
+    for stage in STAGES:
+        old = previous['stages'].get(stage, {}).get('pages_per_second')
+        new = current['stages'][stage]['pages_per_second']
+        if old and new:
+            print(f"  {stage:18} {old:>10.1f} -> {new:>10.1f} стр/с ({(new - old) / old * 100:+.1f}%)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Измерение производительности разбора и сохранения платежных поручений")
+    parser.add_argument('--files', type=int, default=5, help="Количество генерируемых PDF файлов")
+    parser.add_argument('--pages', type=int, default=50, help="Количество страниц в каждом файле")
+    parser.add_argument('--seed', type=int, default=0, help="Начальное значение генератора случайных чисел")
+    parser.add_argument('--db', default=None,
+                        help="Строка подключения к базе данных; по умолчанию временная база SQLite")
+    parser.add_argument('--output-dir', default='benchmarks', help="Папка для сохранения результатов")
+    parser.add_argument('--compare', default=None, help="Файл результатов предыдущего запуска для сравнения")
+    return parser.parse_args(argv)
+
+
+def main_benchmark(argv=None):
+    args = parse_args(argv)
+    logging.disable(logging.INFO)  # Журналирование каждой страницы искажает измерения
+    started_at = datetime.now()
+    with tempfile.TemporaryDirectory() as workdir:
+        folder = os.path.join(workdir, 'input')
+        generate_dataset(folder, args.files, args.pages, args.seed)
+        con_string = args.db or f"sqlite:///{os.path.join(workdir, 'benchmark.sqlite3')}"
+        stages, pages_total = run_benchmark(folder, con_string)
+
+    results = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'files': args.files,
+        'pages_per_file': args.pages,
+        'pages_total': pages_total,
+        'database': 'sqlite' if args.db is None else args.db.split(':', 1)[0],
+        'stages': stages,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"benchmark_{started_at:%Y%m%d_%H%M%S}.json")
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+
+    for stage in STAGES:
+        result = stages[stage]
+        print(f"{stage:18} {result['seconds']:>9.3f} с {result['pages_per_second'] or 0:>10.1f} стр/с "
+              f"пиковый RSS {result['peak_rss_kb'] / 1024:>8.1f} МБ")
+    print(f"Результаты сохранены в {output_path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            compare_results(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main_benchmark()
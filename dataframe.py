@@ -1,63 +1,101 @@
 # dataframe: Создание и обработка DataFrame.
-# Включает функции для чтения файлов, преобразования данных в формат DataFrame.
+# Включает функции для преобразования данных в формат DataFrame и в строки для записи в базу данных.
 
 
-import pandas as pd
 from datetime import datetime
 
+from PaymentDocument_Class import COLUMNS, DATE_FORMAT, ENTITY_FIELDS, LEGAL_FORM_PATTERN
+from metrics import metrics
 
-def create_dataframe(documents):
+
+def create_rows(documents):
+    # Преобразование обработанных платежных документов в строки для записи в базу данных без pandas.
+    # Аргументы:
+    #   documents (list): Список экземпляров класса PaymentDocument.
+
+    # Возвращает:
+    #   list: Список словарей с ключами COLUMNS
+
+    rows = []
+    for doc in documents:  # Перебор документов для обработки
+        with metrics.timer('dataframe.clean_newlines'):
+            doc.clean_newlines()  # Очистка данных документа от переносов строк
+        with metrics.timer('dataframe.as_row'):
+            rows.append(doc.as_row())  # Содержимое файла хранится отдельно, в строке только file_hash
+    return rows
+
+
+def create_dataframe(documents, vectorized=True):
     # Создание DataFrame из списка обработанных платежных документов.
+    # pandas импортируется только здесь, чтобы запуски без DataFrame не тратили время на его загрузку.
     # Аргументы:
     #   documents (list): Список экземпляров класса PaymentDocument.
+    #   vectorized (bool): Нормализация целыми колонками (normalize_dataframe) вместо очистки каждого документа;
+    #                      результат совпадает, но сами документы в этом режиме не изменяются.
 
     # Возвращает:
     #   DataFrame: Pandas DataFrame с данными из платежных документов
 
-    data = []
+    import pandas as pd
 
-    for doc in documents:  # Перебор документов для обработки
-        doc.clean_newlines()  # Очистка данных документа от переносов строк
-
-        # Добавление данных документа в список
-        data.append({
-            'number': doc.number,
-            'admission_date': datetime.strptime(doc.admission_date, '%d.%m.%Y') if doc.admission_date else None,
-            'debited_date': datetime.strptime(doc.debited_date, '%d.%m.%Y')if doc.debited_date else None,
-            'payer_name': doc.payer.get('name'),
-            'payer_inn': doc.payer.get('inn'),
-            'payer_kpp': doc.payer.get('kpp'),
-            'payer_account': doc.payer.get('account'),
-            'recipient_name': doc.recipient.get('name'),
-            'recipient_inn': doc.recipient.get('inn'),
-            'recipient_kpp': doc.recipient.get('kpp'),
-            'recipient_account': doc.recipient.get('account'),
-            'summa': doc.summa,
-            'payer_bank_name': doc.payer_bank.get('name'),
-            'payer_bank_bik': doc.payer_bank.get('bik'),
-            'payer_bank_account': doc.payer_bank.get('account'),
-            'recipient_bank_name': doc.recipient_bank.get('name'),
-            'recipient_bank_bik': doc.recipient_bank.get('bik'),
-            'recipient_bank_account': doc.recipient_bank.get('account'),
-            'purpose': doc.purpose,
-            'file_path': doc.file_path,
-            'unique_identifier': doc.unique_identifier,
-            'file_content': read_file_content(doc.file_path)    # Чтение содержимого файла документа
-        })
-
-    df = pd.DataFrame(data)  # Создание DataFrame из списка данных
+    if vectorized:
+        with metrics.timer('dataframe.build'):
+            df = pd.DataFrame.from_records([doc.as_tuple() for doc in documents], columns=list(COLUMNS))
+        with metrics.timer('dataframe.normalize'):
+            return normalize_dataframe(df)
+
+    rows = create_rows(documents)
+    with metrics.timer('dataframe.build'):
+        df = pd.DataFrame(rows, columns=list(COLUMNS))  # Создание DataFrame из списка строк
 
     return df
 
 
-def read_file_content(file_path):
-    # Чтение содержимого файла по указанному пути.
+def normalize_dataframe(df):
+    # Нормализация необработанных колонок документов так же, как clean_newlines и as_row делают это построчно:
+    # сокращение наименования ООО и удаление переносов строк в данных сторон и банков, удаление переносов
+    # в назначении платежа, разбор дат и приведение суммы к числу.
     # Аргументы:
-    #   file_path (str): Путь к файлу.
+    #   df (pandas.DataFrame): DataFrame с колонками COLUMNS и необработанными значениями.
 
     # Возвращает:
-    #   bytes: Содержимое файла в бинарном формате
+    #   DataFrame: Тот же DataFrame с нормализованными колонками
+
+    import pandas as pd
+
+    # Единица дат берется из построчного пути (DataFrame из объектов datetime): ns в pandas 2, us в pandas 3
+    date_dtype = pd.Series([datetime(2000, 1, 1)]).dtype
+    for column in ENTITY_FIELDS:
+        df[column] = clean_column(df[column], LEGAL_FORM_PATTERN)
+    df['purpose'] = clean_column(df['purpose'])
+    for column in ('admission_date', 'debited_date'):
+        # Пустые строки, как и в as_row, дают пропущенную дату; колонка без единой даты остается типа object
+        dates = df[column].where(df[column].astype(bool), None) if len(df) else df[column]
+        if dates.notna().any():
+            df[column] = pd.to_datetime(dates, format=DATE_FORMAT).astype(date_dtype)
+        else:
+            df[column] = pd.Series([None] * len(df), index=df.index, dtype=object)
+    if df['summa'].notna().any():
+        df['summa'] = pd.to_numeric(df['summa'])  # Парсер уже возвращает float; приведение на случай строк
+    return df
+
+
+def clean_column(column, pattern=None):
+    # Удаление переносов строк (и при заданном pattern - сокращение до "ООО") в строковых значениях колонки.
+    # Колонка строкового типа обрабатывается целиком; в колонке типа object значения, не являющиеся строками
+    # (None), остаются без изменений, как и при построчной очистке.
+    if column.dtype == object:
+        is_string = column.map(lambda value: isinstance(value, str))
+        if not is_string.any():
+            return column
+        # Строки обрабатываются как колонка типа string и возвращаются в object, как в построчном пути
+        strings = replace_strings(column[is_string].astype('string'), pattern).astype(object)
+        return column.mask(is_string, strings)
+    return replace_strings(column, pattern)
+
 
-    with open(file_path, 'rb') as file:
-        file_content = file.read()
-    return file_content
+def replace_strings(column, pattern=None):
+    # Сокращение до "ООО" (при заданном pattern) и удаление переносов строк в колонке строкового типа.
+    if pattern is not None:
+        column = column.str.replace(pattern, 'ООО', regex=True)
+    return column.str.replace('\n', '', regex=False)
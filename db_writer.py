@@ -0,0 +1,115 @@
+# db_writer: Фоновая запись документов в базу данных, параллельно с разбором PDF.
+# Разбор передает порции документов через ограниченную очередь; когда база данных не успевает,
+# очередь заполняется и разбор приостанавливается до освобождения места (обратное давление).
+# При закрытии все поставленные в очередь порции записываются или попадают в итоговый отчет об ошибках.
+
+import logging
+import queue
+import threading
+
+from metrics import metrics
+
+STOP = object()  # Признак завершения очереди
+
+
+class DatabaseWriter:
+    # Поток записи порций документов из ограниченной очереди.
+
+    def __init__(self, persist, on_saved=None, queue_size=4):
+        # Аргументы:
+        #   persist (callable): Функция (documents) -> bool для записи порции; True, если порция записана без ошибок.
+        #   on_saved (callable): Функция (completed) -> None, вызываемая после успешной записи порции
+        #                        со списком файлов, все документы которых вошли в записанные порции;
+        #                        файлы, документы которых были в незаписанной порции, в список не попадают.
+        #   queue_size (int): Максимальное количество порций, ожидающих записи.
+
+        self.persist = persist
+        self.on_saved = on_saved
+        self.queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.stats = {'chunks': 0, 'documents': 0, 'failed_chunks': 0, 'failed_files': []}
+        self.failed = set()  # Пути файлов (file_path документов), документы которых были в незаписанной порции
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, documents, completed=()):
+        # Постановка порции в очередь записи; при заполненной очереди ожидает освобождения места.
+        # Аргументы:
+        #   documents (list): Документы порции.
+        #   completed (list): Пути файлов, последний документ которых входит в порцию.
+
+        # Исключения:
+        #   RuntimeError: Запись уже закрыта или поток записи завершился.
+
+        if self.closed or not self.thread.is_alive():
+            raise RuntimeError("Запись в базу данных уже остановлена")
+        try:
+            self.queue.put_nowait((documents, list(completed)))
+            return
+        except queue.Full:
+            pass
+        metrics.incr('writer.backpressure')  # База данных не успевает за разбором
+        with metrics.timer('writer.backpressure_wait'):
+            self.queue.put((documents, list(completed)))
+
+    def run(self):
+        # Цикл потока записи: порции записываются в порядке постановки в очередь.
+        while True:
+            item = self.queue.get()
+            try:
+                if item is STOP:
+                    return
+                self.write(*item)
+            finally:
+                self.queue.task_done()
+
+    def write(self, documents, completed):
+        # Запись одной порции; ошибка не останавливает поток, файлы порции попадают в отчет.
+        try:
+            with metrics.timer('writer.persist'):
+                saved = self.persist(documents)
+        except Exception as e:
+            logging.error(f"Ошибка записи порции из {len(documents)} документов: {e}")
+            saved = False
+        self.stats['chunks'] += 1
+        self.stats['documents'] += len(documents)
+        if not saved:
+            # Все файлы порции, а не только завершенные в ней: их последние документы могут прийти позже
+            self.stats['failed_chunks'] += 1
+            failed = {doc.file_path for doc in documents}.union(completed) - self.failed
+            self.failed.update(failed)
+            self.stats['failed_files'].extend(sorted(failed))
+            return
+        completed = [path for path in completed if path not in self.failed]
+        if self.on_saved is not None and completed:
+            try:
+                self.on_saved(completed)
+            except Exception as e:
+                logging.error(f"Ошибка при отметке сохраненных файлов: {e}")
+
+    def flush(self):
+        # Ожидание записи всех порций, поставленных в очередь.
+        self.queue.join()
+
+    def close(self):
+        # Запись оставшихся порций и остановка потока.
+        # Возвращает:
+        #   dict: Итоги записи: chunks, documents, failed_chunks и failed_files (файлы, не отмеченные сохраненными)
+
+        if not self.closed:
+            self.closed = True
+            self.queue.put(STOP)
+            self.thread.join()
+            if self.stats['failed_chunks']:
+                logging.error(f"Не записано порций: {self.stats['failed_chunks']}; файлы будут обработаны "
+                              f"повторно при следующем запуске: {', '.join(self.stats['failed_files']) or 'нет'}")
+            logging.info(f"Фоновая запись завершена: порций {self.stats['chunks']}, "
+                         f"документов {self.stats['documents']}")
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,140 @@
+# duplicate_filter: Отсев уже сохраненных документов до записи в базу данных.
+# В начале запуска загружает уникальные идентификаторы из таблицы documents (для больших таблиц - в фильтр Блума)
+# и отбрасывает строки с известными идентификаторами, не отправляя их в базу данных.
+# При нормализованном хранении идентификаторы загружаются и из document_facts: документ, сохраненный
+# в documents до перехода, не записывается повторно (он переносится migrations.py --normalize).
+
+import hashlib
+import logging
+import math
+import threading
+
+from sqlalchemy import func, select
+
+import bd
+
+BLOOM_THRESHOLD = 1000000  # Количество документов, начиная с которого вместо множества используется фильтр Блума
+BLOOM_ERROR_RATE = 0.001   # Доля ложных срабатываний фильтра Блума
+CONFIRM_CHUNK_SIZE = 500   # Количество идентификаторов в одном запросе проверки
+
+
+class BloomFilter:
+    # Фильтр Блума: компактное вероятностное множество без ложных отрицаний.
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        # Аргументы:
+        #   capacity (int): Ожидаемое количество элементов.
+        #   error_rate (float): Допустимая доля ложных срабатываний.
+
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))  # Количество бит
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value):
+        # Номера бит элемента по схеме двойного хеширования на основе одного BLAKE2b.
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class DuplicateFilter:
+    # Отсев документов, уникальный идентификатор которых уже есть в таблице documents.
+    # Идентификаторы загружаются при первом обращении; совпадения фильтра Блума подтверждаются запросом
+    # к базе данных, поэтому новый документ никогда не отбрасывается по ошибке.
+
+    def __init__(self, engine, bloom_threshold=BLOOM_THRESHOLD, tables=None):
+        # Аргументы:
+        #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+        #   bloom_threshold (int): Количество документов, начиная с которого используется фильтр Блума.
+        #   tables (list): Таблицы документов; документ отсеивается, если он есть хотя бы в одной из них.
+        #                  По умолчанию documents, для нормализованного хранения - documents и document_facts.
+
+        self.engine = engine
+        self.columns = [table.c.unique_identifier for table in (tables or [bd.Document.__table__])]
+        self.bloom_threshold = bloom_threshold
+        self.known = None  # set или BloomFilter после загрузки
+        self.lock = threading.Lock()
+
+    def load(self):
+        # Загрузка идентификаторов сохраненных документов.
+        with self.engine.connect() as connection:
+            count = sum(connection.execute(select(func.count()).where(column.isnot(None))).scalar()
+                        for column in self.columns)
+            if count >= self.bloom_threshold:
+                known = BloomFilter(count * 2)  # Запас на документы, добавляемые во время работы
+            else:
+                known = set()
+            add = known.add
+            for column in self.columns:
+                result = connection.execution_options(stream_results=True, yield_per=10000) \
+                    .execute(select(column).where(column.isnot(None)))
+                for (unique_identifier,) in result:
+                    add(unique_identifier)
+        self.known = known
+        logging.info(f"Загружено идентификаторов сохраненных документов: {count}"
+                     f"{' (фильтр Блума)' if isinstance(known, BloomFilter) else ''}")
+
+    def confirm(self, candidates):
+        # Проверка по базе данных идентификаторов, совпавших в фильтре Блума.
+        # Аргументы:
+        #   candidates (list): Идентификаторы для проверки.
+
+        # Возвращает:
+        #   set: Идентификаторы, действительно присутствующие в одной из таблиц документов
+
+        existing = set()
+        with self.engine.connect() as connection:
+            for column in self.columns:
+                remaining = [candidate for candidate in candidates if candidate not in existing]
+                for start in range(0, len(remaining), CONFIRM_CHUNK_SIZE):
+                    chunk = remaining[start:start + CONFIRM_CHUNK_SIZE]
+                    existing.update(connection.execute(select(column).where(column.in_(chunk))).scalars())
+        return existing
+
+    def filter_rows(self, rows):
+        # Отсев строк с известными идентификаторами и повторов внутри самих строк.
+        # Строки без идентификатора не отсеиваются.
+        # Аргументы:
+        #   rows (list): Строки документов с заполненным ключом unique_identifier.
+
+        # Возвращает:
+        #   tuple: Список новых строк и количество отброшенных дубликатов
+
+        with self.lock:
+            if self.known is None:
+                self.load()
+            candidates = {row['unique_identifier'] for row in rows
+                          if row['unique_identifier'] is not None and row['unique_identifier'] in self.known}
+        if candidates and isinstance(self.known, BloomFilter):
+            candidates = self.confirm(list(candidates))
+
+        new_rows, seen = [], set()
+        for row in rows:
+            unique_identifier = row['unique_identifier']
+            if unique_identifier is not None:
+                if unique_identifier in candidates or unique_identifier in seen:
+                    continue
+                seen.add(unique_identifier)
+            new_rows.append(row)
+        return new_rows, len(rows) - len(new_rows)
+
+    def contains(self, unique_identifier):
+        # Проверка одного идентификатора (используется при построчном сохранении).
+        return unique_identifier is not None and not self.filter_rows([{'unique_identifier': unique_identifier}])[0]
+
+    def add(self, unique_identifiers):
+        # Добавление идентификаторов после фиксации записи в базе данных.
+        with self.lock:
+            if self.known is not None:
+                for unique_identifier in unique_identifiers:
+                    if unique_identifier is not None:
+                        self.known.add(unique_identifier)
@@ -0,0 +1,98 @@
+# file_store: Хранение исходных PDF файлов в базе данных без дублирования.
+# Содержимое каждого файла записывается один раз в таблицу files с ключом SHA-256,
+# документы ссылаются на него по хешу (колонка file_hash).
+
+import hashlib
+import logging
+import mmap
+
+from sqlalchemy import select
+
+import bd
+from sources import open_input
+
+HASH_CHUNK_SIZE = 1024 * 1024  # Размер блока при вычислении хеша файла
+
+
+def file_sha256(file_path):
+    # Вычисление SHA-256 содержимого файла с чтением по блокам.
+    # Аргументы:
+    #   file_path (str): Путь к файлу, в том числе внутри архива (см. sources).
+
+    # Возвращает:
+    #   str: Хеш содержимого в шестнадцатеричном виде
+
+    digest = hashlib.sha256()
+    with open_input(file_path) as file:
+        for block in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def map_content(file):
+    # Отображение содержимого открытого файла в память без чтения в буфер процесса.
+    # Возвращает:
+    #   mmap.mmap: Отображение только для чтения или None, если файл не отображается
+    #              (файл архива в памяти, пустой файл)
+
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def store_file(connection, file_hash, file_path):
+    # Запись содержимого файла в таблицу files, если файла с таким хешем еще нет.
+    # Содержимое передается одним параметром одного INSERT: дозапись блоками через UPDATE ... CONCAT
+    # заставляет сервер переписывать весь BLOB на каждом блоке. В MySQL запрос с файлом должен помещаться
+    # в max_allowed_packet сервера (по умолчанию 64 МБ), поэтому для больших выгрузок его нужно увеличить
+    # до размера самого большого файла с запасом.
+    # Файл не читается в память процесса, а отображается через mmap: страницы берутся из кэша ОС и могут
+    # быть вытеснены; перед записью содержимое сверяется с file_hash. Драйвер SQLite передает отображение
+    # без копирования, драйверы MySQL собирают из него запрос, поэтому в памяти одновременно находится
+    # не больше одного файла на соединение.
+    # Аргументы:
+    #   connection (sqlalchemy.engine.Connection): Соединение с открытой транзакцией.
+    #   file_hash (str): SHA-256 содержимого файла.
+    #   file_path (str): Путь к файлу, в том числе внутри архива.
+
+    # Возвращает:
+    #   bool: True, если файл записан, False, если он уже хранится в базе
+
+    files = bd.StoredFile.__table__
+    if connection.execute(select(files.c.sha256).where(files.c.sha256 == file_hash)).first():
+        return False
+
+    with open_input(file_path) as file:
+        content = map_content(file)
+        if content is None:
+            content = file.read()  # Файлы архивов читаются из памяти или временного файла целиком
+        try:
+            size = len(content)
+            if hashlib.sha256(content).hexdigest() != file_hash:
+                # Файл изменился после разбора: под хешем разобранного содержимого оно не сохраняется
+                logging.error(f"Файл {file_path} изменился после разбора и не сохранен в хранилище файлов")
+                return False
+            inserted = bd.insert_new_rows(connection, files, [{'sha256': file_hash, 'size': size, 'content': content}],
+                                          'sha256')
+        finally:
+            if isinstance(content, mmap.mmap):
+                content.close()
+    if not inserted:
+        return False  # Файл параллельно записан другим процессом
+    logging.info(f"Файл {file_path} сохранен в хранилище файлов ({size} байт)")
+    return True
+
+
+def store_files(engine, files):
+    # Запись содержимого нескольких файлов, каждый в отдельной транзакции.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+    #   files (dict): Ключ - SHA-256 содержимого, значение - путь к файлу.
+
+    # Возвращает:
+    #   None
+
+    for file_hash, file_path in files.items():
+        with engine.begin() as connection:
+            store_file(connection, file_hash, file_path)
@@ -0,0 +1,164 @@
+# layout_cache: Кэш шаблонов разметки платежных поручений.
+# Большинство страниц приходит из нескольких одинаковых банковских форм, поэтому найденные
+# на странице опорные слова и рассчитанные по ним области запоминаются и используются повторно.
+
+from collections import OrderedDict
+
+from metrics import metrics
+
+# Категории слов со списками значений: determine_coordinates использует только первые два слова
+LIST_CATEGORIES_DEPTH = 2
+
+
+class LayoutCache:
+    # Ограниченный по размеру кэш шаблонов с вытеснением давно не использованных записей.
+    # Запись кэша - отпечаток страницы (размер страницы, позиции опорных слов шаблона и набор всех опорных
+    # слов страницы), опорные слова и области. Шаблон подходит странице, только если на ней тот же набор
+    # опорных слов: лишнее опорное слово изменило бы категории слов и, значит, области.
+    # Шаблоны разложены по корзинам с ключом из размера страницы и округленной позиции первого опорного слова:
+    # при поиске для каждой известной позиции проверяется только первый символ этого слова на странице,
+    # а полная проверка всех опорных слов выполняется лишь для шаблонов совпавшей корзины.
+
+    def __init__(self, maxsize=32, tolerance=0.1):
+        # Аргументы:
+        #   maxsize (int): Максимальное количество шаблонов в кэше; 0 отключает кэш.
+        #   tolerance (float): Допустимое отклонение координат опорного слова при проверке шаблона.
+
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.entries = OrderedDict()  # Ключ - отпечаток страницы, значение - ключ корзины; порядок использования
+        self.buckets = {}             # Ключ корзины - {отпечаток страницы: (опорные слова, области, набор)}
+        self.probes = {}              # Размер страницы - {(текст, x0, top) первого опорного слова: число шаблонов}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def page_size(index):
+        # Размер страницы, округленный до десятых долей пункта.
+        return round(index.bbox[2] - index.bbox[0], 1), round(index.bbox[3] - index.bbox[1], 1)
+
+    @staticmethod
+    def collect_anchors(word_categories):
+        # Сбор опорных слов, по которым determine_coordinates рассчитывает области.
+        # Аргументы:
+        #   word_categories (dict): Словарь с категориями слов и их координатами.
+
+        # Возвращает:
+        #   list: Список кортежей (текст слова, (x0, top, x1, bottom))
+
+        anchors = []
+        for value in word_categories.values():
+            words = value[:LIST_CATEGORIES_DEPTH] if isinstance(value, list) else [value]
+            for word in words:
+                if word:
+                    anchors.append((word['text'], (word['x0'], word['top'], word['x1'], word['bottom'])))
+        return anchors
+
+    @staticmethod
+    def probe(anchors):
+        # Текст и округленная позиция первого опорного слова шаблона.
+        text, bbox = anchors[0]
+        return text, round(bbox[0]), round(bbox[1])
+
+    def fingerprint(self, index, anchors, anchor_set=None):
+        # Отпечаток страницы: размер страницы, округленные позиции опорных слов и набор опорных слов страницы.
+        return (self.page_size(index), tuple((text, round(bbox[0]), round(bbox[1])) for text, bbox in anchors),
+                anchor_set)
+
+    def probe_matches(self, index, probe):
+        # Быстрая проверка корзины: на странице есть первый символ опорного слова у округленной позиции.
+        text, x0, top = probe
+        radius = 0.5 + self.tolerance  # Половина шага округления и допустимое отклонение
+        return any(char['text'] == text[0] for char in index.chars_near(x0, top, radius))
+
+    def anchors_match(self, index, anchors):
+        # Проверка шаблона: каждое опорное слово шаблона находится на странице на прежнем месте.
+        # Аргументы:
+        #   index (PageCharIndex): Индекс символов страницы.
+        #   anchors (list): Опорные слова шаблона.
+
+        # Возвращает:
+        #   bool: True, если все опорные слова совпали
+
+        tol = self.tolerance
+        for text, (x0, top, x1, bottom) in anchors:
+            chars = index.chars_in_rect((x0 - tol, top - tol, x1 + tol, bottom + tol))
+            found = ''.join(char['text'] for char in sorted(chars, key=lambda char: char['x0']))
+            if found.replace(' ', '') != text:
+                return False
+        return True
+
+    def lookup(self, index, anchor_set=None):
+        # Поиск подходящего шаблона для страницы.
+        # Аргументы:
+        #   index (PageCharIndex): Индекс символов страницы.
+        #   anchor_set (tuple): Все опорные слова страницы (см. pdf_parser.page_anchor_set).
+
+        # Возвращает:
+        #   dict или None: Области шаблона или None, если подходящий шаблон не найден.
+
+        if not self.maxsize:
+            return None
+        page_size = self.page_size(index)
+        for probe in self.probes.get(page_size, ()):
+            if not self.probe_matches(index, probe):
+                continue
+            bucket = self.buckets[(page_size, probe)]
+            # В корзине проверка начинается с последних использованных шаблонов
+            for key in reversed(bucket):
+                anchors, rects, stored_set = bucket[key]
+                if stored_set == anchor_set and self.anchors_match(index, anchors):
+                    self.entries.move_to_end(key)
+                    bucket[key] = bucket.pop(key)
+                    self.hits += 1
+                    metrics.incr('layout_cache.hit')
+                    return rects
+        self.misses += 1
+        metrics.incr('layout_cache.miss')
+        return None
+
+    def store(self, index, word_categories, rects, anchor_set=None):
+        # Сохранение шаблона страницы после полного определения областей.
+        # Аргументы:
+        #   index (PageCharIndex): Индекс символов страницы.
+        #   word_categories (dict): Словарь с категориями слов и их координатами.
+        #   rects (dict): Рассчитанные области страницы.
+        #   anchor_set (tuple): Все опорные слова страницы (см. pdf_parser.page_anchor_set).
+
+        # Возвращает:
+        #   None
+
+        if not self.maxsize:
+            return
+        anchors = self.collect_anchors(word_categories)
+        if not anchors:
+            return
+        key = self.fingerprint(index, anchors, anchor_set)
+        if key in self.entries:
+            self.remove(key)
+        page_size, probe = key[0], self.probe(anchors)
+        self.buckets.setdefault((page_size, probe), OrderedDict())[key] = (anchors, rects, anchor_set)
+        probes = self.probes.setdefault(page_size, {})
+        probes[probe] = probes.get(probe, 0) + 1
+        self.entries[key] = (page_size, probe)
+        while len(self.entries) > self.maxsize:
+            self.remove(next(iter(self.entries)))  # Вытеснение давно не использованного шаблона
+
+    def remove(self, key):
+        # Удаление шаблона из кэша и из его корзины.
+        page_size, probe = self.entries.pop(key)
+        bucket = self.buckets[(page_size, probe)]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[(page_size, probe)]
+        probes = self.probes[page_size]
+        probes[probe] -= 1
+        if not probes[probe]:
+            del probes[probe]
+            if not probes:
+                del self.probes[page_size]
+
+    def clear(self):
+        self.entries.clear()
+        self.buckets.clear()
+        self.probes.clear()
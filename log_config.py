@@ -0,0 +1,95 @@
+# log_config: Настройка журналирования для обработки больших объемов.
+# Записи передаются через очередь (QueueHandler) в фоновый поток (QueueListener), который форматирует их
+# и выводит, поэтому разбор страниц не ждет ни форматирования, ни вывода. Процессы пула пишут в ту же очередь.
+# Формат text совпадает с прежним форматом журнала, формат json выводит по одному объекту JSON на запись,
+# включая поля итогов обработки файла (extra={'summary': {...}}).
+
+import copy
+import json
+import logging
+import logging.handlers
+import multiprocessing
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%d.%m.%Y %H:%M:%S'
+
+log_queue = None  # Очередь записей основного процесса; None - журналирование через очередь не настроено
+listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    # Запись журнала в виде одного объекта JSON: время, уровень, сообщение и поля итогов.
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, LOG_DATE_FORMAT),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        summary = getattr(record, 'summary', None)
+        if summary:
+            entry.update(summary)
+        if record.exc_info or record.exc_text:
+            entry['exception'] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    # Постановка записи в очередь без форматирования: стандартный QueueHandler.prepare форматирует запись
+    # в вызывающем потоке, а здесь формат (время, уровень, JSON) применяет только обработчик потока вывода.
+
+    def prepare(self, record):
+        # Копия записи, которую можно передать между процессами: аргументы подставляются в сообщение,
+        # трассировка исключения заменяется текстом (объекты трассировки не сериализуются).
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level='INFO', log_format='text'):
+    # Настройка корневого журнала: записи передаются через очередь в фоновый поток вывода.
+    # Аргументы:
+    #   level (str): Уровень журнала; подробности по каждому полю страницы выводятся на уровне DEBUG.
+    #   log_format (str): 'text' - строки прежнего формата, 'json' - объекты JSON.
+
+    # Возвращает:
+    #   logging.handlers.QueueListener: Поток вывода; останавливается stop_logging
+
+    global log_queue, listener
+    stop_logging()
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    log_queue = multiprocessing.Queue(-1)  # Общая с процессами пула
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    setup_worker_logging(log_queue, level)
+    listener.start()
+    return listener
+
+
+def setup_worker_logging(queue, level):
+    # Направление записей процесса в очередь основного процесса; используется и в процессах пула.
+    # Аргументы:
+    #   queue (multiprocessing.Queue): Очередь записей.
+    #   level (str или int): Уровень журнала.
+
+    # Возвращает:
+    #   None
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(RecordQueueHandler(queue))
+    root.setLevel(level)
+
+
+def stop_logging():
+    # Вывод оставшихся в очереди записей и остановка фонового потока.
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -0,0 +1,135 @@
+# manifest: Журнал обработанных PDF файлов.
+# Хранит путь, размер, время изменения и хеш содержимого каждого обработанного файла в локальной базе SQLite,
+# чтобы при повторных запусках не разбирать файлы, которые уже сохранены в базу данных.
+# Для файлов внутри архивов (см. sources) учитываются размер файла и время изменения архива.
+# Размер, время изменения и хеш записываются такими, какими они были при разборе (см. Manifest.capture),
+# поэтому файл, измененный после разбора, не попадает в журнал с непрочитанным содержимым.
+# Записи ведутся отдельно для каждого места сохранения (база данных и таблица или папка Parquet):
+# файл, уже сохраненный в базу данных, обрабатывается заново при выгрузке в Parquet и наоборот.
+
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from file_store import file_sha256
+from sources import input_stat
+
+
+class Manifest:
+    # Журнал обработанных файлов в базе SQLite. Методы можно вызывать из разных потоков.
+
+    def __init__(self, path, destination=''):
+        # Аргументы:
+        #   path (str): Путь к файлу базы SQLite с журналом.
+        #   destination (str): Место сохранения документов (см. main.manifest_destination); файлы считаются
+        #                      обработанными только для того места, куда были сохранены.
+
+        self.path = path
+        self.destination = destination
+        self.lock = threading.Lock()
+        self.fingerprints = {}  # Размер, время изменения и хеш файлов на момент разбора по абсолютному пути
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # Таблица processed_files прежних версий не различала места сохранения и больше не читается:
+        # ее файлы один раз обрабатываются заново, уже сохраненные документы пропускаются как дубликаты
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS processed_outputs ("
+            "destination TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "sha256 TEXT NOT NULL, processed_at TEXT NOT NULL, PRIMARY KEY (destination, path))"
+        )
+        self.connection.commit()
+
+    def is_unchanged(self, file_path):
+        # Проверка, что файл уже обработан и с тех пор не изменился.
+        # Если размер и время изменения совпадают с журналом, файл не открывается.
+        # Если изменилось только время изменения, сравнивается хеш содержимого.
+        # Аргументы:
+        #   file_path (str): Путь к PDF файлу.
+
+        # Возвращает:
+        #   bool: True, если файл можно пропустить
+
+        file_path = os.path.abspath(file_path)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, sha256 FROM processed_outputs WHERE destination = ? AND path = ?",
+                (self.destination, file_path)
+            ).fetchone()
+        if row is None:
+            return False
+        size, mtime_ns, sha256 = row
+        current_size, current_mtime_ns = input_stat(file_path)
+        if current_size != size:
+            return False
+        if current_mtime_ns == mtime_ns:
+            return True
+        if file_sha256(file_path) != sha256:
+            return False
+        # Содержимое не изменилось: обновление времени изменения, чтобы в следующий раз не вычислять хеш
+        with self.lock:
+            self.connection.execute("UPDATE processed_outputs SET mtime_ns = ? WHERE destination = ? AND path = ?",
+                                    (current_mtime_ns, self.destination, file_path))
+            self.connection.commit()
+        return True
+
+    def capture(self, file_path):
+        # Запоминание размера, времени изменения и хеша файла перед разбором. Время изменения читается до хеша:
+        # если файл изменится во время чтения, при следующем запуске будет сравнен хеш содержимого.
+        # Аргументы:
+        #   file_path (str): Путь к PDF файлу.
+
+        # Возвращает:
+        #   str: SHA-256 содержимого; передается в разбор, чтобы файл не читался для хеша повторно
+
+        file_path = os.path.abspath(file_path)
+        size, mtime_ns = input_stat(file_path)
+        file_hash = file_sha256(file_path)
+        with self.lock:
+            self.fingerprints[file_path] = (size, mtime_ns, file_hash)
+        return file_hash
+
+    def mark_processed(self, file_paths):
+        # Запись файлов в журнал после успешного сохранения их документов в базу данных.
+        # Записываются данные, запомненные capture перед разбором; файл не читается повторно.
+        # Аргументы:
+        #   file_paths (Iterable[str]): Пути к обработанным PDF файлам.
+
+        # Возвращает:
+        #   None
+
+        processed_at = datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            with self.lock:
+                fingerprint = self.fingerprints.pop(file_path, None)
+            if fingerprint is None:
+                # Без данных на момент разбора файл не отмечается и будет обработан при следующем запуске
+                logging.warning(f"Файл {file_path} не записан в журнал обработки: нет данных на момент разбора")
+                continue
+            rows.append((self.destination, file_path) + fingerprint + (processed_at,))
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO processed_outputs (destination, path, size, mtime_ns, sha256, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self.connection.commit()
+
+    def filter_unprocessed(self, input_folder, filenames):
+        # Отбор файлов, которые еще не обработаны или изменились после обработки.
+        # Аргументы:
+        #   input_folder (str): Путь к папке с PDF файлами.
+        #   filenames (list): Названия PDF файлов.
+
+        # Возвращает:
+        #   list: Названия файлов, которые нужно обработать
+
+        pending = [f for f in filenames if not self.is_unchanged(os.path.join(input_folder, f))]
+        logging.info(f"Журнал обработки: пропущено {len(filenames) - len(pending)} неизмененных файлов, "
+                     f"к обработке {len(pending)}")
+        return pending
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
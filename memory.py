@@ -0,0 +1,115 @@
+# memory: Контроль расхода памяти процесса при обработке больших PDF файлов.
+# Включает чтение текущего и пикового RSS, возврат освобожденной памяти системе и ограничение RSS
+# с повторными попытками освобождения памяти перед отказом от обработки файла.
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import resource
+import time
+
+PAGE_SIZE_KB = os.sysconf('SC_PAGE_SIZE') // 1024 if hasattr(os, 'sysconf') else 4
+
+
+def current_rss_kb():
+    # Текущий RSS процесса в килобайтах.
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE_KB
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Без /proc доступен только пиковый RSS
+
+
+def reset_peak_rss():
+    # Сброс пикового RSS процесса (Linux, /proc/self/clear_refs); возвращает False, если сброс недоступен.
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_kb():
+    # Пиковый RSS процесса в килобайтах с момента последнего сброса (или запуска процесса).
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def load_malloc_trim():
+    # Функция malloc_trim из glibc для возврата свободной памяти кучи системе; None, если недоступна.
+    libc_name = ctypes.util.find_library('c')
+    try:
+        return ctypes.CDLL(libc_name).malloc_trim if libc_name else None
+    except (OSError, AttributeError):
+        return None
+
+
+malloc_trim = load_malloc_trim()
+
+
+def release_memory():
+    # Сборка мусора и возврат освобожденной памяти системе.
+    gc.collect()
+    if malloc_trim is not None:
+        malloc_trim(0)
+
+
+class MemoryGuard:
+    # Настройки режима ограниченной памяти и проверка RSS между страницами.
+
+    def __init__(self, rss_limit_mb=0, reopen_pages=0, backoff=0.5, retries=4):
+        # Аргументы:
+        #   rss_limit_mb (int): Предел RSS процесса в мегабайтах; 0 - без ограничения.
+        #   reopen_pages (int): Переоткрывать PDF файл каждые reopen_pages страниц; 0 - не переоткрывать.
+        #   backoff (float): Начальная пауза в секундах между попытками освободить память; удваивается.
+        #   retries (int): Количество попыток освободить память до отказа от обработки файла.
+
+        self.configure(rss_limit_mb, reopen_pages)
+        self.backoff = backoff
+        self.retries = retries
+
+    def configure(self, rss_limit_mb=0, reopen_pages=0):
+        self.rss_limit_kb = rss_limit_mb * 1024
+        self.reopen_pages = reopen_pages
+
+    @property
+    def active(self):
+        return bool(self.rss_limit_kb or self.reopen_pages)
+
+    def over_limit(self):
+        # Превышен ли предел RSS.
+        return bool(self.rss_limit_kb) and current_rss_kb() > self.rss_limit_kb
+
+    def wait_for_memory(self, context=''):
+        # Освобождение памяти после превышения предела: сборка мусора и возврат памяти системе,
+        # при неудаче - повтор с нарастающей паузой.
+        # Аргументы:
+        #   context (str): Описание места проверки для журнала.
+
+        # Исключения:
+        #   MemoryError: RSS остался выше предела после всех попыток.
+
+        delay = self.backoff
+        rss = current_rss_kb()
+        for attempt in range(self.retries + 1):
+            release_memory()
+            rss = current_rss_kb()
+            if rss <= self.rss_limit_kb:
+                logging.info(f"{context}: память освобождена до {rss // 1024} МБ "
+                             f"(предел {self.rss_limit_kb // 1024} МБ)")
+                return
+            if attempt < self.retries:
+                logging.warning(f"{context}: RSS {rss // 1024} МБ выше предела {self.rss_limit_kb // 1024} МБ, "
+                                f"повтор через {delay:.1f} с")
+                time.sleep(delay)
+                delay *= 2
+        raise MemoryError(f"{context}: RSS {rss // 1024} МБ выше предела {self.rss_limit_kb // 1024} МБ")
@@ -0,0 +1,174 @@
+# metrics: Встроенные счетчики и замеры времени этапов обработки.
+# Собирает время и количество вызовов по этапам и полям, промахи опорных слов и задержки записи в базу данных.
+# Выгружается в JSON или в текстовый файл Prometheus (textfile collector) в конце запуска или периодически.
+# В выключенном состоянии замеры сводятся к возврату общего пустого контекстного менеджера.
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+NULL_TIMER = nullcontext()
+PROMETHEUS_PREFIX = 'ppparser'
+
+
+class Timer:
+    # Контекстный менеджер замера времени одного вызова этапа.
+
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    # Реестр замеров: timers - время этапов (количество, сумма, максимум), counters - счетчики событий,
+    # gauges - максимальные наблюдавшиеся значения (например, пиковый RSS при обработке файла).
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.timers = {}    # Ключ - название этапа, значение - [количество, сумма секунд, максимум секунд]
+        self.counters = {}  # Ключ - название счетчика, значение - число
+        self.gauges = {}    # Ключ - название показателя, значение - максимум
+
+    def set_enabled(self, enabled=True):
+        # Включение или выключение сбора; используется и как инициализатор процессов пула.
+        self.enabled = enabled
+
+    def timer(self, name):
+        # Замер времени этапа: with metrics.timer('page.extract_words'): ...
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    def incr(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_max(self, name, value):
+        # Обновление показателя, если новое значение больше сохраненного.
+        if self.enabled:
+            with self.lock:
+                if value > self.gauges.get(name, value - 1):
+                    self.gauges[name] = value
+
+    def snapshot(self):
+        # Копия текущих значений, пригодная для передачи между процессами и выгрузки в JSON.
+        with self.lock:
+            return {
+                'timers': {name: {'count': count, 'seconds': total, 'max_seconds': maximum}
+                           for name, (count, total, maximum) in self.timers.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def merge(self, snapshot):
+        # Добавление значений, собранных в другом процессе.
+        with self.lock:
+            for name, value in snapshot['timers'].items():
+                timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+                timer[0] += value['count']
+                timer[1] += value['seconds']
+                timer[2] = max(timer[2], value['max_seconds'])
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, value in snapshot.get('gauges', {}).items():
+                self.gauges[name] = max(self.gauges.get(name, value), value)
+
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def to_prometheus(self):
+        # Представление в текстовом формате Prometheus.
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_seconds_total Суммарное время этапа в секундах.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter",
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_stage_seconds_total{{stage="{name}"}} {value["seconds"]:.6f}'
+                  for name, value in sorted(snapshot['timers'].items())]
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_calls_total Количество выполнений этапа.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter",
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_stage_calls_total{{stage="{name}"}} {value["count"]}'
+                  for name, value in sorted(snapshot['timers'].items())]
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_max_seconds Максимальное время одного выполнения этапа.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_max_seconds gauge",
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_stage_max_seconds{{stage="{name}"}} {value["max_seconds"]:.6f}'
+                  for name, value in sorted(snapshot['timers'].items())]
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_events_total Счетчики событий обработки.",
+            f"# TYPE {PROMETHEUS_PREFIX}_events_total counter",
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_events_total{{event="{name}"}} {value}'
+                  for name, value in sorted(snapshot['counters'].items())]
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_max_value Максимальные значения показателей обработки.",
+            f"# TYPE {PROMETHEUS_PREFIX}_max_value gauge",
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_max_value{{name="{name}"}} {value}'
+                  for name, value in sorted(snapshot['gauges'].items())]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        # Выгрузка в файл: формат Prometheus для расширения .prom, иначе JSON.
+        # Запись идет через временный файл, чтобы читатель не увидел файл наполовину записанным.
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+
+    def start_periodic_export(self, path, interval):
+        # Периодическая выгрузка в фоновом потоке.
+        # Аргументы:
+        #   path (str): Путь к файлу выгрузки.
+        #   interval (float): Период выгрузки в секундах.
+
+        # Возвращает:
+        #   threading.Event: Событие, установка которого останавливает выгрузку
+
+        stop_event = threading.Event()
+
+        def export_loop():
+            while not stop_event.wait(interval):
+                try:
+                    self.export(path)
+                except OSError as e:
+                    logging.error(f"Ошибка выгрузки метрик в {path}: {e}")
+
+        threading.Thread(target=export_loop, name='metrics-export', daemon=True).start()
+        return stop_event
+
+
+metrics = Metrics()  # Общий реестр процесса
@@ -0,0 +1,234 @@
+# migrations: Перевод существующей таблицы documents на схему, оптимизированную для выборок.
+# Добавляет индексы для выборок по контрагенту, периоду и сумме, переносит содержимое файлов из устаревшей
+# колонки file_content в таблицу files и по запросу разбивает таблицу на секции по месяцам поступления (MySQL)
+# или переносит документы в нормализованное хранение (см. normalized).
+# Каждый шаг проверяет текущее состояние базы данных, поэтому миграцию можно запускать повторно.
+# Запуск: python migrations.py --db <строка подключения> [--drop-blob] [--partition-by-month] [--normalize]
+
+import argparse
+import hashlib
+import logging
+from datetime import date
+
+from sqlalchemy import column, func, select, table, update
+from sqlalchemy.inspection import inspect
+from sqlalchemy.sql import text
+
+import bd
+import normalized
+
+BLOB_BATCH_SIZE = 200       # Количество строк documents, переносимых в одной транзакции
+FUTURE_PARTITIONS = 12      # Количество секций на будущие месяцы после последней даты поступления
+
+# Устаревшая колонка с содержимым файла в каждой строке; в модели Document ее больше нет
+legacy_documents = table('documents', column('id'), column('file_content'), column('file_hash'))
+
+
+def document_columns(engine):
+    # Названия колонок таблицы documents в базе данных.
+    return {item['name'] for item in inspect(engine).get_columns('documents')}
+
+
+def add_indexes(engine):
+    # Создание индексов модели Document, которых еще нет в таблице documents.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+
+    # Возвращает:
+    #   list: Названия созданных индексов
+
+    existing = {index['name'] for index in inspect(engine).get_indexes('documents')}
+    created = []
+    for index in bd.Document.__table__.indexes:
+        if index.name in existing:
+            continue
+        logging.info(f"Создание индекса {index.name}")
+        index.create(engine)
+        created.append(index.name)
+    return created
+
+
+def move_legacy_blobs(engine, batch_size=BLOB_BATCH_SIZE):
+    # Перенос содержимого файлов из колонки documents.file_content в таблицу files с заполнением file_hash.
+    # В MySQL хеш вычисляется на сервере (SHA2), и содержимое не передается клиенту; в остальных СУБД
+    # строки читаются пакетами и хешируются на стороне приложения.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+    #   batch_size (int): Количество строк documents в одной транзакции.
+
+    # Возвращает:
+    #   int: Количество строк, получивших ссылку на файл
+
+    if 'file_content' not in document_columns(engine):
+        return 0
+    bd.StoredFile.__table__.create(engine, checkfirst=True)
+    pending = (legacy_documents.c.file_content.isnot(None)) & (legacy_documents.c.file_hash.is_(None))
+    moved = 0
+    if engine.dialect.name == 'mysql':
+        with engine.connect() as connection:
+            low, high = connection.execute(select(func.min(legacy_documents.c.id),
+                                                  func.max(legacy_documents.c.id)).where(pending)).first()
+        if low is None:
+            return 0
+        for start in range(low, high + 1, batch_size):
+            bounds = {'start': start, 'end': start + batch_size - 1}
+            with engine.begin() as connection:
+                connection.execute(text(
+                    "INSERT INTO files (sha256, size, content) "
+                    "SELECT SHA2(file_content, 256), LENGTH(file_content), file_content FROM documents "
+                    "WHERE id BETWEEN :start AND :end AND file_content IS NOT NULL AND file_hash IS NULL "
+                    "ON DUPLICATE KEY UPDATE sha256 = files.sha256"), bounds)
+                moved += connection.execute(text(
+                    "UPDATE documents SET file_hash = SHA2(file_content, 256) "
+                    "WHERE id BETWEEN :start AND :end AND file_content IS NOT NULL AND file_hash IS NULL"),
+                    bounds).rowcount
+            logging.info(f"Перенесено содержимое файлов для {moved} документов")
+        return moved
+
+    files = bd.StoredFile.__table__
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(legacy_documents.c.id, legacy_documents.c.file_content)
+                .where(pending, legacy_documents.c.id > last_id)
+                .order_by(legacy_documents.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+            for document_id, content in rows:
+                file_hash = hashlib.sha256(content).hexdigest()
+                bd.insert_new_rows(connection, files, [{'sha256': file_hash, 'size': len(content), 'content': content}],
+                                   'sha256')
+                connection.execute(update(legacy_documents).where(legacy_documents.c.id == document_id)
+                                   .values(file_hash=file_hash))
+            last_id = rows[-1][0]
+            moved += len(rows)
+        logging.info(f"Перенесено содержимое файлов для {moved} документов")
+    return moved
+
+
+def drop_legacy_blob(engine):
+    # Удаление колонки documents.file_content после переноса содержимого в таблицу files.
+    # Колонка не удаляется, если у какой-либо строки содержимое еще не перенесено.
+    # Возвращает:
+    #   bool: True, если колонка удалена
+
+    if 'file_content' not in document_columns(engine):
+        return False
+    with engine.connect() as connection:
+        remaining = connection.execute(select(func.count()).select_from(legacy_documents).where(
+            legacy_documents.c.file_content.isnot(None), legacy_documents.c.file_hash.is_(None))).scalar()
+    if remaining:
+        logging.error(f"Колонка file_content не удалена: содержимое не перенесено для {remaining} документов")
+        return False
+    logging.info("Удаление колонки documents.file_content")
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE documents DROP COLUMN file_content"))
+    return True
+
+
+def month_start(value, months=0):
+    # Первое число месяца, отстоящего от месяца даты value на months месяцев.
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_by_month(engine, future_partitions=FUTURE_PARTITIONS):
+    # Разбиение таблицы documents на секции по месяцам даты поступления (только MySQL).
+    # Ограничения MySQL: колонка секционирования должна входить во все уникальные ключи, поэтому первичный ключ
+    # становится (id, admission_date), уникальный индекс - (unique_identifier, admission_date), а admission_date -
+    # обязательной. Идентификатор документа уже содержит дату поступления, поэтому отсев дубликатов не меняется.
+    # Документы без даты поступления нужно исправить или удалить до миграции.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных MySQL.
+    #   future_partitions (int): Количество секций на будущие месяцы; более поздние даты попадают в секцию pmax.
+
+    # Возвращает:
+    #   bool: True, если таблица разбита на секции
+
+    if engine.dialect.name != 'mysql':
+        logging.error("Секционирование по месяцам поддерживается только для MySQL")
+        return False
+    documents = bd.Document.__table__
+    with engine.connect() as connection:
+        partitioned = connection.execute(text(
+            "SELECT COUNT(*) FROM information_schema.partitions WHERE table_schema = DATABASE() "
+            "AND table_name = 'documents' AND partition_name IS NOT NULL")).scalar()
+        if partitioned:
+            logging.info("Таблица documents уже разбита на секции")
+            return False
+        undated = connection.execute(select(func.count()).where(documents.c.admission_date.is_(None))).scalar()
+        first, last = connection.execute(select(func.min(documents.c.admission_date),
+                                                func.max(documents.c.admission_date))).first()
+    if undated:
+        logging.error(f"Секционирование невозможно: у {undated} документов нет даты поступления")
+        return False
+
+    first = month_start(first or date.today())
+    last = month_start(last or date.today(), future_partitions)
+    partitions = []
+    current = first
+    while current <= last:
+        following = month_start(current, 1)
+        partitions.append(f"PARTITION p{current:%Y%m} VALUES LESS THAN (TO_DAYS('{following:%Y-%m-%d}'))")
+        current = following
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+    unique_name = next((index['name'] for index in inspect(engine).get_indexes('documents')
+                        if index['column_names'] == ['unique_identifier']), None)
+    drop_unique = f"DROP INDEX `{unique_name}`, " if unique_name else ""
+    unique_name = unique_name or 'unique_identifier'
+    logging.info(f"Разбиение таблицы documents на {len(partitions)} секций")
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"ALTER TABLE documents MODIFY admission_date DATE NOT NULL, "
+            f"DROP PRIMARY KEY, ADD PRIMARY KEY (id, admission_date), "
+            f"{drop_unique}ADD UNIQUE INDEX `{unique_name}` (unique_identifier, admission_date)"))
+        connection.execute(text(
+            f"ALTER TABLE documents PARTITION BY RANGE (TO_DAYS(admission_date)) ({', '.join(partitions)})"))
+    return True
+
+
+def migrate(engine, drop_blob=False, partition=False, normalize=False):
+    # Выполнение всех шагов миграции.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+    #   drop_blob (bool): Удалить колонку file_content после переноса содержимого.
+    #   partition (bool): Разбить таблицу на секции по месяцам (MySQL).
+    #   normalize (bool): Перенести документы в нормализованное хранение (таблица documents сохраняется).
+
+    # Возвращает:
+    #   None
+
+    bd.ensure_schema(engine)  # Новые таблицы создаются сразу с индексами
+    add_indexes(engine)
+    move_legacy_blobs(engine)
+    if drop_blob:
+        drop_legacy_blob(engine)
+    if partition:
+        partition_by_month(engine)
+    if normalize:
+        normalized.copy_documents(engine)
+    logging.info("Миграция завершена")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Миграция таблицы documents на схему для быстрых выборок")
+    parser.add_argument('--db', default=None,
+                        help="Строка подключения к базе данных; по умолчанию переменная окружения PPDB_URL "
+                             f"или {bd.DEFAULT_DB_URL}")
+    parser.add_argument('--drop-blob', action='store_true',
+                        help="Удалить колонку file_content после переноса содержимого в таблицу files")
+    parser.add_argument('--partition-by-month', action='store_true',
+                        help="Разбить таблицу на секции по месяцам даты поступления (MySQL)")
+    parser.add_argument('--normalize', action='store_true',
+                        help="Перенести документы в нормализованное хранение (контрагенты, банки, document_facts) "
+                             "и создать представление documents_flat")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        datefmt='%d.%m.%Y %H:%M:%S')
+    args = parse_args()
+    migrate(bd.get_engine(args.db), args.drop_blob, args.partition_by_month, args.normalize)
@@ -0,0 +1,246 @@
+# normalized: Нормализованное хранение документов: контрагенты и банки в отдельных таблицах.
+# Реквизиты плательщика и получателя (ИНН, КПП, наименование) и банков (БИК, корреспондентский счет,
+# наименование) записываются один раз в таблицы counterparties и banks, а таблица document_facts хранит
+# только ссылки на них. Контрагент определяется ИНН и КПП, банк - БИК; наименование и счет в справочнике
+# берутся из первого документа, а отличающиеся от них написания в других документах хранятся в document_facts.
+# Идентификаторы уже найденных контрагентов и банков держатся в ограниченном LRU кэше процесса,
+# поэтому при загрузке повторяющихся реквизитов запросы к справочникам не выполняются.
+# Представление documents_flat возвращает документы с теми же колонками и значениями, что и таблица documents.
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+from sqlalchemy.sql import text
+
+import bd
+from metrics import metrics
+
+CACHE_SIZE = 100000        # Количество идентификаторов контрагентов и банков в кэше процесса
+LOOKUP_CHUNK_SIZE = 500    # Количество ключей в одном запросе поиска идентификаторов
+COPY_BATCH_SIZE = 1000     # Количество строк documents, переносимых за одну порцию
+FLAT_VIEW = 'documents_flat'
+
+counterparties = bd.Counterparty.__table__
+banks = bd.Bank.__table__
+document_facts = bd.DocumentFact.__table__
+documents = bd.Document.__table__
+
+# Реквизиты справочников в строке документа: роль -> (таблица, колонка ссылки,
+# {колонка справочника: колонка строки}, колонки ключа справочника). Остальные реквизиты хранятся
+# в document_facts под именем колонки строки, если отличаются от записанных в справочнике.
+DIMENSIONS = {
+    'payer': (counterparties, 'payer_id',
+              {'inn': 'payer_inn', 'kpp': 'payer_kpp', 'name': 'payer_name'}, ('inn', 'kpp')),
+    'recipient': (counterparties, 'recipient_id',
+                  {'inn': 'recipient_inn', 'kpp': 'recipient_kpp', 'name': 'recipient_name'}, ('inn', 'kpp')),
+    'payer_bank': (banks, 'payer_bank_id',
+                   {'bik': 'payer_bank_bik', 'account': 'payer_bank_account', 'name': 'payer_bank_name'}, ('bik',)),
+    'recipient_bank': (banks, 'recipient_bank_id',
+                       {'bik': 'recipient_bank_bik', 'account': 'recipient_bank_account',
+                        'name': 'recipient_bank_name'}, ('bik',)),
+}
+FACT_COLUMNS = tuple(column.name for column in document_facts.c if column.name != 'id')
+
+
+def natural_key(values):
+    # Ключ строки справочника: SHA-256 от значений реквизитов; пустое значение отличается от пустой строки.
+    # Аргументы:
+    #   values (tuple): Значения реквизитов в порядке колонок справочника.
+
+    # Возвращает:
+    #   str: Шестнадцатеричный SHA-256
+
+    joined = '\x1f'.join('\x00' if value is None else str(value) for value in values)
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()
+
+
+def dimension_key(record, key_columns):
+    # Ключ строки справочника по колонкам ключа (ИНН и КПП, БИК). Если они пусты, контрагент или банк
+    # определяется всеми реквизитами, чтобы разные стороны без ИНН не сливались в одну строку.
+    # Аргументы:
+    #   record (dict): Реквизиты в колонках справочника.
+    #   key_columns (tuple): Колонки ключа справочника.
+
+    # Возвращает:
+    #   str: natural_key строки справочника
+
+    values = tuple(record[column] for column in key_columns)
+    if all(value is None for value in values):
+        values = ('',) + tuple(record.values())  # Отличается от ключа по колонкам ключа числом значений
+    return natural_key(values)
+
+
+class DimensionCache:
+    # Поиск и создание строк справочников контрагентов и банков с LRU кэшем идентификаторов.
+    # Один экземпляр используется всеми потоками записи процесса.
+
+    def __init__(self, engine, maxsize=CACHE_SIZE):
+        # Аргументы:
+        #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+        #   maxsize (int): Максимальное количество идентификаторов в кэше.
+
+        self.engine = engine
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # Ключ - (таблица, natural_key), значение - идентификатор и реквизиты строки
+        self.lock = threading.Lock()
+
+    def cached(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def remember(self, found):
+        with self.lock:
+            for key, entry in found.items():
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)  # Вытеснение давно не использованного идентификатора
+
+    def resolve(self, table, records):
+        # Идентификаторы строк справочника; отсутствующие строки создаются.
+        # Строки создаются отдельной транзакцией до записи документов: если запись документов не удалась,
+        # созданные строки справочника остаются, и идентификаторы в кэше не указывают на отмененные строки.
+        # Аргументы:
+        #   table (sqlalchemy.Table): Таблица counterparties или banks.
+        #   records (dict): Ключ - natural_key, значение - словарь реквизитов.
+
+        # Возвращает:
+        #   dict: Ключ - natural_key, значение - идентификатор строки и словарь реквизитов, записанных в справочнике
+
+        ids, missing = {}, {}
+        for key, record in records.items():
+            entry = self.cached((table.name, key))
+            if entry is None:
+                missing[key] = record
+            else:
+                ids[key] = entry
+        metrics.incr(f'normalized.{table.name}.cache_hit', len(ids))
+        if not missing:
+            return ids
+        metrics.incr(f'normalized.{table.name}.cache_miss', len(missing))
+        keys = list(missing)
+        columns = list(next(iter(missing.values())))
+        found = {}
+        with metrics.timer('normalized.resolve'), self.engine.begin() as connection:
+            # Строку могла создать другая запись; вставка пропускает ее, и идентификатор и реквизиты
+            # (возможно, в другом написании) берутся из выборки
+            bd.insert_new_rows(connection, table, [dict(record, natural_key=key) for key, record in missing.items()],
+                               'natural_key')
+            for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+                chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+                for row in connection.execute(
+                        select(table.c.id, table.c.natural_key, *[table.c[column] for column in columns])
+                        .where(table.c.natural_key.in_(chunk))).mappings():
+                    found[row['natural_key']] = (row['id'], {column: row[column] for column in columns})
+        self.remember({(table.name, key): entry for key, entry in found.items()})
+        ids.update(found)
+        return ids
+
+    def fact_rows(self, rows):
+        # Преобразование строк документов (колонки таблицы documents) в строки таблицы document_facts.
+        # Аргументы:
+        #   rows (list): Строки документов с заполненным unique_identifier.
+
+        # Возвращает:
+        #   list: Строки document_facts; ссылка пуста, если все реквизиты стороны или банка пусты,
+        #         наименование и счет банка заполнены, только если отличаются от записанных в справочнике
+
+        references = []
+        wanted = {counterparties.name: {}, banks.name: {}}
+        for row in rows:
+            row_keys = {}
+            for role, (table, _, columns, key_columns) in DIMENSIONS.items():
+                record = {column: row.get(source) for column, source in columns.items()}
+                if all(value is None for value in record.values()):
+                    continue
+                key = dimension_key(record, key_columns)
+                wanted[table.name].setdefault(key, record)  # В справочник попадает первое написание
+                row_keys[role] = key
+            references.append(row_keys)
+
+        ids = {counterparties.name: self.resolve(counterparties, wanted[counterparties.name]),
+               banks.name: self.resolve(banks, wanted[banks.name])}
+        facts = []
+        for row, row_keys in zip(rows, references):
+            fact = {column: row.get(column) for column in FACT_COLUMNS}
+            for role, (table, reference, columns, key_columns) in DIMENSIONS.items():
+                entry_id, stored = ids[table.name][row_keys[role]] if role in row_keys else (None, {})
+                fact[reference] = entry_id
+                for column, source in columns.items():
+                    if column not in key_columns:
+                        # Пустое значение в документе при заполненном в справочнике показывается из справочника
+                        fact[source] = row.get(source) if row.get(source) != stored.get(column) else None
+            facts.append(fact)
+        return facts
+
+
+def flat_select():
+    # Выборка документов нормализованного хранения в колонках таблицы documents.
+    # Возвращает:
+    #   sqlalchemy.Select: Выборка для представления documents_flat
+
+    parties = {role: table.alias(role) for role, (table, _, _, _) in DIMENSIONS.items()}
+    labels = {}
+    for role, (_, _, columns, key_columns) in DIMENSIONS.items():
+        for column, source in columns.items():
+            if column in key_columns:
+                labels[source] = parties[role].c[column].label(source)
+            else:
+                # Написание из документа, если оно отличается от записанного в справочнике
+                labels[source] = func.coalesce(document_facts.c[source], parties[role].c[column]).label(source)
+    source = document_facts
+    for role, (_, reference, _, _) in DIMENSIONS.items():
+        source = source.outerjoin(parties[role], parties[role].c.id == document_facts.c[reference])
+    return select(*[labels[column.name] if column.name in labels else document_facts.c[column.name].label(column.name)
+                    for column in documents.c]).select_from(source)
+
+
+def ensure_flat_view(engine):
+    # Создание таблиц нормализованного хранения и представления documents_flat, если их еще нет.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+
+    # Возвращает:
+    #   None
+
+    bd.ensure_schema(engine, bd.NORMALIZED_TABLES)  # Таблицы создаются только в режиме нормализованного хранения
+    body = str(flat_select().compile(engine, compile_kwargs={'literal_binds': True}))
+    create = 'CREATE OR REPLACE VIEW' if engine.dialect.name == 'mysql' else 'CREATE VIEW IF NOT EXISTS'
+    with engine.begin() as connection:
+        connection.execute(text(f"{create} {FLAT_VIEW} AS {body}"))
+
+
+def copy_documents(engine, batch_size=COPY_BATCH_SIZE):
+    # Перенос документов из таблицы documents в нормализованное хранение; уже перенесенные документы
+    # (по unique_identifier) пропускаются, поэтому перенос можно запускать повторно.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+    #   batch_size (int): Количество строк documents за одну порцию.
+
+    # Возвращает:
+    #   int: Количество добавленных строк document_facts
+
+    ensure_flat_view(engine)
+    dimensions = DimensionCache(engine)
+    copied = 0
+    last_id = 0
+    while True:
+        with engine.connect() as connection:
+            rows = [dict(row) for row in connection.execute(
+                select(*documents.c).where(documents.c.id > last_id).order_by(documents.c.id).limit(batch_size)
+            ).mappings()]
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        facts = dimensions.fact_rows(rows)
+        with engine.begin() as connection:
+            copied += bd.insert_new_rows(connection, document_facts, facts, 'unique_identifier')
+        logging.info(f"Перенесено в нормализованное хранение документов: {copied} (до id {last_id})")
+    return copied
+
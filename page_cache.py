@@ -0,0 +1,234 @@
+# page_cache: Дисковый кэш символов страниц PDF для повторного разбора без анализа разметки pdfminer.
+# Символы каждой страницы (текст, координаты, upright, size - поля, нужные для поиска опорных слов
+# и извлечения текста) сохраняются в компактном двоичном виде (struct + zlib) в базе SQLite с ключом
+# (SHA-256 файла, номер страницы). При повторном разборе того же файла страницы восстанавливаются из кэша,
+# и заново выполняются только поиск опорных слов, расчет областей и разбор полей.
+# Размер кэша ограничен: при превышении удаляются файлы, которые дольше всего не использовались.
+
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+from pdfplumber.utils import extract_words
+
+from metrics import metrics
+
+LAYER_MAGIC = b'PPLC'
+LAYER_VERSION = 1
+LAYER_HEADER = struct.Struct('<4sH4dI')  # Сигнатура, версия, bbox страницы, количество символов
+CHAR_FLOATS = ('x0', 'x1', 'top', 'bottom', 'doctop', 'size')
+EVICT_CHECK_INTERVAL = 64     # Проверка размера кэша через каждые EVICT_CHECK_INTERVAL записанных страниц
+EVICT_TARGET = 0.9            # Доля предельного размера, до которой кэш сокращается при вытеснении
+TOUCH_INTERVAL = 60           # Минимальный интервал обновления времени использования файла, секунд
+
+
+def encode_layer(bbox, chars):
+    # Упаковка символов страницы: заголовок, координаты float64, признаки upright, длины и UTF-8 тексты.
+    # Аргументы:
+    #   bbox (tuple): Границы страницы.
+    #   chars (list): Символы страницы (словари pdfplumber или backends.LeanPage).
+
+    # Возвращает:
+    #   bytes: Сжатое представление страницы
+
+    count = len(chars)
+    texts = [char['text'].encode('utf-8') for char in chars]
+    parts = [
+        LAYER_HEADER.pack(LAYER_MAGIC, LAYER_VERSION, *bbox, count),
+        struct.pack(f'<{count * len(CHAR_FLOATS)}d', *[char[name] for char in chars for name in CHAR_FLOATS]),
+        bytes(bool(char['upright']) for char in chars),
+        struct.pack(f'<{count}H', *[len(text) for text in texts]),
+        b''.join(texts),
+    ]
+    return zlib.compress(b''.join(parts))
+
+
+def decode_layer(data):
+    # Распаковка страницы, упакованной encode_layer.
+    # Возвращает:
+    #   tuple: Границы страницы и список символов или None, если данные другой версии формата
+
+    data = zlib.decompress(data)
+    magic, version, x0, top, x1, bottom, count = LAYER_HEADER.unpack_from(data)
+    if magic != LAYER_MAGIC or version != LAYER_VERSION:
+        return None
+    offset = LAYER_HEADER.size
+    width = len(CHAR_FLOATS)
+    floats = struct.unpack_from(f'<{count * width}d', data, offset)
+    offset += count * width * 8
+    upright = data[offset:offset + count]
+    offset += count
+    lengths = struct.unpack_from(f'<{count}H', data, offset)
+    offset += count * 2
+    chars = []
+    for i in range(count):
+        text = data[offset:offset + lengths[i]].decode('utf-8')
+        offset += lengths[i]
+        char = dict(zip(CHAR_FLOATS, floats[i * width:(i + 1) * width]))
+        char['text'] = text
+        char['upright'] = bool(upright[i])
+        chars.append(char)
+    return (x0, top, x1, bottom), chars
+
+
+class CachedPage:
+    # Страница, восстановленная из кэша: тот же набор атрибутов, что у backends.LeanPage.
+
+    def __init__(self, bbox, chars):
+        self.bbox = bbox
+        self.chars = chars
+
+    @property
+    def height(self):
+        return self.bbox[3] - self.bbox[1]
+
+    def extract_words(self, **kwargs):
+        # Группировка символов в слова тем же алгоритмом, что и pdfplumber Page.extract_words().
+        return extract_words(self.chars, **kwargs)
+
+    def close(self):
+        self.chars = []
+
+
+class PageLayerCache:
+    # Кэш символов страниц в базе SQLite. Методы можно вызывать из разных потоков; процессы пула
+    # открывают собственное соединение с той же базой.
+
+    def __init__(self, path, max_mb=1024):
+        # Аргументы:
+        #   path (str): Путь к файлу базы SQLite с кэшем.
+        #   max_mb (int): Предельный размер сжатых данных кэша в мегабайтах.
+
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+        self.stores = 0
+
+    def connect(self):
+        # Соединение текущего процесса; после fork процесс пула открывает новое соединение.
+        if self.connection is None or self.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")  # Одновременное чтение и запись из процессов пула
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS layer_files ("
+                "file_hash TEXT PRIMARY KEY, pages INTEGER NOT NULL, size INTEGER NOT NULL DEFAULT 0, "
+                "last_used REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS page_layers ("
+                "file_hash TEXT NOT NULL, page INTEGER NOT NULL, data BLOB NOT NULL, "
+                "PRIMARY KEY (file_hash, page))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_layer_files_last_used ON layer_files (last_used)")
+            connection.commit()
+            self.connection = connection
+            self.pid = os.getpid()
+        return self.connection
+
+    def load_file(self, file_hash, page_range=None):
+        # Проверка, что в кэше есть все страницы файла (или диапазона page_range).
+        # Аргументы:
+        #   file_hash (str): SHA-256 файла.
+        #   page_range (range): Номера страниц с нуля; None - все страницы файла.
+
+        # Возвращает:
+        #   range или None: Номера страниц для read_pages или None, если в кэше есть не все страницы
+
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute("SELECT pages, last_used FROM layer_files WHERE file_hash = ?",
+                                     (file_hash,)).fetchone()
+            if row is None:
+                return None
+            pages, last_used = row
+            numbers = range(pages) if page_range is None else range(page_range.start, min(page_range.stop, pages))
+            if not numbers:
+                return None
+            cached = connection.execute(
+                "SELECT COUNT(*) FROM page_layers WHERE file_hash = ? AND page >= ? AND page < ?",
+                (file_hash, numbers.start, numbers.stop)).fetchone()[0]
+            if cached != len(numbers):
+                return None
+            now = time.time()
+            if now - last_used > TOUCH_INTERVAL:
+                connection.execute("UPDATE layer_files SET last_used = ? WHERE file_hash = ?", (now, file_hash))
+                connection.commit()
+            return numbers
+
+    def read_pages(self, file_hash, numbers):
+        # Последовательное чтение страниц из кэша без загрузки всего файла в память.
+        # Возвращает:
+        #   Iterator[CachedPage]: Страницы в порядке номеров
+
+        for number in numbers:
+            with self.lock:
+                row = self.connect().execute("SELECT data FROM page_layers WHERE file_hash = ? AND page = ?",
+                                             (file_hash, number)).fetchone()
+            if row is None:
+                raise KeyError(f"Страница {number + 1} файла {file_hash} вытеснена из кэша во время чтения")
+            layer = decode_layer(row[0])
+            if layer is None:
+                raise KeyError(f"Страница {number + 1} файла {file_hash} сохранена в другой версии формата")
+            yield CachedPage(*layer)
+
+    def store(self, file_hash, pages, number, page):
+        # Сохранение символов обработанной страницы.
+        # Аргументы:
+        #   file_hash (str): SHA-256 файла.
+        #   pages (int): Количество страниц файла.
+        #   number (int): Номер страницы с нуля.
+        #   page: Страница любого способа чтения (атрибуты bbox и chars).
+
+        # Возвращает:
+        #   None
+
+        with metrics.timer('page_cache.encode'):
+            data = encode_layer(page.bbox, page.chars)
+        with self.lock:
+            connection = self.connect()
+            replaced = connection.execute("SELECT length(data) FROM page_layers WHERE file_hash = ? AND page = ?",
+                                          (file_hash, number)).fetchone()
+            connection.execute("INSERT OR REPLACE INTO page_layers (file_hash, page, data) VALUES (?, ?, ?)",
+                               (file_hash, number, data))
+            connection.execute(
+                "INSERT INTO layer_files (file_hash, pages, size, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (file_hash) DO UPDATE SET pages = excluded.pages, "
+                "size = size + excluded.size, last_used = excluded.last_used",
+                (file_hash, pages, len(data) - (replaced[0] if replaced else 0), time.time()))
+            connection.commit()
+            self.stores += 1
+            if self.stores % EVICT_CHECK_INTERVAL == 0:
+                self.evict(connection)
+        metrics.incr('page_cache.stored_bytes', len(data))
+
+    def evict(self, connection):
+        # Удаление давно не использовавшихся файлов, пока размер кэша выше EVICT_TARGET от предела.
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM layer_files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TARGET
+        evicted = 0
+        for file_hash, size in connection.execute(
+                "SELECT file_hash, size FROM layer_files ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            connection.execute("DELETE FROM page_layers WHERE file_hash = ?", (file_hash,))
+            connection.execute("DELETE FROM layer_files WHERE file_hash = ?", (file_hash,))
+            total -= size
+            evicted += 1
+        connection.commit()
+        metrics.incr('page_cache.evicted_files', evicted)
+        logging.info(f"Из кэша страниц вытеснено файлов: {evicted}, размер кэша {total / 1024 / 1024:.1f} МБ")
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None and self.pid == os.getpid():
+                self.connection.close()
+            self.connection = None
@@ -0,0 +1,113 @@
+# page_index: Пространственный индекс символов страницы PDF.
+# Позволяет извлекать текст из множества прямоугольников страницы за один разбор символов
+# вместо отдельного вызова page.within_bbox(rect).extract_text() для каждого прямоугольника.
+
+from bisect import bisect_left, bisect_right
+
+from pdfplumber.page import test_proposed_bbox
+from pdfplumber.utils import chars_to_textmap, within_bbox
+
+from metrics import metrics
+
+
+def split_words(line, x_tolerance, y_tolerance, words):
+    # Разбиение строки символов на слова с добавлением кортежей (текст, x0, top) в список words.
+    word = []
+    for char in sorted(line, key=lambda char: (char['x0'], char['top'])):
+        if word:
+            previous = word[-1]
+            if char['text'].isspace() or char['x0'] < previous['x0'] \
+                    or char['x0'] > previous['x1'] + x_tolerance or char['top'] > previous['top'] + y_tolerance:
+                words.append((''.join(c['text'] for c in word), word[0]['x0'], min(c['top'] for c in word)))
+                word = []
+        if not char['text'].isspace():
+            word.append(char)
+    if word:
+        words.append((''.join(c['text'] for c in word), word[0]['x0'], min(c['top'] for c in word)))
+
+
+class PageCharIndex:
+    # Индекс символов страницы, упорядоченный по верхней координате символа.
+    # Символы страницы извлекаются один раз при создании индекса.
+
+    def __init__(self, page):
+        # Аргументы:
+        #   page (pdfplumber.Page): Страница PDF файла.
+
+        self.bbox = page.bbox
+        self.chars = page.chars
+        # Номера символов, отсортированные по координате top, и сами координаты для бинарного поиска
+        self.order = sorted(range(len(self.chars)), key=lambda i: self.chars[i]['top'])
+        self.tops = [self.chars[i]['top'] for i in self.order]
+
+    def chars_in_rect(self, rect):
+        # Выбор символов, полностью попадающих в прямоугольник.
+        # Аргументы:
+        #   rect (tuple): Координаты прямоугольника (x0, top, x1, bottom).
+
+        # Возвращает:
+        #   list: Символы в исходном порядке страницы, как у page.within_bbox(rect).chars
+
+        lo = bisect_left(self.tops, rect[1])
+        hi = bisect_right(self.tops, rect[3])
+        candidates = [self.chars[i] for i in sorted(self.order[lo:hi])]  # Восстановление порядка страницы
+        return within_bbox(candidates, rect)
+
+    def chars_near(self, x0, top, radius):
+        # Выбор символов, левый верхний угол которых отстоит от точки (x0, top) не более чем на radius по каждой оси.
+        lo = bisect_left(self.tops, top - radius)
+        hi = bisect_right(self.tops, top + radius)
+        return [char for char in (self.chars[i] for i in self.order[lo:hi]) if abs(char['x0'] - x0) <= radius]
+
+    def words(self, x_tolerance=3, y_tolerance=3):
+        # Слова страницы по тем же правилам, что page.extract_words() с параметрами по умолчанию:
+        # строки - цепочки символов с близкой координатой top, слова - символы строки по возрастанию x0
+        # без пробелов и разрывов больше x_tolerance. Учитывается только горизонтальный текст.
+        # Возвращает:
+        #   list: Кортежи (текст слова, x0, top) по строкам сверху вниз и слева направо
+
+        words = []
+        line, previous_top = [], None
+        for i in self.order:
+            char = self.chars[i]
+            if not char.get('upright', True):
+                continue
+            if line and char['top'] - previous_top > y_tolerance:
+                split_words(line, x_tolerance, y_tolerance, words)
+                line = []
+            line.append(char)
+            previous_top = char['top']
+        if line:
+            split_words(line, x_tolerance, y_tolerance, words)
+        return words
+
+    def text_in_rect(self, rect):
+        # Извлечение текста из прямоугольника тем же способом, что и CroppedPage.extract_text().
+        # Аргументы:
+        #   rect (tuple): Координаты прямоугольника (x0, top, x1, bottom).
+
+        # Возвращает:
+        #   str или None: Извлеченный текст без крайних пробелов или None, если текст не найден.
+
+        test_proposed_bbox(rect, self.bbox)  # Та же проверка границ, что и в page.within_bbox
+        chars = self.chars_in_rect(rect)
+        extracted_text = chars_to_textmap(chars, layout_bbox=rect).as_string if chars else None
+        return extracted_text.strip() if extracted_text else None
+
+    def texts_in_rects(self, rects):
+        # Извлечение текста сразу для всех прямоугольников страницы.
+        # Аргументы:
+        #   rects (dict): Словарь с координатами прямоугольников.
+
+        # Возвращает:
+        #   dict: Ключ - название прямоугольника, значение - извлеченный текст или None
+
+        if not metrics.enabled:
+            return {name: self.text_in_rect(rect) if rect else None for name, rect in rects.items()}
+
+        texts = {}
+        for name, rect in rects.items():
+            with metrics.timer(f'field.{name}'):
+                texts[name] = self.text_in_rect(rect) if rect else None
+            metrics.incr(f'field.{name}.found' if texts[name] else f'field.{name}.empty')
+        return texts
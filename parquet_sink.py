@@ -0,0 +1,131 @@
+# parquet_sink: Запись документов в файлы Parquet для аналитики вместо базы данных.
+# Файлы раскладываются по папкам месяцев даты поступления (admission_month=ГГГГ-ММ, документы без даты -
+# в admission_month=__HIVE_DEFAULT_PARTITION__), поэтому набор читается pyarrow.dataset, pandas, Spark,
+# DuckDB и др. с отбором месяцев по имени папки. Каждая запись добавляет новые файлы частей, существующие
+# файлы не переписываются. Содержимое PDF файлов в Parquet не попадает, только ссылка file_hash.
+# Требуется библиотека pyarrow (pip install pyarrow); она загружается только при создании ParquetSink.
+
+import logging
+import os
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import bd
+from dataframe import create_rows
+from metrics import metrics
+
+PARTITION_KEY = 'admission_month'
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'  # Имя папки для пустого значения, как в Hive и pyarrow
+COMPRESSION = 'zstd'
+
+
+def arrow_schema(pa):
+    # Схема файлов Parquet: типы совпадают с колонками таблицы documents.
+    # Аргументы:
+    #   pa (module): Модуль pyarrow.
+
+    # Возвращает:
+    #   pyarrow.Schema: Схема записи
+
+    text_columns = ('payer_name', 'payer_inn', 'payer_kpp', 'payer_account',
+                    'recipient_name', 'recipient_inn', 'recipient_kpp', 'recipient_account',
+                    'payer_bank_name', 'payer_bank_bik', 'payer_bank_account',
+                    'recipient_bank_name', 'recipient_bank_bik', 'recipient_bank_account',
+                    'purpose', 'file_path', 'unique_identifier', 'file_hash')
+    return pa.schema(
+        [pa.field('number', pa.int64()), pa.field('admission_date', pa.date32()),
+         pa.field('debited_date', pa.date32()), pa.field('summa', pa.decimal128(12, 2))]
+        + [pa.field(name, pa.string()) for name in text_columns]
+        + [pa.field('page_number', pa.int32())]
+    )
+
+
+def to_record(row, page_number):
+    # Приведение строки документа (dataframe.create_rows) к типам схемы arrow_schema.
+    number = row['number']
+    summa = row['summa']
+    record = dict(row)
+    record['number'] = int(number) if number else None
+    record['summa'] = Decimal(f"{summa:.2f}") if summa is not None else None
+    for name in ('admission_date', 'debited_date'):
+        record[name] = row[name].date() if row[name] is not None else None
+    record['unique_identifier'] = bd.make_unique_identifier(row['number'], row['admission_date'],
+                                                            row['payer_name'], row['recipient_name'])
+    record['page_number'] = page_number
+    return record
+
+
+def partition_name(record):
+    # Папка месяца даты поступления документа.
+    admission_date = record['admission_date']
+    return f"{PARTITION_KEY}={admission_date:%Y-%m}" if admission_date else f"{PARTITION_KEY}={NULL_PARTITION}"
+
+
+class ParquetSink:
+    # Добавление порций документов в набор файлов Parquet, разбитый по месяцам даты поступления.
+
+    def __init__(self, root, compression=COMPRESSION):
+        # Аргументы:
+        #   root (str): Корневая папка набора.
+        #   compression (str): Сжатие столбцов Parquet.
+
+        # Исключения:
+        #   ImportError: Не установлена библиотека pyarrow.
+
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Для записи в Parquet требуется библиотека pyarrow (pip install pyarrow)") from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.schema = arrow_schema(pyarrow)
+        self.root = root
+        self.compression = compression
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, documents):
+        # Запись порции документов: по одному новому файлу на каждый месяц порции.
+        # Файл пишется под временным именем с точкой в начале (такие файлы читатели набора пропускают)
+        # и переименовывается после записи, поэтому читатель не видит файл наполовину записанным.
+        # Аргументы:
+        #   documents (list): Список экземпляров PaymentDocument.
+
+        # Возвращает:
+        #   bool: True, если все файлы порции записаны
+
+        if not documents:
+            return True
+        with metrics.timer('parquet.prepare'):
+            rows = create_rows(documents)
+            partitions = {}
+            for doc, row in zip(documents, rows):
+                record = to_record(row, doc.page_number)
+                partitions.setdefault(partition_name(record), []).append(record)
+
+        part_name = f"part-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:12]}.parquet"
+        written = []
+        try:
+            for partition, records in sorted(partitions.items()):
+                folder = os.path.join(self.root, partition)
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, part_name)
+                temp_path = os.path.join(folder, f".{part_name}.tmp")
+                with metrics.timer('parquet.write'):
+                    table = self.pa.Table.from_pylist(records, schema=self.schema)
+                    self.pq.write_table(table, temp_path, compression=self.compression)
+                    os.replace(temp_path, path)
+                written.append(path)
+                metrics.incr('parquet.rows', len(records))
+        except (OSError, self.pa.ArrowException) as e:
+            logging.error(f"Ошибка записи Parquet в {self.root}: {e}")
+            # Порция повторяется целиком при следующем запуске, поэтому уже записанные ее части удаляются
+            for path in written:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return False
+        logging.info(f"Записано в Parquet документов: {len(documents)}, месяцев: {len(partitions)}")
+        return True
@@ -1,136 +1,340 @@
 # pdf_parser: Обработка и извлечение данных из PDF файлов.
 # Включает функции для чтения PDF, извлечения текстовых данных и их структурирования.
 
-import pdfplumber
 import os
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PaymentDocument_Class import COLUMNS, PaymentDocument
+import log_config
+from backends import DEFAULT_BACKEND, get_backend, page_count
+from file_store import file_sha256
+from page_index import PageCharIndex
+from layout_cache import LayoutCache
+from memory import MemoryGuard, current_rss_kb
+from metrics import metrics
+from page_cache import PageLayerCache
+from sources import list_input_files
+
+# Кэш шаблонов разметки; у каждого процесса пула собственный экземпляр
+layout_cache = LayoutCache(maxsize=32)
+# Режим ограниченной памяти; настраивается configure_memory и передается процессам пула при их запуске
+memory_guard = MemoryGuard()
+# Дисковый кэш символов страниц; None - кэш выключен (см. configure_page_cache)
+page_cache = None
+
+
+def configure_memory(rss_limit_mb=0, reopen_pages=0):
+    # Настройка режима ограниченной памяти для обработки больших PDF файлов.
+    # Аргументы:
+    #   rss_limit_mb (int): Предел RSS процесса в мегабайтах; 0 - без ограничения.
+    #   reopen_pages (int): Переоткрывать PDF файл каждые reopen_pages страниц; 0 - не переоткрывать.
+
+    # Возвращает:
+    #   None
+
+    memory_guard.configure(rss_limit_mb, reopen_pages)
 
-from PaymentDocument_Class import PaymentDocument
+
+def configure_page_cache(path=None, max_mb=1024):
+    # Включение дискового кэша символов страниц.
+    # Аргументы:
+    #   path (str): Путь к файлу кэша (SQLite); None - кэш выключен.
+    #   max_mb (int): Предельный размер кэша в мегабайтах.
+
+    # Возвращает:
+    #   None
+
+    global page_cache
+    if page_cache is not None:
+        page_cache.close()
+    page_cache = PageLayerCache(path, max_mb) if path else None
 
 
 def get_pdf_files(input_folder):
-    # Получение списка PDF файлов из заданной папки.
+    # Получение списка PDF файлов из заданной папки, включая PDF файлы архивов ZIP и tar.gz в ней.
     # Аргументы:
     #   input_folder (str): Путь к папке, содержащей PDF файлы.
 
     # Возвращает:
-    #   List[str]: Список путей к PDF файлам в указанной папке.
+    #   List[str]: Список путей к PDF файлам в указанной папке; файлы архивов - в виде <архив>!/<имя в архиве>.
 
     logging.info(f"Поиск PDF файлов в папке: {input_folder}")
-    return [f for f in os.listdir(input_folder) if f.lower().endswith('.pdf')]
+    # Одинаковый порядок обработки при каждом запуске (см. sources.list_input_files)
+    return list_input_files(input_folder)
 
 
-def open_pdf_file(pdf_path):
-    # Открытие PDF файла с использованием библиотеки pdfplumber.
+def open_pdf_file(pdf_path, backend=DEFAULT_BACKEND, page_range=None):
+    # Открытие PDF файла выбранным способом чтения (см. backends).
     # Аргументы:
     #   pdf_path (str): Путь к PDF файлу.
+    #   backend (str): Название способа чтения: 'pdfplumber' или 'pdfminer'.
+    #   page_range (range): Номера страниц с нуля, которые нужно прочитать; None - все страницы.
 
     # Возвращает:
-    #   pdfplumber.PDF: Объект PDF файла, открытый для чтения.
+    #   Объект PDF файла, открытый для чтения: контекстный менеджер со страницами в pages.
+
+    return get_backend(backend).open(pdf_path, page_range)
 
-    return pdfplumber.open(pdf_path)
 
+def iter_pages(pdf_path, backend=DEFAULT_BACKEND, page_range=None):
+    # Обход страниц PDF файла; кэши символов и слов каждой страницы освобождаются сразу после ее обработки.
+    # В режиме ограниченной памяти файл переоткрывается каждые memory_guard.reopen_pages страниц, а также
+    # после превышения предела RSS: при закрытии освобождаются кэши документа (шрифты, ресурсы, объекты страниц).
+    # Аргументы:
+    #   pdf_path (str): Путь к PDF файлу.
+    #   backend (str): Название способа чтения PDF.
+    #   page_range (range): Номера страниц с нуля; None - все страницы.
 
-def process_pdf_file(filename, input_folder):
+    # Возвращает:
+    #   Iterator: Страницы файла по порядку
+
+    # Исключения:
+    #   MemoryError: RSS остался выше предела после освобождения памяти.
+
+    if not memory_guard.active:
+        with open_pdf_file(pdf_path, backend, page_range) as pdf:
+            for page in pdf.pages:
+                yield page
+                page.close()
+        return
+
+    if page_range is None:
+        page_range = range(page_count(pdf_path))
+    position = page_range.start
+    while position < page_range.stop:
+        start = position
+        stop = min(start + memory_guard.reopen_pages, page_range.stop) if memory_guard.reopen_pages \
+            else page_range.stop
+        over_limit = False
+        with open_pdf_file(pdf_path, backend, range(start, stop)) as pdf:
+            for page in pdf.pages:
+                yield page
+                page.close()
+                position += 1
+                over_limit = memory_guard.over_limit()
+                if over_limit:
+                    break  # Файл переоткрывается со следующей страницы
+        if position == start:
+            break  # Страниц меньше, чем указано в каталоге документа
+        if position < page_range.stop:
+            metrics.incr('file.reopened')
+            if over_limit:
+                memory_guard.wait_for_memory(f"{os.path.basename(pdf_path)}, страница {position + 1}")
+
+
+def iter_layer_pages(pdf_path, file_hash, backend=DEFAULT_BACKEND, page_range=None):
+    # Обход страниц с использованием кэша символов: если все страницы файла (или диапазона) уже есть в кэше,
+    # они восстанавливаются без открытия PDF; иначе файл разбирается, и символы каждой страницы после
+    # ее обработки сохраняются в кэш.
+    # Аргументы:
+    #   pdf_path (str): Путь к PDF файлу.
+    #   file_hash (str): SHA-256 файла - ключ кэша.
+    #   backend (str): Название способа чтения PDF.
+    #   page_range (range): Номера страниц с нуля; None - все страницы.
+
+    # Возвращает:
+    #   Iterator: Страницы файла по порядку
+
+    if page_cache is None:
+        yield from iter_pages(pdf_path, backend, page_range)
+        return
+    numbers = page_cache.load_file(file_hash, page_range)
+    if numbers is not None:
+        metrics.incr('page_cache.file_hits')
+        yield from page_cache.read_pages(file_hash, numbers)
+        return
+    metrics.incr('page_cache.file_misses')
+    pages = page_count(pdf_path)
+    first_page = page_range.start if page_range is not None else 0
+    for number, page in enumerate(iter_pages(pdf_path, backend, page_range), start=first_page):
+        yield page
+        page_cache.store(file_hash, pages, number, page)  # Страница еще не закрыта, символы в памяти
+
+
+def process_pdf_file(filename, input_folder, backend=DEFAULT_BACKEND, page_range=None, file_hash=None):
     # Обработка отдельного PDF файла и извлечение информации о платежных документах.
     # Аргументы:
     #   filename (str): Название PDF файла для обработки.
     #   input_folder (str): Путь к папке, содержащей PDF файл.
+    #   backend (str): Название способа чтения PDF.
+    #   page_range (range): Номера страниц с нуля для обработки части файла; None - весь файл.
+    #   file_hash (str): Уже вычисленный SHA-256 файла; None - вычисляется здесь.
 
     # Возвращает:
     #   List[PaymentDocument]: Список объектов PaymentDocument, содержащих информацию из PDF файла.
 
-    logging.info(f"Обработка PDF файла: {filename}")
+    pages_note = f", страницы {page_range.start + 1}-{page_range.stop}" if page_range is not None else ""
+    logging.debug("Обработка PDF файла: %s%s", filename, pages_note)
+    started = time.perf_counter()
+    layout_hits, layout_misses = layout_cache.hits, layout_cache.misses
     pdf_path = os.path.join(input_folder, filename)  # Получение полного пути к файлу
+    if file_hash is None:
+        with metrics.timer('file.hash'):
+            file_hash = file_sha256(pdf_path)        # Хеш содержимого, по которому документы ссылаются на файл
+    first_page = page_range.start if page_range is not None else 0
     documents = []
-    with open_pdf_file(pdf_path) as pdf:  # Открытие PDF файла для чтения
-        for page_number, page in enumerate(pdf.pages):
-            doc = process_page(page, filename)  # Обработка каждой страницы PDF файла
+    page_total = 0
+    peak_rss = current_rss_kb()  # Пиковый RSS обработки файла по замерам после каждой страницы
+    with metrics.timer('file.total'):
+        pages = iter_layer_pages(pdf_path, file_hash, backend, page_range)
+        for page_number, page in enumerate(pages, start=first_page + 1):
+            with metrics.timer('page.total'):
+                doc = process_page(page, filename)  # Обработка каждой страницы PDF файла
+            peak_rss = max(peak_rss, current_rss_kb())
+            page_total += 1
+            metrics.incr('pages')
             if doc:
                 doc.file_path = pdf_path  # Сохранение пути к исходному PDF файлу в объекте PaymentDocument
+                doc.file_hash = file_hash
+                doc.page_number = page_number
                 documents.append(doc)     # Добавление обработанного документа в список documents
-    logging.info(f"Обработка PDF файла завершена: {filename}")
+    if first_page == 0:
+        metrics.incr('files')  # Файл, разбитый на части, учитывается один раз
+    metrics.incr('documents', len(documents))
+    metrics.set_max('file.peak_rss_kb', peak_rss)
+    log_file_summary(filename, pages_note, page_total, documents, time.perf_counter() - started, peak_rss,
+                     layout_cache.hits - layout_hits, layout_cache.misses - layout_misses)
     return documents
 
 
+# Поля документа, заполнение которых учитывается в итогах обработки файла
+SUMMARY_FIELDS = tuple(column for column in COLUMNS if column not in ('file_path', 'unique_identifier', 'file_hash'))
+
+
+def log_file_summary(filename, pages_note, pages, documents, seconds, peak_rss, layout_hits, layout_misses):
+    # Одна запись журнала с итогами обработки файла вместо записей по каждой странице и полю.
+    # Итоги передаются и отдельными полями (extra['summary']) для журнала в формате JSON.
+    # Аргументы:
+    #   filename (str): Название PDF файла.
+    #   pages_note (str): Диапазон страниц для части файла или пустая строка.
+    #   pages (int): Количество обработанных страниц.
+    #   documents (list): Извлеченные документы.
+    #   seconds (float): Время обработки файла.
+    #   peak_rss (int): Пиковый RSS обработки в килобайтах.
+    #   layout_hits (int): Страницы, области которых взяты из кэша шаблонов.
+    #   layout_misses (int): Страницы, для которых области рассчитывались заново.
+
+    # Возвращает:
+    #   None
+
+    empty_fields = {}
+    for doc in documents:
+        for field, value in zip(COLUMNS, doc.as_tuple()):
+            if value is None and field in SUMMARY_FIELDS:
+                empty_fields[field] = empty_fields.get(field, 0) + 1
+    misses = pages - len(documents)
+    summary = {
+        'file': filename, 'pages': pages, 'documents': len(documents), 'pages_without_data': misses,
+        'empty_fields': empty_fields, 'layout_hits': layout_hits, 'layout_misses': layout_misses,
+        'seconds': round(seconds, 3), 'peak_rss_mb': round(peak_rss / 1024, 1),
+    }
+    empty_note = ', '.join(f"{field} {count}" for field, count in sorted(empty_fields.items())) or 'нет'
+    # Страницы без данных не останавливают обработку, но требуют внимания
+    logging.log(logging.WARNING if misses else logging.INFO,
+                "Файл %s%s обработан: страниц %d, документов %d, страниц без данных %d, незаполненные поля: %s; "
+                "шаблоны %d/%d; %.2f с; пиковый RSS %.1f МБ",
+                filename, pages_note, pages, len(documents), misses, empty_note, layout_hits, layout_misses,
+                seconds, peak_rss / 1024, extra={'summary': summary})
+
+
 def process_page(page, filename):
     # Обработка отдельной страницы PDF файла для извлечения информации о платежном документе.
     # Аргументы:
-    #   page (pdfplumber.Page): Страница PDF файла.
+    #   page (pdfplumber.Page или backends.LeanPage): Страница PDF файла.
     #   filename (str): Имя файла, из которого была получена страница.
 
     # Возвращает:
     #   PaymentDocument или None: Объект PaymentDocument с извлеченной информацией или None, если информация не найдена.
 
-    word_categories = extract_words_from_page(page)  # Извлечение слов со страницы и их категоризация
-    rects = determine_coordinates(word_categories)   # Определение координат для слов на странице
-    doc = PaymentDocument()                          # Создание нового объекта PaymentDocument для хранения информации
+    with metrics.timer('page.char_index'):
+        index = PageCharIndex(page)          # Индекс символов страницы для извлечения текста из областей
+    with metrics.timer('page.layout_lookup'):
+        anchor_set = page_anchor_set(index)
+        # Области из известного шаблона разметки, если страница ему соответствует
+        rects = layout_cache.lookup(index, anchor_set)
+    if rects is None:
+        with metrics.timer('page.extract_words'):
+            word_categories = extract_words_from_page(page)  # Извлечение слов со страницы и их категоризация
+        with metrics.timer('page.determine_coordinates'):
+            rects = determine_coordinates(word_categories)   # Определение координат для слов на странице
+        if rects is not None:
+            layout_cache.store(index, word_categories, rects, anchor_set)
+    doc = PaymentDocument()  # Создание нового объекта PaymentDocument для хранения информации
 
     if rects is None:
-        logging.error(f"В файле {filename} не найдены все необходимые данные.")
+        logging.debug("В файле %s не найдены все необходимые данные.", filename)  # Учитывается в итогах файла
         return None
 
+    # Извлечение текста всех областей за один разбор символов страницы
+    with metrics.timer('page.field_extraction'):
+        texts = index.texts_in_rects(rects)
+
     # Извлечение информации о плательщике
-    payer_info = extract_text_from_rect(page, rects.get('payer_rect'))
-    payer_account_info = extract_text_from_rect(page, rects.get('payer_account_rect'))
+    payer_info = texts.get('payer_rect')
+    payer_account_info = texts.get('payer_account_rect')
     if payer_info:
         doc.payer = doc.process_entity_data(payer_info, payer_account_info)
-        logging.info(f"Данные плательщика успешно извлечены:\n {doc.payer}")
+        logging.debug("Данные плательщика успешно извлечены:\n %s", doc.payer)
 
     # Извлечение информации о получателе
-    recipient_info = extract_text_from_rect(page, rects.get('recipient_rect'))
-    recipient_account_info = extract_text_from_rect(page, rects.get('recipient_account_rect'))
+    recipient_info = texts.get('recipient_rect')
+    recipient_account_info = texts.get('recipient_account_rect')
     if recipient_info:
         doc.recipient = doc.process_entity_data(recipient_info, recipient_account_info)
-        logging.info(f"Данные получателя успешно извлечены:\n {doc.recipient}")
+        logging.debug("Данные получателя успешно извлечены:\n %s", doc.recipient)
 
     # Извлечение информации о получателе
-    sum_info = extract_text_from_rect(page, rects.get('summa_rect'))
+    sum_info = texts.get('summa_rect')
     if sum_info:
         doc.summa = doc.process_sum(sum_info)
-        logging.info(f"Данные суммы успешно извлечены:\n {doc.summa}")
+        logging.debug("Данные суммы успешно извлечены:\n %s", doc.summa)
 
     # Извлечение номера платежного поручения
-    number_info = extract_text_from_rect(page, rects.get('payment_number_rect'))
+    number_info = texts.get('payment_number_rect')
     if number_info:
         doc.number = doc.process_number(number_info)
-        logging.info(f"Данные номера поручения успешно извлечены:\n {doc.number}")
+        logging.debug("Данные номера поручения успешно извлечены:\n %s", doc.number)
 
     # Извлечение даты поступления документа
-    admission_date_info = extract_text_from_rect(page, rects.get('admission_date_section_rect'))
+    admission_date_info = texts.get('admission_date_section_rect')
     if admission_date_info:
         doc.admission_date = admission_date_info.strip()
-        logging.info(f"Данные даты поступления успешно извлечены:\n {doc.admission_date}")
+        logging.debug("Данные даты поступления успешно извлечены:\n %s", doc.admission_date)
 
     # Извлечение назначения платежа
-    purpose_info = extract_text_from_rect(page, rects.get('purpose_rect'))
+    purpose_info = texts.get('purpose_rect')
     if purpose_info:
         doc.purpose = purpose_info.strip()
-        logging.info(f"Данные назначения платежа успешно извлечены:\n {doc.purpose}")
+        logging.debug("Данные назначения платежа успешно извлечены:\n %s", doc.purpose)
 
     # Извлечение информации о банке плательщика
-    payer_bank_info = extract_text_from_rect(page, rects.get('payer_bank_rect'))
-    payer_bank_bik_info = extract_text_from_rect(page, rects.get('payer_bank_bik_rect'))
-    payer_bank_account_info = extract_text_from_rect(page, rects.get('payer_bank_account_rect'))
+    payer_bank_info = texts.get('payer_bank_rect')
+    payer_bank_bik_info = texts.get('payer_bank_bik_rect')
+    payer_bank_account_info = texts.get('payer_bank_account_rect')
     if payer_bank_info:
         doc.payer_bank = {'name': payer_bank_info, 'bik': payer_bank_bik_info,
                           'account': payer_bank_account_info}
-        logging.info(f"Данные банка плательщика успешно извлечены:\n {doc.payer_bank}")
+        logging.debug("Данные банка плательщика успешно извлечены:\n %s", doc.payer_bank)
 
     # Извлечение информации о банке получателя
-    recipient_bank_info = extract_text_from_rect(page, rects.get('recipient_bank_rect'))
-    recipient_bank_bik_info = extract_text_from_rect(page, rects.get('recipient_bank_bik_rect'))
-    recipient_bank_account_info = extract_text_from_rect(page, rects.get('recipient_bank_account_rect'))
+    recipient_bank_info = texts.get('recipient_bank_rect')
+    recipient_bank_bik_info = texts.get('recipient_bank_bik_rect')
+    recipient_bank_account_info = texts.get('recipient_bank_account_rect')
     if recipient_bank_info:
         doc.recipient_bank = {'name': recipient_bank_info, 'bik': recipient_bank_bik_info,
                               'account': recipient_bank_account_info}
-        logging.info(f"Данные банка получателя успешно извлечены:\n {doc.payer_bank}")
+        logging.debug("Данные банка получателя успешно извлечены:\n %s", doc.recipient_bank)
 
     # Извлечение даты списания средств
-    debited_date_info = extract_text_from_rect(page, rects.get('debited_date_section_rect'))
+    debited_date_info = texts.get('debited_date_section_rect')
     if debited_date_info:
         doc.debited_date = debited_date_info.strip()
-        logging.info(f"Данные даты списания успешно извлечены:\n {doc.debited_date}")
+        logging.debug("Данные даты списания успешно извлечены:\n %s", doc.debited_date)
 
     return doc
 
@@ -144,14 +348,29 @@ def extract_text_from_rect(page, rect):
     # Возвращает:
     #   str или None: Извлеченный текст или None, если текст не найден.
     if rect:
-        # Извлечение текста в указанных координатах прямоугольника
-        extracted_text = page.within_bbox(rect).extract_text()
-
-        # Удаление лишних пробелов из извлеченного текста и возврат результата
-        return extracted_text.strip() if extracted_text else None
+        # Извлечение текста в указанных координатах прямоугольника, как page.within_bbox(rect).extract_text(),
+        # с удалением лишних пробелов; работает со страницами любого способа чтения
+        return PageCharIndex(page).text_in_rect(rect)
     return None
 
 
+# Ключ - слово для поиска. Значение - ключ из word_categories и действие ('append' или 'assign')
+CATEGORY_MAPPING = {
+    'ИНН': ('inn', 'append'),
+    'Плательщик': ('payer', 'assign'),
+    'Получатель': ('recipient', 'assign'),
+    'БИК': ('bik', 'append'),
+    'Поступ.': ('admission_date', 'assign'),
+    'Сумма': ('summa', 'append'),
+    'ПОРУЧЕНИЕ': ('number', 'assign'),
+    'Назначение': ('purpose', 'assign'),
+    'плательщика': ('payer_bank', 'assign'),
+    'получателя': ('recipient_bank', 'assign'),
+    'списано': ('debited_date', 'assign')
+}
+ANCHOR_PREFIXES = tuple(key.lower() for key in CATEGORY_MAPPING)
+
+
 def extract_words_from_page(page):
     # Извлечение и категоризация слов со страницы PDF для последующего определения координат.
     # Аргументы:
@@ -160,7 +379,7 @@ def extract_words_from_page(page):
     # Возвращает:
     #   dict: Словарь с категориями слов и их координатами.
 
-    logging.info(f"Извлечение координат.")
+    logging.debug("Извлечение координат.")
     words = page.extract_words()  # Извлечение списка слов с их координатами со страницы
     word_categories = {  # Ключи - категории информации, значения - извлеченные данные
         'payer': None, 'recipient': None, 'bik': [],
@@ -169,41 +388,48 @@ def extract_words_from_page(page):
         'recipient_bank': None, 'debited_date': None
     }
 
-    # Ключ - слово для поиска. Значение - ключ из word_categories и действие ('append' или 'assign')
-    category_mapping = {
-        'ИНН': ('inn', 'append'),
-        'Плательщик': ('payer', 'assign'),
-        'Получатель': ('recipient', 'assign'),
-        'БИК': ('bik', 'append'),
-        'Поступ.': ('admission_date', 'assign'),
-        'Сумма': ('summa', 'append'),
-        'ПОРУЧЕНИЕ': ('number', 'assign'),
-        'Назначение': ('purpose', 'assign'),
-        'плательщика': ('payer_bank', 'assign'),
-        'получателя': ('recipient_bank', 'assign'),
-        'списано': ('debited_date', 'assign')
-    }
-
-    # Перебор всех слов на странице для категоризации в соответствии с category_mapping
+    # Перебор всех слов на странице для категоризации в соответствии с CATEGORY_MAPPING
     for word in words:
-        word_text = word['text'].lower()
-        found = False
-        # Проверка, соответствует ли текст слова ключевым словам для категоризации
-        for key, (category, action) in category_mapping.items():
-            if word_text == key.lower():
-                found = True
-                process_word(word, category, action, word_categories)
-                break
-        if not found:
-            # Если прямое соответствие не найдено, проверка на соответствие началу слова
-            for key, (category, action) in category_mapping.items():
-                if word_text.startswith(key.lower()):
-                    process_word(word, category, action, word_categories)
-                    break
+        mapping = word_category(word['text'])
+        if mapping:
+            process_word(word, *mapping, word_categories)
 
     return word_categories
 
 
+def word_category(text):
+    # Категория опорного слова: сначала проверяется точное совпадение с ключевым словом, затем начало слова.
+    # Аргументы:
+    #   text (str): Текст слова.
+
+    # Возвращает:
+    #   tuple или None: Ключ из word_categories и действие или None, если слово не опорное
+
+    word_text = text.lower()
+    for key, mapping in CATEGORY_MAPPING.items():
+        if word_text == key.lower():
+            return mapping
+    for key, mapping in CATEGORY_MAPPING.items():
+        if word_text.startswith(key.lower()):
+            return mapping
+    return None
+
+
+def page_anchor_set(index):
+    # Все опорные слова страницы с округленными позициями. Кэш шаблонов сравнивает их с набором страницы,
+    # по которой построен шаблон: лишнее опорное слово меняет категории extract_words_from_page
+    # (например, последнее слово 'assign'), даже если опорные слова шаблона остались на месте.
+    # Аргументы:
+    #   index (PageCharIndex): Индекс символов страницы.
+
+    # Возвращает:
+    #   tuple: Кортежи (текст слова, x0, top) в порядке слов на странице
+
+    # Опорное слово начинается с ключевого слова (точное совпадение - частный случай, см. word_category)
+    return tuple((text, round(x0), round(top)) for text, x0, top in index.words()
+                 if text.lower().startswith(ANCHOR_PREFIXES))
+
+
 def process_word(word, category, action, word_categories):
     # Обработка слова для добавления в соответствующую категорию в word_categories.
     # Аргументы:
@@ -231,7 +457,7 @@ def determine_coordinates(word_categories):
     # Возвращает:
     #   dict: Словарь с координатами всех прямоугольников или None.
 
-    logging.info(f"Определение областей для извлечения данных.")
+    logging.debug("Определение областей для извлечения данных.")
 
     # Присваивание координат каждой категории слов
     inn_coordinates = word_categories['inn']
@@ -250,7 +476,7 @@ def determine_coordinates(word_categories):
     if (len(inn_coordinates) >= 2 and payer_coordinates and recipient_coordinates and len(bik_coordinates) >= 2 and
             admission_date_coordinates and len(summa_coordinates) >= 2 and number_coordinates and purpose_coordinates
             and payer_bank_coordinates and recipient_bank_coordinates and debited_date_coordinates):
-        logging.info(f"Все координаты получены.")
+        logging.debug("Все координаты получены.")
         rect_definitions = {  # Ключ - название прямоугольника, значения - координаты и смещения для каждой стороны
             'payer_rect': {
                 'left': [payer_coordinates['x0'], -10], 'right': [bik_coordinates[0]['x0'], -3],
@@ -321,20 +547,371 @@ def determine_coordinates(word_categories):
             rects[name] = (left, top, right, bottom)  # Сохранение координат в словаре rects
 
         return rects
-    logging.error(f"Не удалось определить все области.")
+    logging.debug("Не удалось определить все области.")
+    if metrics.enabled:
+        count_anchor_misses(word_categories)
     return None
 
 
-def parser_main(input_folder):
+# Минимальное количество опорных слов каждой категории, необходимое determine_coordinates
+REQUIRED_ANCHORS = {
+    'inn': 2, 'payer': 1, 'recipient': 1, 'bik': 2, 'admission_date': 1, 'summa': 2, 'number': 1,
+    'purpose': 1, 'payer_bank': 1, 'recipient_bank': 1, 'debited_date': 1
+}
+
+
+def count_anchor_misses(word_categories):
+    # Учет в метриках категорий опорных слов, которых не хватило для определения областей.
+    # Аргументы:
+    #   word_categories (dict): Словарь с категориями слов и их координатами.
+
+    # Возвращает:
+    #   None
+
+    metrics.incr('anchor_miss.pages')
+    for category, required in REQUIRED_ANCHORS.items():
+        value = word_categories[category]
+        found = len(value) if isinstance(value, list) else int(bool(value))
+        if found < required:
+            metrics.incr(f'anchor_miss.{category}')
+
+
+def process_pdf_file_safe(filename, input_folder, backend=DEFAULT_BACKEND, page_range=None, file_hash=None):
+    # Обработка PDF файла с перехватом ошибок, чтобы сбой в одном файле не прерывал обработку остальных.
+    # Используется как задача для пула процессов, поэтому объявлена на уровне модуля.
+    # Аргументы:
+    #   filename (str): Название PDF файла для обработки.
+    #   input_folder (str): Путь к папке, содержащей PDF файл.
+
+    # Возвращает:
+    #   tuple: Название файла и список объектов PaymentDocument или None, если обработка завершилась ошибкой.
+
+    try:
+        return filename, process_pdf_file(filename, input_folder, backend, page_range, file_hash)
+    except Exception as e:
+        logging.error(f"Ошибка при обработке PDF файла {filename}: {e}")
+        return filename, None
+
+
+def process_pdf_file_measured(filename, input_folder, backend=DEFAULT_BACKEND, page_range=None, file_hash=None):
+    # Обработка PDF файла в процессе пула со сбором метрик этого файла для передачи в основной процесс.
+    # Аргументы:
+    #   filename (str): Название PDF файла для обработки.
+    #   input_folder (str): Путь к папке, содержащей PDF файл.
+
+    # Возвращает:
+    #   tuple: Результат process_pdf_file_safe и снимок метрик обработки файла
+
+    metrics.reset()
+    result = process_pdf_file_safe(filename, input_folder, backend, page_range, file_hash)
+    return result, metrics.snapshot()
+
+
+def init_worker(metrics_enabled, rss_limit_mb, reopen_pages, page_cache_path, page_cache_mb, log_queue, log_level):
+    # Инициализация процесса пула: журнал, сбор метрик, режим ограниченной памяти и кэш страниц
+    # как в основном процессе.
+    if log_queue is not None:
+        log_config.setup_worker_logging(log_queue, log_level)  # Записи выводит поток основного процесса
+    metrics.set_enabled(metrics_enabled)
+    configure_memory(rss_limit_mb, reopen_pages)
+    configure_page_cache(page_cache_path, page_cache_mb)
+
+
+def create_executor(workers):
+    # Создание пула процессов с теми же настройками сбора метрик, памяти и кэша страниц, что и у основного процесса.
+    cache_settings = (page_cache.path, page_cache.max_bytes // (1024 * 1024)) if page_cache is not None else (None, 0)
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(metrics.enabled, memory_guard.rss_limit_kb // 1024,
+                                         memory_guard.reopen_pages) + cache_settings
+                               + (log_config.log_queue, logging.getLogger().level))
+
+
+def submit_pdf_file(executor, filename, input_folder, backend=DEFAULT_BACKEND, page_range=None, file_hash=None):
+    # Постановка обработки PDF файла (или его части page_range) в пул процессов;
+    # способ чтения передается по названию.
+    # Возвращает:
+    #   Future: Задача, результат которой получается через pdf_file_result
+
+    if metrics.enabled:
+        return executor.submit(process_pdf_file_measured, filename, input_folder, backend, page_range, file_hash)
+    return executor.submit(process_pdf_file_safe, filename, input_folder, backend, page_range, file_hash)
+
+
+def pdf_file_result(future, filename=None):
+    # Получение результата задачи submit_pdf_file с добавлением метрик процесса пула к метрикам основного процесса.
+    # Аргументы:
+    #   future (Future): Задача submit_pdf_file.
+    #   filename (str): Название файла задачи для отчета, если процесс пула завершился аварийно.
+
+    # Возвращает:
+    #   tuple: Название файла и список документов (None, если файл не удалось обработать)
+
+    try:
+        result = future.result()
+    except BrokenProcessPool as e:
+        # Процесс пула завершился аварийно (например, остановлен по нехватке памяти): все задачи,
+        # бывшие в работе в этом пуле, считаются необработанными, как при ошибке в process_pdf_file_safe
+        logging.error(f"Ошибка при обработке PDF файла {filename}: процесс пула завершился аварийно ({e})")
+        metrics.incr('pool.broken_tasks')
+        return filename, None
+    if metrics.enabled:
+        result, snapshot = result
+        metrics.merge(snapshot)
+    return result
+
+
+def submit_pdf_file_shards(executor, filename, input_folder, backend=DEFAULT_BACKEND, shard_pages=0, file_hash=None):
+    # Постановка обработки PDF файла в пул процессов с разбиением большого файла на диапазоны страниц;
+    # каждая часть открывает файл самостоятельно в своем процессе.
+    # Аргументы:
+    #   executor (ProcessPoolExecutor): Пул процессов.
+    #   filename (str): Название PDF файла.
+    #   input_folder (str): Путь к папке, содержащей PDF файл.
+    #   backend (str): Название способа чтения PDF.
+    #   shard_pages (int): Количество страниц в одной части; 0 - файл обрабатывается целиком.
+    #   file_hash (str): Уже вычисленный SHA-256 файла; None - вычисляется при разборе.
+
+    # Возвращает:
+    #   list: Задачи частей файла в порядке страниц (результат получается через pdf_file_shards_result)
+
+    if shard_pages:
+        pdf_path = os.path.join(input_folder, filename)
+        try:
+            pages = page_count(pdf_path)
+        except Exception as e:
+            logging.warning(f"Не удалось определить количество страниц файла {filename}: {e}")
+            pages = 0  # Файл обрабатывается целиком, ошибка будет получена при его разборе
+        if pages > shard_pages:
+            if file_hash is None:
+                with metrics.timer('file.hash'):
+                    file_hash = file_sha256(pdf_path)  # Хеш вычисляется один раз на весь файл
+            logging.info(f"Файл {filename} ({pages} страниц) разбит на части по {shard_pages} страниц")
+            return [submit_pdf_file(executor, filename, input_folder, backend,
+                                    range(start, min(start + shard_pages, pages)), file_hash)
+                    for start in range(0, pages, shard_pages)]
+    return [submit_pdf_file(executor, filename, input_folder, backend, file_hash=file_hash)]
+
+
+class ParserPool:
+    # Пул процессов разбора, заменяемый новым после аварийного завершения одного из процессов.
+    # ProcessPoolExecutor после такого сбоя отклоняет все новые задачи, поэтому без замены
+    # оставшиеся файлы запуска (или службы) не обрабатывались бы.
+
+    def __init__(self, workers):
+        # Аргументы:
+        #   workers (int): Количество процессов.
+
+        self.workers = workers
+        self.executor = create_executor(workers)
+        self.lock = threading.Lock()  # Пул используется несколькими потоками службы (watcher)
+
+    def submit(self, filename, input_folder, backend=DEFAULT_BACKEND, shard_pages=0, file_hash=None):
+        # Постановка файла в пул (см. submit_pdf_file_shards); если пул неработоспособен, создается новый.
+        # Возвращает:
+        #   list: Задачи частей файла (результат получается через pdf_file_shards_result)
+
+        executor = self.executor
+        try:
+            return submit_pdf_file_shards(executor, filename, input_folder, backend, shard_pages, file_hash)
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:  # Пул еще не заменен другим потоком
+                    logging.error("Процесс пула разбора завершился аварийно, создается новый пул процессов")
+                    metrics.incr('pool.restarts')
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = create_executor(self.workers)
+                executor = self.executor
+            # Части файла, поставленные в прежний пул, не используются: файл ставится заново целиком
+            return submit_pdf_file_shards(executor, filename, input_folder, backend, shard_pages, file_hash)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        return False
+
+
+def pdf_file_shards_result(filename, futures):
+    # Объединение результатов частей файла в порядке страниц.
+    # Если хотя бы одна часть завершилась ошибкой, файл считается необработанным.
+    # Возвращает:
+    #   tuple: Название файла и список документов (None, если файл не удалось обработать)
+
+    documents = []
+    for future in futures:
+        _, shard_documents = pdf_file_result(future, filename)
+        if shard_documents is None:
+            documents = None
+        elif documents is not None:
+            documents.extend(shard_documents)
+    return filename, documents
+
+
+def iter_parsed_files(input_folder, workers=1, manifest=None, backend=DEFAULT_BACKEND, shard_pages=0, force=False):
+    # Обработка PDF файлов папки с выдачей результатов по одному файлу в порядке get_pdf_files.
+    # В параллельном режиме в работе находится не более двух файлов (или частей файла) на процесс,
+    # поэтому объем памяти не зависит от количества файлов в папке.
+    # Аргументы:
+    #   input_folder (str): Путь к папке с PDF файлами.
+    #   workers (int): Количество процессов; 1 - последовательная обработка, 0 - по числу ядер.
+    #   manifest (Manifest): Журнал обработанных файлов; неизмененные файлы пропускаются до открытия,
+    #                        а размер, время изменения и хеш остальных запоминаются перед разбором.
+    #   backend (str): Название способа чтения PDF.
+    #   shard_pages (int): В параллельном режиме файлы больше shard_pages страниц разбиваются на части
+    #                      и обрабатываются в нескольких процессах; 0 - без разбиения.
+    #   force (bool): Обработать все файлы, даже неизмененные по журналу.
+
+    # Возвращает:
+    #   Iterator[tuple]: Название файла и список документов (None, если файл не удалось обработать)
+
+    filenames = get_pdf_files(input_folder)
+    if manifest is not None and not force:
+        filenames = manifest.filter_unprocessed(input_folder, filenames)
+
+    def capture(filename):
+        # Хеш для журнала вычисляется один раз и передается в разбор
+        if manifest is None:
+            return None
+        try:
+            with metrics.timer('file.hash'):
+                return manifest.capture(os.path.join(input_folder, filename))
+        except OSError as e:
+            logging.error(f"Не удалось прочитать файл {filename} для журнала обработки: {e}")
+            return None
+
+    if workers == 1 or (len(filenames) <= 1 and not shard_pages):
+        for filename in filenames:
+            yield process_pdf_file_safe(filename, input_folder, backend, file_hash=capture(filename))
+        return
+
+    workers = workers or os.cpu_count()
+    max_pending = workers * 2
+    logging.info(f"Параллельная обработка {len(filenames)} файлов в {workers} процессах")
+    with ParserPool(workers) as pool:
+        pending = deque()  # Файлы в работе: название и задачи его частей
+        in_flight = 0
+        for filename in filenames:
+            futures = pool.submit(filename, input_folder, backend, shard_pages, capture(filename))
+            pending.append((filename, futures))
+            in_flight += len(futures)
+            while in_flight >= max_pending:
+                # Результаты выдаются в порядке постановки задач
+                filename, futures = pending.popleft()
+                in_flight -= len(futures)
+                yield pdf_file_shards_result(filename, futures)
+        while pending:
+            yield pdf_file_shards_result(*pending.popleft())
+
+
+def iter_documents(input_folder, workers=1, backend=DEFAULT_BACKEND):
+    # Потоковая выдача документов из PDF файлов папки без накопления полного списка.
+    # Аргументы:
+    #   input_folder (str): Путь к папке с PDF файлами.
+    #   workers (int): Количество процессов; 1 - последовательная обработка, 0 - по числу ядер.
+    #   backend (str): Название способа чтения PDF.
+
+    # Возвращает:
+    #   Iterator[PaymentDocument]: Обработанные документы в порядке файлов и страниц
+
+    for filename, file_documents in iter_parsed_files(input_folder, workers, backend=backend):
+        if file_documents is None:
+            logging.error(f"Файл {filename} пропущен из-за ошибки обработки")
+            continue
+        yield from file_documents
+
+
+def iter_document_chunks(parsed_files, chunk_size=500):
+    # Группировка документов в порции фиксированного размера с учетом границ файлов.
+    # Файл попадает в список завершенных в той порции, которая содержит его последний документ,
+    # поэтому после сохранения порции все документы этих файлов уже находятся в базе данных.
+    # Аргументы:
+    #   parsed_files (Iterable[tuple]): Результаты iter_parsed_files.
+    #   chunk_size (int): Максимальное количество документов в порции.
+
+    # Возвращает:
+    #   Iterator[tuple]: Список документов порции и список путей к полностью вошедшим в нее файлам
+
+    chunk, completed = [], []
+    for filename, file_documents in parsed_files:
+        if file_documents is None:
+            logging.error(f"Файл {filename} пропущен из-за ошибки обработки")
+            continue
+        for doc in file_documents:
+            chunk.append(doc)
+            if len(chunk) >= chunk_size:
+                yield chunk, completed
+                chunk, completed = [], []
+        completed.append(filename)
+    if chunk or completed:
+        yield chunk, completed
+
+
+def chunk_files(documents):
+    # Пути файлов, документы которых входят в порцию (в том числе не завершенных в этой порции).
+    # Возвращает:
+    #   set: Значения file_path документов
+
+    return {doc.file_path for doc in documents}
+
+
+def parser_main(input_folder, workers=1, backend=DEFAULT_BACKEND):
     # Основная функция парсера для обработки PDF файлов в указанной папке.
     # Аргументы:
     #   input_folder (str): Путь к папке с PDF файлами.
+    #   workers (int): Количество процессов; 1 - последовательная обработка, 0 - по числу ядер.
+    #   backend (str): Название способа чтения PDF.
 
     # Возвращает:
     #   list: Список обработанных документов
 
-    documents = []
-    for filename in get_pdf_files(input_folder):  # Цикл обработки каждого PDF файла в папке
-        documents += process_pdf_file(filename, input_folder)  # Добавление обработанных документов в список
+    return list(iter_documents(input_folder, workers, backend))
 
-    return documents
+
+def compare_backends(input_folder, reference=DEFAULT_BACKEND, candidate='pdfminer'):
+    # Проверка способа чтения candidate по эталонному способу reference: каждая страница каждого файла
+    # разбирается обоими способами, и поля полученных документов сравниваются.
+    # Аргументы:
+    #   input_folder (str): Путь к папке с PDF файлами.
+    #   reference (str): Название эталонного способа чтения.
+    #   candidate (str): Название проверяемого способа чтения.
+
+    # Возвращает:
+    #   dict: Итоги сравнения: количество страниц и страниц с расхождениями, расхождения по полям,
+    #         время разбора каждым способом
+
+    fields = [column for column in COLUMNS if column not in ('file_path', 'file_hash')]
+    summary = {'files': 0, 'pages': 0, 'mismatched_pages': 0, 'field_mismatches': {},
+               'seconds': {reference: 0.0, candidate: 0.0}}
+    for filename in get_pdf_files(input_folder):
+        pdf_path = os.path.join(input_folder, filename)
+        try:
+            results = {}
+            for backend in (reference, candidate):
+                layout_cache.clear()  # Оба способа начинают с пустым кэшем шаблонов
+                start = time.perf_counter()
+                with open_pdf_file(pdf_path, backend) as pdf:
+                    results[backend] = [process_page(page, filename) for page in pdf.pages]
+                summary['seconds'][backend] += time.perf_counter() - start
+        except Exception as e:
+            logging.error(f"Ошибка при сравнении способов чтения для файла {filename}: {e}")
+            continue
+        summary['files'] += 1
+        if len(results[reference]) != len(results[candidate]):
+            logging.warning(f"{filename}: разное количество страниц: {reference} {len(results[reference])}, "
+                            f"{candidate} {len(results[candidate])}")
+        for page_number, (expected, actual) in enumerate(zip(results[reference], results[candidate]), start=1):
+            summary['pages'] += 1
+            expected_row = dict(zip(COLUMNS, expected.as_tuple())) if expected else {}
+            actual_row = dict(zip(COLUMNS, actual.as_tuple())) if actual else {}
+            mismatched = [field for field in fields if expected_row.get(field) != actual_row.get(field)]
+            if mismatched:
+                summary['mismatched_pages'] += 1
+                for field in mismatched:
+                    summary['field_mismatches'][field] = summary['field_mismatches'].get(field, 0) + 1
+                    logging.warning(f"{filename}, страница {page_number}, поле {field}: "
+                                    f"{reference} {expected_row.get(field)!r}, {candidate} {actual_row.get(field)!r}")
+    return summary
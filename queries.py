@@ -0,0 +1,160 @@
+# queries: Выборки документов для сверок по контрагенту, периоду и сумме.
+# Выборки постраничные по ключу (keyset pagination): следующая страница продолжается после последней строки
+# предыдущей, без OFFSET, поэтому каждая страница читается по индексу независимо от ее номера.
+# Выбираются только колонки модели Document, содержимое файлов (таблица files) не читается.
+# При нормализованном хранении (normalized=True) выборки читают представление documents_flat с теми же колонками;
+# условия по ИНН, дате и сумме подставляются в представление и используют индексы document_facts и counterparties.
+
+from sqlalchemy import Column, MetaData, Table, and_, or_, select, union
+
+import bd
+from normalized import FLAT_VIEW
+
+DEFAULT_PAGE_SIZE = 100
+
+documents = bd.Document.__table__
+documents_flat = Table(FLAT_VIEW, MetaData(), *[Column(column.name, column.type) for column in documents.c])
+
+
+def source_table(normalized):
+    # Таблица выборок: documents или представление documents_flat нормализованного хранения.
+    return documents_flat if normalized else documents
+
+
+def lookup_columns(table):
+    return tuple(table.c)  # Явный список колонок вместо SELECT *
+
+
+def after_key(table, key_column, cursor):
+    # Условие продолжения после строки cursor = (значение ключа, id) в порядке (key_column, id).
+    value, document_id = cursor
+    return or_(key_column > value, and_(key_column == value, table.c.id > document_id))
+
+
+def fetch_page(engine, statement, key_name, limit):
+    # Выполнение выборки одной страницы.
+    # Возвращает:
+    #   tuple: Список строк (словари колонок) и курсор следующей страницы (None, если страница последняя)
+
+    with engine.connect() as connection:
+        rows = [dict(row) for row in connection.execute(statement.limit(limit + 1)).mappings()]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1][key_name], rows[-1]['id'])
+
+
+def counterparty_select(table, inn_column, inn, date_from, date_to, cursor):
+    # Выборка по ИНН одной из сторон, упорядоченная по индексу (ИНН, дата поступления).
+    statement = select(*lookup_columns(table)).where(inn_column == inn, table.c.admission_date.isnot(None))
+    if date_from is not None:
+        statement = statement.where(table.c.admission_date >= date_from)
+    if date_to is not None:
+        statement = statement.where(table.c.admission_date <= date_to)
+    if cursor is not None:
+        statement = statement.where(after_key(table, table.c.admission_date, cursor))
+    return statement
+
+
+def find_by_counterparty(engine, inn, role='any', date_from=None, date_to=None, limit=DEFAULT_PAGE_SIZE,
+                         cursor=None, normalized=False):
+    # Документы контрагента по ИНН с необязательным ограничением периода, по возрастанию даты поступления.
+    # Для role='any' выборки по плательщику и получателю выполняются отдельно по своим индексам и объединяются.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+    #   inn (str): ИНН контрагента.
+    #   role (str): 'payer' - контрагент-плательщик, 'recipient' - получатель, 'any' - любая сторона.
+    #   date_from (date): Начало периода по дате поступления включительно; None - без ограничения.
+    #   date_to (date): Конец периода включительно; None - без ограничения.
+    #   limit (int): Количество документов на странице.
+    #   cursor (tuple): Курсор из предыдущей страницы; None - первая страница.
+    #   normalized (bool): Выборка из нормализованного хранения (представление documents_flat).
+
+    # Возвращает:
+    #   tuple: Список документов (словари колонок) и курсор следующей страницы или None
+    #          (документы без даты поступления в выборку не входят)
+
+    # Исключения:
+    #   ValueError: Неизвестная роль контрагента.
+
+    table = source_table(normalized)
+    roles = {'payer': [table.c.payer_inn], 'recipient': [table.c.recipient_inn],
+             'any': [table.c.payer_inn, table.c.recipient_inn]}
+    if role not in roles:
+        raise ValueError(f"Неизвестная роль контрагента: {role}; доступны: {', '.join(roles)}")
+    selects = [counterparty_select(table, inn_column, inn, date_from, date_to, cursor)
+               .order_by(table.c.admission_date, table.c.id).limit(limit + 1)
+               for inn_column in roles[role]]
+    if len(selects) == 1:
+        statement = selects[0]
+    else:
+        # Каждая часть ограничена своим индексом и limit + 1 строками; UNION убирает повтор документов,
+        # в которых контрагент одновременно плательщик и получатель
+        combined = union(*[part.subquery().select() for part in selects]).subquery()
+        statement = select(*combined.c).order_by(combined.c.admission_date, combined.c.id)
+    return fetch_page(engine, statement, 'admission_date', limit)
+
+
+def find_by_date_range(engine, date_from, date_to, limit=DEFAULT_PAGE_SIZE, cursor=None, normalized=False):
+    # Документы с датой поступления в периоде, по возрастанию даты (индекс ix_documents_admission_date).
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+    #   date_from (date): Начало периода включительно.
+    #   date_to (date): Конец периода включительно.
+    #   limit (int): Количество документов на странице.
+    #   cursor (tuple): Курсор из предыдущей страницы; None - первая страница.
+    #   normalized (bool): Выборка из нормализованного хранения (представление documents_flat).
+
+    # Возвращает:
+    #   tuple: Список документов (словари колонок) и курсор следующей страницы или None
+
+    table = source_table(normalized)
+    statement = select(*lookup_columns(table)).where(table.c.admission_date.between(date_from, date_to))
+    if cursor is not None:
+        statement = statement.where(after_key(table, table.c.admission_date, cursor))
+    statement = statement.order_by(table.c.admission_date, table.c.id)
+    return fetch_page(engine, statement, 'admission_date', limit)
+
+
+def find_by_amount_range(engine, min_summa=None, max_summa=None, limit=DEFAULT_PAGE_SIZE, cursor=None,
+                         normalized=False):
+    # Документы с суммой в диапазоне, по возрастанию суммы (индекс ix_documents_summa).
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+    #   min_summa (Decimal): Нижняя граница суммы включительно; None - без ограничения.
+    #   max_summa (Decimal): Верхняя граница суммы включительно; None - без ограничения.
+    #   limit (int): Количество документов на странице.
+    #   cursor (tuple): Курсор из предыдущей страницы; None - первая страница.
+    #   normalized (bool): Выборка из нормализованного хранения (представление documents_flat).
+
+    # Возвращает:
+    #   tuple: Список документов (словари колонок) и курсор следующей страницы или None
+
+    table = source_table(normalized)
+    statement = select(*lookup_columns(table)).where(table.c.summa.isnot(None))
+    if min_summa is not None:
+        statement = statement.where(table.c.summa >= min_summa)
+    if max_summa is not None:
+        statement = statement.where(table.c.summa <= max_summa)
+    if cursor is not None:
+        statement = statement.where(after_key(table, table.c.summa, cursor))
+    statement = statement.order_by(table.c.summa, table.c.id)
+    return fetch_page(engine, statement, 'summa', limit)
+
+
+def iter_all(lookup, engine, *args, **kwargs):
+    # Обход всех страниц выборки: for document in iter_all(find_by_date_range, engine, start, end): ...
+    # Параметры выборки, в том числе normalized, передаются в lookup.
+    # Аргументы:
+    #   lookup (callable): Одна из функций find_by_*.
+    #   engine (sqlalchemy.engine.Engine): Движок базы данных.
+
+    # Возвращает:
+    #   Iterator[dict]: Документы всех страниц по порядку
+
+    cursor = None
+    while True:
+        rows, cursor = lookup(engine, *args, cursor=cursor, **kwargs)
+        yield from rows
+        if cursor is None:
+            return
@@ -0,0 +1,201 @@
+# sources: Чтение входных PDF файлов из папки и из архивов ZIP и tar.gz без распаковки на диск.
+# PDF файл внутри архива адресуется путем с указанием архива: <папка>/export.zip!/sub/doc.pdf. Такие пути
+# возвращает pdf_parser.get_pdf_files для архивов в папке, они попадают в file_path документов и в журнал
+# обработки. open_input открывает и обычный файл, и файл архива: содержимое файла архива читается в память
+# (большие файлы - во временный файл SpooledTemporaryFile) и возвращается как файловый объект с произвольным доступом.
+# Открытые архивы и содержимое последних прочитанных файлов хранятся в кэше процесса: хеш, разбор и запись
+# содержимого в базу данных одного файла архива не распаковывают его заново. Файлы tar.gz читаются
+# последовательно, поэтому в списке они идут в порядке архива, и каждый процесс проходит архив примерно один раз.
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+
+ARCHIVE_SEPARATOR = '!/'
+ARCHIVE_SUFFIXES = ('.zip', '.tar.gz', '.tgz')
+SPOOL_MAX_SIZE = 32 * 1024 * 1024   # Файлы архива больше этого размера читаются во временный файл на диске
+MEMBER_CACHE_SIZE = 64 * 1024 * 1024  # Объем содержимого последних прочитанных файлов архивов в кэше процесса
+OPEN_ARCHIVES = 8                   # Количество одновременно открытых архивов в процессе
+
+
+def is_archive(path):
+    # Проверка, что файл - поддерживаемый архив (по расширению).
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_archive_path(path):
+    # Проверка, что путь указывает на файл внутри архива.
+    return ARCHIVE_SEPARATOR in path
+
+
+def split_archive_path(path):
+    # Разделение пути файла архива на путь к архиву и имя файла внутри архива.
+    # Возвращает:
+    #   tuple: Путь к архиву и имя файла; для обычного файла - путь и None
+
+    archive, separator, member = path.partition(ARCHIVE_SEPARATOR)
+    return (archive, member) if separator else (path, None)
+
+
+class ArchiveHandle:
+    # Открытый архив процесса с оглавлением PDF файлов.
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        if path.lower().endswith('.zip'):
+            self.archive = zipfile.ZipFile(path)
+            self.members = OrderedDict((info.filename, info) for info in self.archive.infolist() if not info.is_dir())
+        else:
+            self.archive = tarfile.open(path, 'r:*')
+            self.members = OrderedDict((info.name, info) for info in self.archive.getmembers() if info.isfile())
+
+    def pdf_names(self):
+        # Имена PDF файлов в порядке архива.
+        return [name for name in self.members if name.lower().endswith('.pdf')]
+
+    def size(self, name):
+        info = self.members[name]
+        return info.file_size if isinstance(info, zipfile.ZipInfo) else info.size
+
+    def open_member(self, name):
+        # Поток содержимого файла архива.
+        # Исключения:
+        #   FileNotFoundError: В архиве нет файла с таким именем.
+        info = self.members.get(name)
+        if info is None:
+            raise FileNotFoundError(f"Файл {name} не найден в архиве {self.path}")
+        if isinstance(info, zipfile.ZipInfo):
+            return self.archive.open(info)
+        return self.archive.extractfile(info)
+
+    def close(self):
+        self.archive.close()
+
+
+class ArchiveReader:
+    # Открытые архивы и кэш содержимого последних прочитанных файлов архивов. Методы можно вызывать
+    # из разных потоков; после fork процесс пула открывает архивы заново, чтобы не делить с родителем
+    # позицию чтения общего файлового дескриптора.
+
+    def __init__(self, max_archives=OPEN_ARCHIVES, cache_size=MEMBER_CACHE_SIZE):
+        self.max_archives = max_archives
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.archives = OrderedDict()  # Путь к архиву -> ArchiveHandle
+        self.contents = OrderedDict()  # Путь файла архива -> (время изменения архива, содержимое)
+        self.cached_bytes = 0
+
+    def handle(self, archive_path):
+        # Открытый архив; архив, измененный после открытия, открывается заново. Вызывается под self.lock.
+        if self.pid != os.getpid():
+            self.archives.clear()  # Дескрипторы родителя не закрываются и не используются
+            self.contents.clear()
+            self.cached_bytes = 0
+            self.pid = os.getpid()
+        handle = self.archives.get(archive_path)
+        if handle is not None and handle.mtime_ns != os.stat(archive_path).st_mtime_ns:
+            handle.close()
+            del self.archives[archive_path]
+            handle = None
+        if handle is None:
+            handle = ArchiveHandle(archive_path)
+            self.archives[archive_path] = handle
+            while len(self.archives) > self.max_archives:
+                self.archives.popitem(last=False)[1].close()
+        self.archives.move_to_end(archive_path)
+        return handle
+
+    def list_pdfs(self, archive_path):
+        # Имена PDF файлов архива в порядке архива.
+        with self.lock:
+            return self.handle(archive_path).pdf_names()
+
+    def stat(self, path):
+        # Размер файла архива и время изменения самого архива.
+        archive_path, member = split_archive_path(path)
+        with self.lock:
+            handle = self.handle(archive_path)
+            if member not in handle.members:
+                raise FileNotFoundError(f"Файл {member} не найден в архиве {archive_path}")
+            return handle.size(member), handle.mtime_ns
+
+    def open(self, path):
+        # Файловый объект с содержимым файла архива.
+        archive_path, member = split_archive_path(path)
+        with self.lock:
+            handle = self.handle(archive_path)
+            cached = self.contents.get(path)
+            if cached is not None and cached[0] == handle.mtime_ns:
+                self.contents.move_to_end(path)
+                return io.BytesIO(cached[1])
+            with handle.open_member(member) as stream:
+                if handle.size(member) > SPOOL_MAX_SIZE:
+                    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+                    shutil.copyfileobj(stream, buffer)
+                    buffer.seek(0)
+                    return buffer
+                data = stream.read()
+            self.remember(path, handle.mtime_ns, data)
+            return io.BytesIO(data)
+
+    def remember(self, path, mtime_ns, data):
+        # Сохранение содержимого в кэше с вытеснением давно не использованных файлов. Вызывается под self.lock.
+        previous = self.contents.pop(path, None)
+        if previous is not None:
+            self.cached_bytes -= len(previous[1])
+        self.contents[path] = (mtime_ns, data)
+        self.cached_bytes += len(data)
+        while self.cached_bytes > self.cache_size and len(self.contents) > 1:
+            self.cached_bytes -= len(self.contents.popitem(last=False)[1][1])
+
+
+archive_reader = ArchiveReader()
+
+
+def list_input_files(input_folder):
+    # PDF файлы папки и PDF файлы архивов в ней.
+    # Аргументы:
+    #   input_folder (str): Путь к папке.
+
+    # Возвращает:
+    #   list: Имена относительно папки: PDF файлы по алфавиту, затем файлы архивов (архивы по алфавиту,
+    #         файлы внутри архива в порядке архива) в виде <архив>!/<имя в архиве>
+
+    names = sorted(os.listdir(input_folder))
+    files = [name for name in names if name.lower().endswith('.pdf')]
+    for name in names:
+        if is_archive(name) and os.path.isfile(os.path.join(input_folder, name)):
+            files.extend(f"{name}{ARCHIVE_SEPARATOR}{member}"
+                         for member in archive_reader.list_pdfs(os.path.join(input_folder, name)))
+    return files
+
+
+def open_input(path):
+    # Открытие входного файла для чтения: обычного файла или файла архива.
+    # Аргументы:
+    #   path (str): Путь к файлу, в том числе с указанием архива.
+
+    # Возвращает:
+    #   Двоичный файловый объект с произвольным доступом; закрывается вызывающим
+
+    if is_archive_path(path):
+        return archive_reader.open(path)
+    return open(path, 'rb')
+
+
+def input_stat(path):
+    # Размер и время изменения входного файла; для файла архива - время изменения архива.
+    # Возвращает:
+    #   tuple: Размер в байтах и время изменения в наносекундах
+
+    if is_archive_path(path):
+        return archive_reader.stat(path)
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
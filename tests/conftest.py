@@ -0,0 +1,7 @@
+# conftest: Общие настройки тестов.
+# Модули проекта лежат в корне репозитория и импортируются напрямую, как в main.py.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,90 @@
+# test_bd: Проверка записи строк с пропуском дубликатов.
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+import bd
+import persistence
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    bd.Base.metadata.create_all(engine, tables=[bd.Document.__table__, bd.WorkItem.__table__])
+    yield engine
+    engine.dispose()
+
+
+def document_row(number):
+    return {'number': number, 'admission_date': datetime(2024, 2, 1), 'payer_name': 'ООО "А"',
+            'recipient_name': 'ООО "Б"', 'summa': 10.5}
+
+
+def test_insert_new_rows_skips_only_duplicate_keys(engine):
+    table = bd.WorkItem.__table__
+    row = {'file_hash': 'a', 'path': 'input/a.pdf', 'status': 'pending', 'attempts': 0}
+    with engine.begin() as connection:
+        assert bd.insert_new_rows(connection, table, [row, dict(row, file_hash='b')], 'file_hash') == 2
+    with engine.begin() as connection:
+        assert bd.insert_new_rows(connection, table, [row, dict(row, file_hash='c')], 'file_hash') == 1
+    with pytest.raises(IntegrityError):  # NOT NULL не подавляется, в отличие от INSERT OR IGNORE
+        with engine.begin() as connection:
+            bd.insert_new_rows(connection, table, [dict(row, file_hash='d', path=None)], 'file_hash')
+
+
+class FakeResult:
+    def __init__(self, rowcount=0, rows=()):
+        self.rowcount = rowcount
+        self.rows = list(rows)
+
+    def scalar(self):
+        return self.rows[0][0]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeMysqlConnection:
+    # Соединение MySQL: INSERT IGNORE вставляет inserted строк и оставляет заданные предупреждения.
+    dialect = mysql.dialect()
+
+    def __init__(self, inserted, warnings):
+        self.inserted = inserted
+        self.warnings = warnings
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        sql = str(statement.compile(dialect=self.dialect))
+        self.statements.append(sql)
+        if sql.startswith('INSERT'):
+            return FakeResult(rowcount=self.inserted)
+        if sql == 'SHOW COUNT(*) WARNINGS':
+            return FakeResult(rows=[(len(self.warnings),)])
+        return FakeResult(rows=self.warnings)
+
+
+def test_insert_new_rows_mysql_counts_from_rowcount():
+    table = bd.WorkItem.__table__
+    rows = [{'file_hash': name, 'path': 'a.pdf', 'status': 'pending', 'attempts': 0} for name in 'abc']
+    duplicate = ('Warning', bd.DUPLICATE_ENTRY, "Duplicate entry 'b' for key 'PRIMARY'")
+    connection = FakeMysqlConnection(2, [duplicate])
+    assert bd.insert_new_rows(connection, table, rows, 'file_hash') == 2
+    assert connection.statements[0].startswith('INSERT IGNORE INTO work_queue')
+    assert len(connection.statements) == 2  # Без выборки существующих ключей до вставки
+
+    truncated = ('Warning', 1265, "Data truncated for column 'status' at row 3")
+    with pytest.raises(SQLAlchemyError, match='Data truncated'):
+        bd.insert_new_rows(FakeMysqlConnection(2, [duplicate, truncated]), table, rows, 'file_hash')
+
+
+def test_write_rows_counts_duplicates(engine):
+    stats = persistence.write_rows([document_row(1), document_row(2)], engine)
+    assert [(s['inserted'], s['skipped'], s['failed']) for s in stats] == [(2, 0, 0)]
+    stats = persistence.write_rows([document_row(2), document_row(3)], engine)
+    assert [(s['inserted'], s['skipped'], s['failed']) for s in stats] == [(1, 1, 0)]
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(bd.Document.__table__)).scalar() == 3
@@ -0,0 +1,64 @@
+# test_dataframe: Проверка нормализации DataFrame целыми колонками.
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from PaymentDocument_Class import PaymentDocument
+from dataframe import clean_column, create_dataframe
+
+
+def make_document(index, with_dates=True):
+    doc = PaymentDocument()
+    doc.number = str(index)
+    doc.admission_date = '01.02.2024' if with_dates else ''
+    doc.debited_date = '03.02.2024' if with_dates and index % 2 else None
+    doc.payer_name = 'Общество с ограниченной\nответственностью "Ромашка"'
+    doc.payer_inn = '7701234567'
+    doc.payer_kpp = None if index % 2 else '770101001'
+    doc.payer_account = '40702810000000000001'
+    doc.recipient_name = 'ИП Иванов\nИван' if index % 3 else None
+    doc.recipient_inn = '500100732259'
+    doc.summa = 100.5 + index
+    doc.payer_bank_name = 'ПАО\nСбербанк'
+    doc.payer_bank_bik = '044525225'
+    doc.purpose = 'Оплата по счету\nN 1' if index % 2 else None
+    doc.file_path = 'input/test.pdf'
+    doc.unique_identifier = f'id-{index}'
+    doc.file_hash = 'abc'
+    return doc
+
+
+def build_both(with_dates=True, count=6):
+    vectorized = create_dataframe([make_document(i, with_dates) for i in range(count)])
+    per_row = create_dataframe([make_document(i, with_dates) for i in range(count)], vectorized=False)
+    return vectorized, per_row
+
+
+def test_clean_column_mixed_object_values():
+    column = pd.Series(['ООО\n"А"', None, 'общество с ограниченной ответственностью Б'], dtype=object)
+    cleaned = clean_column(column, pattern=r'общество\s+с\s+ограниченной\s*ответственностью')
+    assert cleaned.dtype == object
+    assert cleaned.tolist() == ['ООО"А"', None, 'ООО Б']
+
+
+def test_vectorized_path_handles_mixed_str_and_none():
+    vectorized, _ = build_both()
+    assert vectorized['payer_name'].iloc[0] == 'ООО "Ромашка"'
+    assert vectorized['recipient_name'].isna().iloc[0]
+    assert vectorized['recipient_name'].iloc[1] == 'ИП ИвановИван'
+    assert vectorized['payer_bank_name'].iloc[0] == 'ПАОСбербанк'
+
+
+def test_vectorized_matches_per_row():
+    vectorized, per_row = build_both()
+    assert_frame_equal(vectorized, per_row)
+
+
+def test_vectorized_matches_per_row_without_dates():
+    vectorized, per_row = build_both(with_dates=False)
+    assert_frame_equal(vectorized, per_row)
+
+
+def test_vectorized_matches_per_row_empty():
+    vectorized, per_row = build_both(count=0)
+    assert_frame_equal(vectorized, per_row)
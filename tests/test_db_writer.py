@@ -0,0 +1,38 @@
+# test_db_writer: Проверка фоновой записи порций и отметки сохраненных файлов.
+
+import threading
+
+from PaymentDocument_Class import PaymentDocument
+from db_writer import DatabaseWriter
+
+
+def documents(*paths):
+    docs = []
+    for path in paths:
+        doc = PaymentDocument()
+        doc.file_path = path
+        docs.append(doc)
+    return docs
+
+
+def test_files_of_failed_chunk_are_not_marked():
+    marked, written = [], []
+
+    def persist(chunk):
+        written.append(threading.current_thread().name)
+        if any(doc.file_path == 'fail' for doc in chunk):
+            raise RuntimeError('база данных недоступна')
+        return len(written) != 2  # Вторая порция не записана
+
+    with DatabaseWriter(persist, marked.extend, queue_size=1) as writer:
+        writer.submit(documents('a', 'a'), [])               # Порция записана, файл a не завершен
+        writer.submit(documents('a', 'b'), [])               # Ошибка: файлы a и b в незаписанной порции
+        writer.submit(documents('b', 'c'), ['a', 'b', 'c'])  # Записана, но a и b не должны быть отмечены
+        writer.submit(documents('d', 'fail'), [])            # Исключение в persist не останавливает поток
+        writer.submit(documents('e'), ['d', 'e', 'fail'])
+    stats = writer.stats
+
+    assert set(written) == {'db-writer'}
+    assert marked == ['c', 'e']
+    assert stats['chunks'] == 5 and stats['documents'] == 9 and stats['failed_chunks'] == 2
+    assert sorted(stats['failed_files']) == ['a', 'b', 'd', 'fail']
@@ -0,0 +1,45 @@
+# test_duplicate_filter: Проверка отсева сохраненных документов и фильтра Блума.
+
+from sqlalchemy import create_engine, insert
+
+import bd
+from duplicate_filter import BloomFilter, DuplicateFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(5000, error_rate=0.01)
+    values = [f'ПП №{i}' for i in range(5000)]
+    for value in values:
+        bloom.add(value)
+    assert all(value in bloom for value in values)
+    false_positives = sum(f'other {i}' in bloom for i in range(20000))
+    assert false_positives < 20000 * 0.03
+
+
+def test_bloom_matches_are_confirmed_by_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dup.db'}")
+    documents = bd.Document.__table__
+    documents.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(documents), [{'unique_identifier': 'stored-1'}, {'unique_identifier': 'stored-2'}])
+
+    duplicate_filter = DuplicateFilter(engine, bloom_threshold=1)
+    duplicate_filter.load()
+    assert isinstance(duplicate_filter.known, BloomFilter)
+    # Все биты установлены: каждый идентификатор - совпадение фильтра, решение принимает запрос к базе
+    duplicate_filter.known.bits[:] = b'\xff' * len(duplicate_filter.known.bits)
+    rows = [{'unique_identifier': value} for value in ('stored-1', 'new-1', 'new-1', None, 'stored-2', 'new-2')]
+    new_rows, skipped = duplicate_filter.filter_rows(rows)
+    assert [row['unique_identifier'] for row in new_rows] == ['new-1', None, 'new-2']
+    assert skipped == 3
+    engine.dispose()
+
+
+def test_set_filter_remembers_added_identifiers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dup.db'}")
+    bd.Document.__table__.create(engine)
+    duplicate_filter = DuplicateFilter(engine)
+    assert not duplicate_filter.contains('a')
+    duplicate_filter.add(['a'])
+    assert duplicate_filter.contains('a')
+    engine.dispose()
@@ -0,0 +1,35 @@
+# test_file_store: Проверка хранения исходных файлов по хешу содержимого.
+
+from sqlalchemy import create_engine, select
+
+import bd
+from file_store import file_sha256, store_file
+
+
+def test_store_file_once_per_content(tmp_path):
+    content = bytes(range(256)) * 40000  # Больше прежнего размера блока записи
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(content)
+    file_hash = file_sha256(str(path))
+    engine = create_engine(f"sqlite:///{tmp_path / 'files.db'}")
+    bd.StoredFile.__table__.create(engine)
+    files = bd.StoredFile.__table__
+    with engine.begin() as connection:
+        assert store_file(connection, file_hash, str(path))
+        assert not store_file(connection, file_hash, str(path))
+        stored = connection.execute(select(files.c.size, files.c.content)).all()
+    assert stored == [(len(content), content)]
+    engine.dispose()
+
+
+def test_changed_file_is_not_stored_under_old_hash(tmp_path):
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(b'parsed content')
+    file_hash = file_sha256(str(path))
+    path.write_bytes(b'changed content')
+    engine = create_engine(f"sqlite:///{tmp_path / 'files.db'}")
+    bd.StoredFile.__table__.create(engine)
+    with engine.begin() as connection:
+        assert not store_file(connection, file_hash, str(path))
+        assert connection.execute(select(bd.StoredFile.__table__.c.sha256)).all() == []
+    engine.dispose()
@@ -0,0 +1,122 @@
+# test_layout_cache: Проверка кэша шаблонов разметки.
+
+import pdfplumber
+
+import benchmark
+import pdf_parser
+from benchmark import build_payment_order_pdf
+from layout_cache import LayoutCache
+from page_index import PageCharIndex
+
+FIELDS = ('number', 'admission_date', 'payer_name', 'recipient_name', 'summa', 'purpose')
+
+
+class FakeIndex:
+    # Индекс страницы с одним словом, записанным посимвольно с шагом 5 пунктов.
+
+    def __init__(self, text, x0, top, size=(595, 842)):
+        self.bbox = (0, 0) + size
+        self.chars = [{'text': char, 'x0': x0 + 5 * i, 'x1': x0 + 5 * i + 4, 'top': top, 'bottom': top + 8}
+                      for i, char in enumerate(text)]
+
+    def chars_in_rect(self, rect):
+        return [char for char in self.chars if char['x0'] >= rect[0] and char['top'] >= rect[1]
+                and char['x1'] <= rect[2] and char['bottom'] <= rect[3]]
+
+    def chars_near(self, x0, top, radius):
+        return [char for char in self.chars if abs(char['x0'] - x0) <= radius and abs(char['top'] - top) <= radius]
+
+
+def categories(text, x0, top):
+    return {'anchor': {'text': text, 'x0': x0, 'top': top, 'x1': x0 + 5 * len(text) - 1, 'bottom': top + 8}}
+
+
+def test_lookup_checks_only_matching_bucket(monkeypatch):
+    cache = LayoutCache(maxsize=64)
+    for i in range(40):
+        cache.store(FakeIndex('ПЛАТЕЖНОЕ', 10 + 20 * i, 50), categories('ПЛАТЕЖНОЕ', 10 + 20 * i, 50), {'n': i})
+    checked = []
+    match = cache.anchors_match
+    monkeypatch.setattr(cache, 'anchors_match', lambda index, anchors: checked.append(anchors) or match(index, anchors))
+
+    assert cache.lookup(FakeIndex('ПЛАТЕЖНОЕ', 210.05, 50.05)) == {'n': 10}
+    assert len(checked) == 1  # Полная проверка только для шаблона совпавшей корзины
+    assert cache.lookup(FakeIndex('ПЛАТЕЖНОЕ', 215, 50)) is None
+    assert cache.lookup(FakeIndex('ПЛАТЕЖНОЕ', 210, 50, size=(842, 595))) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_eviction_removes_bucket():
+    cache = LayoutCache(maxsize=2)
+    for i in range(3):
+        cache.store(FakeIndex('СУММА', 100 * i, 50), categories('СУММА', 100 * i, 50), {'n': i})
+    assert len(cache.entries) == 2 and len(cache.buckets) == 2
+    assert cache.lookup(FakeIndex('СУММА', 0, 50)) is None
+    assert cache.lookup(FakeIndex('СУММА', 200, 50)) == {'n': 2}
+
+
+def test_extra_anchor_word_misses_template():
+    cache = LayoutCache()
+    anchor_set = (('ПЛАТЕЖНОЕ', 10, 50),)
+    cache.store(FakeIndex('ПЛАТЕЖНОЕ', 10, 50), categories('ПЛАТЕЖНОЕ', 10, 50), {'n': 1}, anchor_set)
+    # Та же корзина и те же опорные слова шаблона, но на странице есть еще одно опорное слово
+    assert cache.lookup(FakeIndex('ПЛАТЕЖНОЕ', 10, 50), anchor_set + (('Назначение', 10, 700),)) is None
+    assert cache.lookup(FakeIndex('ПЛАТЕЖНОЕ', 10, 50), anchor_set) == {'n': 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def parse_with_cache(path, maxsize):
+    cache = LayoutCache(maxsize=maxsize)
+    pdf_parser.layout_cache, saved = cache, pdf_parser.layout_cache
+    try:
+        with pdfplumber.open(path) as pdf:
+            docs = [pdf_parser.process_page(page, 'orders.pdf') for page in pdf.pages]
+    finally:
+        pdf_parser.layout_cache = saved
+    return cache, [tuple(getattr(doc, field) for field in FIELDS) for doc in docs]
+
+
+def test_cached_layout_gives_same_documents(tmp_path):
+    path = str(tmp_path / 'orders.pdf')
+    build_payment_order_pdf(path, 6)
+    results = {}
+    for maxsize in (32, 0):
+        cache, results[maxsize] = parse_with_cache(path, maxsize)
+        if maxsize:
+            assert (cache.hits, cache.misses) == (5, 1)
+    assert results[32] == results[0]
+    assert all(all(values) for values in results[0])
+
+
+def test_page_with_extra_anchor_word_is_parsed_fully(tmp_path, monkeypatch):
+    items = benchmark.payment_order_items
+
+    def with_extra_anchor(rnd, number):
+        # На второй странице ниже назначения платежа стоит еще одно слово 'Назначение': оно становится
+        # опорным словом категории purpose, хотя опорные слова первой страницы остаются на месте
+        page_items = list(items(rnd, number))
+        if number == 2:
+            x, top, _ = next(item for item in page_items if item[2].startswith('Назначение'))
+            page_items.append((x, top + 40, 'Назначение'))
+        return page_items
+
+    monkeypatch.setattr(benchmark, 'payment_order_items', with_extra_anchor)
+    path = str(tmp_path / 'orders.pdf')
+    build_payment_order_pdf(path, 3)
+    cache, cached = parse_with_cache(path, 32)
+    _, uncached = parse_with_cache(path, 0)
+    assert cached == uncached
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_chars_near_matches_linear_scan(tmp_path):
+    path = str(tmp_path / 'orders.pdf')
+    build_payment_order_pdf(path, 1)
+    with pdfplumber.open(path) as pdf:
+        index = PageCharIndex(pdf.pages[0])
+    for char in index.chars[::25]:
+        near = index.chars_near(round(char['x0']), round(char['top']), 0.6)
+        expected = [c for c in index.chars if abs(c['x0'] - round(char['x0'])) <= 0.6
+                    and abs(c['top'] - round(char['top'])) <= 0.6]
+        assert sorted(map(id, near)) == sorted(map(id, expected))
+        assert char in near
@@ -0,0 +1,71 @@
+# test_log_config: Проверка передачи записей журнала через очередь в поток вывода.
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+import pytest
+
+import log_config
+
+
+class CaptureHandler(logging.Handler):
+    # Обработчик потока вывода, запоминающий отформатированные записи и поток форматирования.
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.threads.add(threading.current_thread().name)
+        self.lines.append(self.format(record))
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_records_are_formatted_by_listener(root_logger):
+    records = queue.Queue()
+    capture = CaptureHandler()
+    capture.setFormatter(log_config.JsonFormatter())
+    listener = logging.handlers.QueueListener(records, capture)
+    log_config.setup_worker_logging(records, 'INFO')
+    listener.start()
+    try:
+        logging.info("Файл %s обработан", 'a.pdf', extra={'summary': {'pages': 3}})
+        try:
+            raise ValueError("сбой")
+        except ValueError:
+            logging.exception("Ошибка разбора")
+        logging.debug("Не выводится на уровне INFO")
+    finally:
+        listener.stop()
+
+    queued = [json.loads(line) for line in capture.lines]
+    assert [(entry['level'], entry['message']) for entry in queued] == [('INFO', 'Файл a.pdf обработан'),
+                                                                       ('ERROR', 'Ошибка разбора')]
+    assert queued[0]['pages'] == 3
+    assert 'ValueError: сбой' in queued[1]['exception']
+    assert threading.current_thread().name not in capture.threads  # Формат применяется в потоке вывода
+
+
+def test_prepare_only_copies_record():
+    handler = log_config.RecordQueueHandler(queue.Queue())
+    handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, "Файл %s", ('a.pdf',), None)
+    prepared = handler.prepare(record)
+    assert prepared is not record
+    assert prepared.msg == 'Файл a.pdf' and prepared.args is None  # Формат обработчика не применен
+    assert record.args == ('a.pdf',)
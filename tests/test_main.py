@@ -0,0 +1,59 @@
+# test_main: Проверка потоковой обработки и журнала обработанных файлов при ошибках записи.
+
+import os
+
+import pytest
+
+import main
+from benchmark import generate_dataset
+from manifest import Manifest
+
+
+def failing_persist(fail_chunks):
+    # Сохранение, завершающееся ошибкой на порциях с заданными номерами (с нуля).
+    calls = []
+
+    def persist(documents):
+        calls.append([doc.file_path for doc in documents])
+        return len(calls) - 1 not in fail_chunks
+    return persist, calls
+
+
+@pytest.mark.parametrize('writer_queue', [0, 2])
+def test_file_with_failed_chunk_is_not_marked(tmp_path, monkeypatch, writer_queue):
+    folder = str(tmp_path / 'input')
+    generate_dataset(folder, 2, 7)  # По 7 документов: первый файл занимает порции 0 и 1
+    persist, calls = failing_persist({0})
+    monkeypatch.setattr(main, 'create_persist', lambda *args: (persist, None))
+    manifest_path = str(tmp_path / 'manifest.sqlite3')
+
+    main.run_pipeline(folder, None, chunk_size=5, manifest_path=manifest_path, writer_queue=writer_queue)
+
+    assert len(calls) == 3
+    first, second = (os.path.join(folder, name) for name in sorted(os.listdir(folder)))
+    manifest = Manifest(manifest_path, main.sink_destination(None))
+    try:
+        assert not manifest.is_unchanged(first)  # Часть документов не записана: файл обрабатывается повторно
+        assert manifest.is_unchanged(second)
+    finally:
+        manifest.close()
+
+
+def test_manifest_is_kept_per_destination(tmp_path, monkeypatch):
+    folder = str(tmp_path / 'input')
+    generate_dataset(folder, 2, 3)
+    persist, calls = failing_persist(set())
+    monkeypatch.setattr(main, 'create_persist', lambda *args: (persist, None))
+    manifest_path = str(tmp_path / 'manifest.sqlite3')
+    con_string = f"sqlite:///{tmp_path / 'ppdb.sqlite3'}"
+
+    main.run_pipeline(folder, con_string, manifest_path=manifest_path, writer_queue=0)
+    assert len(calls) == 1
+    main.run_pipeline(folder, con_string, manifest_path=manifest_path, writer_queue=0)
+    assert len(calls) == 1  # Файлы уже записаны в эту базу данных
+    # Файлы, записанные в базу данных, не считаются выгруженными в Parquet или в нормализованные таблицы
+    main.run_pipeline(folder, con_string, manifest_path=manifest_path, writer_queue=0,
+                      parquet_dir=str(tmp_path / 'parquet'))
+    assert len(calls) == 2
+    main.run_pipeline(folder, con_string, manifest_path=manifest_path, writer_queue=0, normalized=True)
+    assert len(calls) == 3
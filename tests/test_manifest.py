@@ -0,0 +1,69 @@
+# test_manifest: Проверка журнала обработанных файлов.
+
+import os
+
+import manifest as manifest_module
+from manifest import Manifest
+
+
+def write(path, content, mtime_ns):
+    path.write_bytes(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_mark_processed_uses_parse_time_fingerprint(tmp_path, monkeypatch):
+    pdf = tmp_path / 'a.pdf'
+    write(pdf, b'parsed content', 1_000_000_000)
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite3'))
+    manifest.capture(str(pdf))
+    # Файл изменился после разбора: в журнал должны попасть данные разобранного содержимого
+    write(pdf, b'changed content', 2_000_000_000)
+
+    hashed = []
+    monkeypatch.setattr(manifest_module, 'file_sha256', lambda path: hashed.append(path) or 'other')
+    manifest.mark_processed([str(pdf)])
+    assert hashed == []  # Файл не читается повторно при записи в журнал
+    assert not manifest.is_unchanged(str(pdf))
+    manifest.close()
+
+
+def test_unchanged_file_is_skipped(tmp_path):
+    pdf = tmp_path / 'a.pdf'
+    write(pdf, b'content', 1_000_000_000)
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite3'))
+    manifest.capture(str(pdf))
+    manifest.mark_processed([str(pdf)])
+    assert manifest.is_unchanged(str(pdf))
+    os.utime(pdf, ns=(3_000_000_000, 3_000_000_000))  # Только время изменения: сравнивается хеш
+    assert manifest.is_unchanged(str(pdf))
+    manifest.close()
+
+
+def test_mark_processed_without_capture_is_skipped(tmp_path):
+    pdf = tmp_path / 'a.pdf'
+    write(pdf, b'content', 1_000_000_000)
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite3'))
+    manifest.mark_processed([str(pdf)])
+    assert not manifest.is_unchanged(str(pdf))
+    manifest.close()
+
+
+def test_destinations_are_tracked_separately(tmp_path):
+    pdf = tmp_path / 'a.pdf'
+    write(pdf, b'content', 1_000_000_000)
+    path = str(tmp_path / 'manifest.sqlite3')
+    database = Manifest(path, 'documents:sqlite:///ppdb.sqlite3')
+    database.capture(str(pdf))
+    database.mark_processed([str(pdf)])
+    database.close()
+
+    parquet = Manifest(path, 'parquet:/data/out')
+    try:
+        assert not parquet.is_unchanged(str(pdf))
+    finally:
+        parquet.close()
+    database = Manifest(path, 'documents:sqlite:///ppdb.sqlite3')
+    try:
+        assert database.is_unchanged(str(pdf))
+    finally:
+        database.close()
@@ -0,0 +1,92 @@
+# test_normalized: Проверка нормализованного хранения и представления documents_flat.
+
+from datetime import date, datetime
+
+from sqlalchemy import inspect, select, text
+
+import bd
+import persistence
+import queries
+from duplicate_filter import DuplicateFilter
+from normalized import FLAT_VIEW, DimensionCache, ensure_flat_view
+
+PAYER = {'payer_name': 'ООО "Ромашка"', 'payer_inn': '7701234567', 'payer_kpp': '770101001',
+         'payer_bank_name': 'ПАО Сбербанк', 'payer_bank_bik': '044525225', 'payer_bank_account': '30101810400000000225'}
+
+
+def document_row(number, **values):
+    row = {'number': number, 'admission_date': datetime(2024, 2, number % 28 + 1), 'debited_date': None,
+           'payer_account': '40702810000000000001', 'recipient_name': f'ИП Иванов {number % 2}',
+           'recipient_inn': '500100732259', 'recipient_kpp': None, 'recipient_account': '40802810000000000002',
+           'summa': 100.25 + number, 'recipient_bank_name': None, 'recipient_bank_bik': None,
+           'recipient_bank_account': None, 'purpose': f'Оплата по счету {number}', 'file_path': 'input/a.pdf',
+           'file_hash': 'abc'}
+    row.update(PAYER)
+    row.update(values)
+    return row
+
+
+def rows():
+    # Повторяющиеся плательщик и банк, пустые реквизиты получателя и банка получателя
+    return [document_row(1), document_row(2), document_row(3, payer_kpp=None),
+            document_row(4, recipient_name=None, recipient_inn=None, recipient_account=None)]
+
+
+def test_flat_view_matches_documents_table(tmp_path):
+    engine = bd.get_engine(f"sqlite:///{tmp_path / 'flat.db'}")
+    bd.ensure_schema(engine)
+    persistence.write_rows(rows(), engine)
+    ensure_flat_view(engine)
+    persistence.write_rows(rows(), engine, dimensions=DimensionCache(engine))
+
+    columns = ', '.join(column.name for column in bd.Document.__table__.c if column.name != 'id')
+    with engine.connect() as connection:
+        flat = connection.execute(text(f"SELECT {columns} FROM {FLAT_VIEW} ORDER BY unique_identifier")).all()
+        stored = connection.execute(text(f"SELECT {columns} FROM documents ORDER BY unique_identifier")).all()
+        # Плательщик с КПП и без него и один получатель с двумя написаниями наименования
+        assert len(connection.execute(select(bd.Counterparty.__table__.c.id)).all()) == 3
+        assert len(connection.execute(select(bd.Bank.__table__.c.id)).all()) == 1
+    assert len(flat) == 4
+    assert flat == stored
+    engine.dispose()
+
+
+def test_mode_tables_created_only_when_used(tmp_path):
+    engine = bd.get_engine(f"sqlite:///{tmp_path / 'core.db'}")
+    bd.ensure_schema(engine)
+    assert set(inspect(engine).get_table_names()) == {'documents', 'files'}
+    ensure_flat_view(engine)
+    assert {'counterparties', 'banks', 'document_facts'} <= set(inspect(engine).get_table_names())
+    assert 'work_queue' not in inspect(engine).get_table_names()
+    engine.dispose()
+
+
+def test_documents_saved_before_normalization_are_not_repeated(tmp_path):
+    engine = bd.get_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    bd.ensure_schema(engine)
+    persistence.write_rows(rows()[:2], engine)  # Сохранены в documents до перехода на нормализованное хранение
+    ensure_flat_view(engine)
+    duplicate_filter = DuplicateFilter(engine, tables=[bd.Document.__table__, bd.DocumentFact.__table__])
+    persistence.write_rows(rows(), engine, duplicate_filter=duplicate_filter, dimensions=DimensionCache(engine))
+
+    with engine.connect() as connection:
+        facts = connection.execute(select(bd.DocumentFact.__table__.c.number)).scalars().all()
+    assert sorted(facts) == [3, 4]
+    engine.dispose()
+
+
+def test_queries_read_flat_view(tmp_path):
+    engine = bd.get_engine(f"sqlite:///{tmp_path / 'queries.db'}")
+    bd.ensure_schema(engine)
+    persistence.write_rows(rows(), engine)
+    ensure_flat_view(engine)
+    persistence.write_rows(rows(), engine, dimensions=DimensionCache(engine))
+
+    for lookup, args in ((queries.find_by_counterparty, ('500100732259',)),
+                         (queries.find_by_date_range, (date(2024, 2, 1), date(2024, 2, 28))),
+                         (queries.find_by_amount_range, (100, 103))):
+        stored = list(queries.iter_all(lookup, engine, *args, limit=2))
+        flat = list(queries.iter_all(lookup, engine, *args, limit=2, normalized=True))
+        assert stored
+        assert [dict(row, id=None) for row in flat] == [dict(row, id=None) for row in stored]
+    engine.dispose()
@@ -0,0 +1,45 @@
+# test_page_cache: Проверка упаковки символов страниц и дискового кэша страниц.
+
+import pdfplumber
+
+from benchmark import build_payment_order_pdf
+from page_cache import CHAR_FLOATS, CachedPage, PageLayerCache, decode_layer, encode_layer
+
+
+def char_fields(chars):
+    return [tuple(char[name] for name in CHAR_FLOATS) + (char['text'], bool(char['upright'])) for char in chars]
+
+
+def test_encode_decode_round_trip(tmp_path):
+    path = str(tmp_path / 'orders.pdf')
+    build_payment_order_pdf(path, 1)
+    with pdfplumber.open(path) as pdf:
+        page = pdf.pages[0]
+        bbox, chars = decode_layer(encode_layer(page.bbox, page.chars))
+        assert bbox == tuple(page.bbox)
+        assert char_fields(chars) == char_fields(page.chars)
+        assert CachedPage(bbox, chars).extract_words() == page.extract_words()
+
+
+def test_encode_decode_multibyte_and_empty():
+    chars = [{'text': text, 'x0': 1.5 * i, 'x1': 1.5 * i + 1, 'top': 2.25, 'bottom': 10.0, 'doctop': 2.25,
+              'size': 8.0, 'upright': i % 2 == 0} for i, text in enumerate(['П', '№', 'a', '€', 'ﬁ'])]
+    assert decode_layer(encode_layer((0, 0, 595, 842), chars)) == ((0, 0, 595, 842), chars)
+    assert decode_layer(encode_layer((0, 0, 595, 842), [])) == ((0, 0, 595, 842), [])
+
+
+def test_layer_cache_serves_stored_pages(tmp_path):
+    path = str(tmp_path / 'orders.pdf')
+    build_payment_order_pdf(path, 3)
+    cache = PageLayerCache(str(tmp_path / 'layers.sqlite3'))
+    with pdfplumber.open(path) as pdf:
+        assert cache.load_file('hash') is None
+        for number, page in enumerate(pdf.pages[:2]):
+            cache.store('hash', 3, number, page)
+        assert cache.load_file('hash') is None  # Кэшированы не все страницы
+        assert cache.load_file('hash', range(0, 2)) == range(0, 2)
+        cache.store('hash', 3, 2, pdf.pages[2])
+        numbers = cache.load_file('hash')
+        cached = list(cache.read_pages('hash', numbers))
+        assert [char_fields(page.chars) for page in cached] == [char_fields(page.chars) for page in pdf.pages]
+    cache.close()
@@ -0,0 +1,45 @@
+# test_page_index: Проверка извлечения текста через индекс символов страницы.
+
+import pdfplumber
+import pytest
+
+import pdf_parser
+from benchmark import build_payment_order_pdf
+from page_index import PageCharIndex
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = str(tmp_path / 'orders.pdf')
+    build_payment_order_pdf(path, 2)
+    with pdfplumber.open(path) as pdf:
+        yield pdf
+
+
+def reference_text(page, rect):
+    text = page.within_bbox(rect).extract_text()
+    return text.strip() if text else None
+
+
+def test_field_rects_match_extract_text(pdf):
+    for page in pdf.pages:
+        rects = pdf_parser.determine_coordinates(pdf_parser.extract_words_from_page(page))
+        assert rects
+        index = PageCharIndex(page)
+        texts = index.texts_in_rects(rects)
+        for name, rect in rects.items():
+            if rect:
+                assert texts[name] == reference_text(page, rect), name
+
+
+def test_arbitrary_rects_match_extract_text(pdf):
+    page = pdf.pages[0]
+    index = PageCharIndex(page)
+    width, height = page.width, page.height
+    for step in (7, 13):
+        for i in range(step):
+            for j in range(step):
+                rect = (width * i / step, height * j / step,
+                        width * (i + 1) / step, height * min(j + 2, step) / step)
+                assert index.text_in_rect(rect) == reference_text(page, rect), rect
+    assert index.text_in_rect((0, 0, 1, 1)) is None
@@ -0,0 +1,66 @@
+# test_parquet_sink: Проверка записи документов в набор файлов Parquet.
+
+import os
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import bd
+from PaymentDocument_Class import PaymentDocument
+from dataframe import create_rows
+from parquet_sink import NULL_PARTITION, ParquetSink, partition_name, to_record
+
+pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def make_document(index, admission_date='01.02.2024'):
+    doc = PaymentDocument()
+    doc.number = str(index)
+    doc.admission_date = admission_date
+    doc.debited_date = None
+    doc.payer_name = 'ООО "Ромашка"'
+    doc.payer_inn = '7701234567'
+    doc.recipient_name = 'ИП Иванов'
+    doc.summa = 100.5 + index
+    doc.purpose = f'Оплата по счету {index}'
+    doc.file_path = 'input/test.pdf'
+    doc.file_hash = 'abc'
+    doc.page_number = index
+    return doc
+
+
+def test_to_record_matches_schema_types():
+    doc = make_document(7)
+    row = create_rows([doc])[0]
+    record = to_record(row, doc.page_number)
+    assert record['number'] == 7
+    assert record['admission_date'] == date(2024, 2, 1)
+    assert record['debited_date'] is None
+    assert record['summa'] == Decimal('107.50')
+    assert record['page_number'] == 7
+    assert record['unique_identifier'] == bd.make_unique_identifier(row['number'], row['admission_date'],
+                                                                    row['payer_name'], row['recipient_name'])
+
+
+def test_partition_name():
+    assert partition_name({'admission_date': date(2024, 2, 1)}) == 'admission_month=2024-02'
+    assert partition_name({'admission_date': None}) == f'admission_month={NULL_PARTITION}'
+
+
+def test_write_creates_partitions(tmp_path):
+    root = str(tmp_path / 'parquet')
+    sink = ParquetSink(root)
+    documents = [make_document(1), make_document(2, '15.03.2024'), make_document(3, '')]
+    assert sink.write(documents)
+    assert sink.write([])
+
+    partitions = sorted(os.listdir(root))
+    assert partitions == ['admission_month=2024-02', 'admission_month=2024-03', f'admission_month={NULL_PARTITION}']
+    for partition in partitions:
+        files = os.listdir(os.path.join(root, partition))
+        assert len(files) == 1 and files[0].endswith('.parquet')  # Временные файлы переименованы
+    table = pq.read_table(os.path.join(root, 'admission_month=2024-03'))
+    assert table.column('number').to_pylist() == [2]
+    assert table.column('summa').to_pylist() == [Decimal('102.50')]
@@ -0,0 +1,54 @@
+# test_pdf_parser: Проверка потоковой обработки PDF файлов порциями.
+
+import os
+
+import pdf_parser
+from benchmark import generate_dataset
+
+parse_file = pdf_parser.process_pdf_file_safe
+
+
+def crash_on_first_file(filename, input_folder, backend, page_range=None, file_hash=None):
+    # Задача пула, аварийно завершающая процесс на первом файле (как при остановке по нехватке памяти).
+    if filename.endswith('0000.pdf'):
+        os._exit(1)
+    return parse_file(filename, input_folder, backend, page_range, file_hash)
+
+
+def test_chunks_respect_file_boundaries():
+    parsed = [('a.pdf', [1, 2, 3]), ('b.pdf', None), ('c.pdf', []), ('d.pdf', [4, 5])]
+    chunks = list(pdf_parser.iter_document_chunks(iter(parsed), chunk_size=2))
+    # Файл считается завершенным в порции с его последним документом; файл с ошибкой не завершается
+    assert chunks == [([1, 2], []), ([3, 4], ['a.pdf', 'c.pdf']), ([5], ['d.pdf'])]
+
+
+def test_parallel_streaming_matches_sequential(tmp_path):
+    folder = str(tmp_path / 'input')
+    generate_dataset(folder, 3, 3)
+    sequential = [(doc.unique_identifier, doc.number, doc.page_number, doc.file_path)
+                  for doc in pdf_parser.iter_documents(folder, workers=1)]
+    parallel = [(doc.unique_identifier, doc.number, doc.page_number, doc.file_path)
+                for doc in pdf_parser.iter_documents(folder, workers=2)]
+    assert len(sequential) == 9
+    assert parallel == sequential
+
+
+def test_broken_pool_is_replaced(tmp_path, monkeypatch):
+    folder = str(tmp_path / 'input')
+    generate_dataset(folder, 8, 1)
+    monkeypatch.setattr(pdf_parser, 'process_pdf_file_safe', crash_on_first_file)  # Процессы пула создаются fork
+    results = dict(pdf_parser.iter_parsed_files(folder, workers=2))
+    assert len(results) == 8
+    assert results['payment_orders_0000.pdf'] is None  # Файлы в работе в пуле при сбое считаются необработанными
+    # Файлы, поставленные после сбоя, разбираются в новом пуле
+    assert [doc.number for doc in results['payment_orders_0007.pdf']] == ['8']
+
+
+def test_pdfminer_backend_matches_pdfplumber(tmp_path):
+    folder = str(tmp_path / 'input')
+    generate_dataset(folder, 2, 3)
+    summary = pdf_parser.compare_backends(folder, 'pdfplumber', 'pdfminer')
+    assert summary['files'] == 2
+    assert summary['pages'] == 6
+    assert summary['mismatched_pages'] == 0
+    assert summary['field_mismatches'] == {}
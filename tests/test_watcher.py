@@ -0,0 +1,53 @@
+# test_watcher: Проверка режима службы: обнаружение файлов и архивов, повторная обработка после ошибки.
+
+import os
+import zipfile
+
+import watcher
+from benchmark import generate_dataset
+from manifest import Manifest
+from watcher import WatchService
+
+
+def drain(service):
+    # Обработка всех файлов очереди в текущем потоке.
+    service.queue.put(None)
+    service.consume(None)
+
+
+def test_scan_handles_archives_and_retries_failed_files(tmp_path, monkeypatch):
+    folder = tmp_path / 'input'
+    generate_dataset(str(folder), 2, 1)
+    with zipfile.ZipFile(folder / 'batch.zip', 'w') as archive:
+        archive.write(folder / 'payment_orders_0001.pdf', 'inner/doc.pdf')
+    os.remove(folder / 'payment_orders_0001.pdf')
+    monkeypatch.setattr(watcher, 'RETRY_SECONDS', 0)
+
+    calls, failing = [], {'batch.zip!/inner/doc.pdf'}
+
+    def handle_documents(filename, documents):
+        calls.append(filename)
+        if filename in failing:
+            failing.remove(filename)  # Первое сохранение файла архива завершается ошибкой
+            return False
+        return True
+
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite3'))
+    service = WatchService(str(folder), handle_documents, settle_seconds=0, manifest=manifest, use_inotify=False)
+    service.scan_folder()
+    service.enqueue_ready()  # Подпись файлов запоминается
+    service.enqueue_ready()  # Запись завершена: файлы ставятся в очередь
+    drain(service)
+    assert sorted(calls) == ['batch.zip!/inner/doc.pdf', 'payment_orders_0000.pdf']
+    assert not manifest.is_unchanged(str(folder / 'batch.zip!/inner/doc.pdf'))
+    assert manifest.is_unchanged(str(folder / 'payment_orders_0000.pdf'))
+
+    service.scan_folder()
+    service.enqueue_ready()  # Файлы не изменились и повторно не ставятся
+    assert service.queue.empty()
+    service.enqueue_retries()  # Файл с ошибкой ставится повторно после паузы
+    drain(service)
+    assert calls[2:] == ['batch.zip!/inner/doc.pdf']
+    assert manifest.is_unchanged(str(folder / 'batch.zip!/inner/doc.pdf'))
+    assert service.retry_at == {} and service.attempts == {}
+    manifest.close()
@@ -0,0 +1,47 @@
+# test_work_queue: Проверка распределенной обработки несколькими процессами с общей базой SQLite.
+
+import time
+
+from sqlalchemy import func, select
+
+import bd
+import work_queue
+from benchmark import generate_dataset
+from metrics import metrics
+
+FILES, PAGES = 6, 2
+
+
+def test_local_workers_reclaim_expired_lease_and_process_each_file_once(tmp_path):
+    folder = tmp_path / 'input'
+    generate_dataset(str(folder), FILES, PAGES)
+    url = f"sqlite:///{tmp_path / 'queue.db'}"
+    engine = bd.get_engine(url)
+    assert work_queue.register_files(engine, str(folder)) == FILES
+    assert work_queue.register_files(engine, str(folder)) == 0  # Повторная регистрация не дублирует файлы
+
+    # Обработчик захватил файл и завершился аварийно: аренда истекает, файл должен забрать другой обработчик
+    abandoned, _ = work_queue.claim(engine, 'crashed-worker', lease_seconds=0.2)
+    time.sleep(0.3)
+
+    metrics.reset()
+    metrics.set_enabled()
+    try:
+        counts = work_queue.run_local_workers(None, url, processes=3, lease_seconds=30, poll_interval=0.1)
+        completed = metrics.snapshot()['counters'].get('queue.completed')
+    finally:
+        metrics.set_enabled(False)
+        metrics.reset()
+
+    assert counts == {work_queue.DONE: FILES}
+    assert completed == FILES  # Каждый файл завершен ровно одним обработчиком
+    items = bd.WorkItem.__table__
+    documents = bd.Document.__table__
+    with engine.connect() as connection:
+        attempts = dict(connection.execute(select(items.c.file_hash, items.c.attempts)).all())
+        per_file = dict(connection.execute(select(documents.c.file_hash, func.count())
+                                           .group_by(documents.c.file_hash)).all())
+    assert attempts.pop(abandoned) == 2
+    assert set(attempts.values()) == {1}
+    assert len(per_file) == FILES and set(per_file.values()) == {PAGES}
+    engine.dispose()
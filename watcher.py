@@ -0,0 +1,348 @@
+# watcher: Режим службы с наблюдением за папкой входящих PDF файлов.
+# Новые файлы обнаруживаются через inotify (Linux) или периодическим опросом папки,
+# выдерживаются до окончания записи и передаются на обработку через ограниченную очередь.
+# Архивы ZIP и tar.gz в папке обрабатываются как в pdf_parser.get_pdf_files: в очередь ставится каждый PDF файл
+# архива. Файл, который не удалось разобрать или сохранить, обрабатывается повторно с растущей паузой.
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import signal
+import struct
+import threading
+import time
+
+import pdf_parser
+from sources import ARCHIVE_SEPARATOR, archive_reader, is_archive, split_archive_path
+
+RETRY_SECONDS = 30        # Пауза перед первой повторной обработкой файла после ошибки
+RETRY_MAX_SECONDS = 3600  # Наибольшая пауза между повторными обработками; пауза удваивается с каждой попыткой
+# Константы inotify из <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    # Получение событий о закрытии и перемещении файлов в папку через inotify.
+
+    def __init__(self, folder):
+        # Аргументы:
+        #   folder (str): Наблюдаемая папка.
+
+        # Исключения:
+        #   OSError: inotify недоступен в системе.
+
+        libc_name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify недоступен")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Ошибка inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"Ошибка inotify_add_watch для {folder}")
+
+    def poll(self, timeout):
+        # Ожидание событий в течение timeout секунд.
+        # Аргументы:
+        #   timeout (float): Время ожидания в секундах.
+
+        # Возвращает:
+        #   tuple: Список имен измененных файлов и признак переполнения очереди событий
+
+        names, overflow = [], False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return names, overflow
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names, overflow
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                names.append(os.fsdecode(name))
+        return names, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+def is_watched(name):
+    # Файл, обрабатываемый службой: PDF файл или архив с PDF файлами.
+    return name.lower().endswith('.pdf') or is_archive(name)
+
+
+class Debouncer:
+    # Отслеживание файлов до окончания записи: файл готов, когда его размер и время изменения
+    # не менялись в течение settle_seconds.
+
+    def __init__(self, settle_seconds):
+        self.settle_seconds = settle_seconds
+        self.pending = {}  # Ключ - путь к файлу, значение - ((размер, время изменения), момент последнего изменения)
+
+    def touch(self, path):
+        self.pending.setdefault(path, None)
+
+    def ready(self, now):
+        # Выбор файлов, запись которых завершена.
+        # Аргументы:
+        #   now (float): Текущее значение time.monotonic().
+
+        # Возвращает:
+        #   list: Пути к готовым файлам
+
+        ready = []
+        for path, state in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]  # Файл удален или перемещен до окончания записи
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if state is None or state[0] != signature:
+                self.pending[path] = (signature, now)
+            elif stat.st_size and now - state[1] >= self.settle_seconds:
+                ready.append(path)
+                del self.pending[path]
+        return ready
+
+
+class WatchService:
+    # Служба непрерывной обработки: наблюдение за папкой, очередь файлов и потоки обработки.
+
+    def __init__(self, input_folder, handle_documents, workers=1, queue_size=100, settle_seconds=2.0,
+                 poll_interval=1.0, manifest=None, use_inotify=True, backend=pdf_parser.DEFAULT_BACKEND, shard_pages=0):
+        # Аргументы:
+        #   input_folder (str): Наблюдаемая папка с PDF файлами.
+        #   handle_documents (callable): Функция (filename, documents) -> bool для сохранения документов файла;
+        #                                возвращает True, если документы сохранены.
+        #   workers (int): Количество одновременно обрабатываемых файлов; при workers > 1 разбор идет в пуле процессов.
+        #   queue_size (int): Максимальное количество файлов в очереди на обработку.
+        #   settle_seconds (float): Время без изменений файла, после которого запись считается завершенной.
+        #   poll_interval (float): Период опроса папки и проверки готовности файлов в секундах.
+        #   manifest (Manifest): Журнал обработанных файлов.
+        #   use_inotify (bool): Использовать inotify, если он доступен.
+        #   backend (str): Название способа чтения PDF.
+        #   shard_pages (int): При workers > 1 файлы больше shard_pages страниц разбираются частями в нескольких
+        #                      процессах; 0 - без разбиения.
+
+        self.input_folder = input_folder
+        self.handle_documents = handle_documents
+        self.workers = workers or os.cpu_count()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.debouncer = Debouncer(settle_seconds)
+        self.poll_interval = poll_interval
+        self.manifest = manifest
+        self.use_inotify = use_inotify
+        self.backend = backend
+        self.shard_pages = shard_pages
+        self.stop_event = threading.Event()
+        self.queued = set()  # Файлы в очереди или в обработке
+        self.queued_lock = threading.Lock()
+        self.seen = {}       # Подпись (размер, время изменения) файлов и архивов на момент постановки в очередь
+        self.retry_at = {}   # Файлы, обработка которых завершилась ошибкой: момент повторной обработки
+        self.attempts = {}   # Количество неудачных обработок файла подряд
+
+    def stop(self, *args):
+        # Запрос на остановку службы; может использоваться как обработчик сигнала.
+        if not self.stop_event.is_set():
+            logging.info("Получен запрос на остановку службы, завершение обработки очереди")
+        self.stop_event.set()
+
+    def scan_folder(self):
+        # Добавление в отслеживание всех PDF файлов и архивов папки, изменившихся с момента постановки в очередь.
+        with os.scandir(self.input_folder) as entries:
+            for entry in entries:
+                if not is_watched(entry.name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if self.seen.get(entry.name) != (stat.st_size, stat.st_mtime_ns):
+                    self.debouncer.touch(entry.path)
+
+    def enqueue_ready(self):
+        # Постановка в очередь файлов, запись которых завершена; для архива - всех его PDF файлов.
+        # При заполненной очереди файл (архив) остается в отслеживании до следующей попытки.
+        for path in self.debouncer.ready(time.monotonic()):
+            name = os.path.basename(path)
+            if is_archive(name):
+                try:
+                    filenames = [f"{name}{ARCHIVE_SEPARATOR}{member}" for member in archive_reader.list_pdfs(path)]
+                except Exception as e:
+                    # Архив обрабатывается снова, когда изменится
+                    logging.error(f"Не удалось прочитать архив {name}: {e}")
+                    self.remember(name, path)
+                    continue
+            else:
+                with self.queued_lock:
+                    if name in self.queued:
+                        self.debouncer.touch(path)  # Файл изменился во время обработки: повторная обработка позже
+                        continue
+                filenames = [name]
+            if all(self.enqueue(filename) for filename in filenames):
+                self.remember(name, path)
+            else:
+                self.debouncer.touch(path)  # Поставленные файлы архива при следующей попытке пропускаются
+
+    def enqueue(self, filename):
+        # Постановка файла (или файла архива) в очередь, если он еще не в работе и изменился по журналу.
+        # Возвращает:
+        #   bool: False, если очередь заполнена
+
+        with self.queued_lock:
+            if filename in self.queued:
+                return True
+            self.queued.add(filename)  # До постановки: поток обработки может взять файл сразу
+        if self.manifest is None or not self.manifest.is_unchanged(os.path.join(self.input_folder, filename)):
+            try:
+                self.queue.put_nowait(filename)
+                logging.info(f"Файл {filename} поставлен в очередь на обработку ({self.queue.qsize()} в очереди)")
+                return True
+            except queue.Full:
+                result = False
+        else:
+            result = True
+        with self.queued_lock:
+            self.queued.discard(filename)
+        return result
+
+    def schedule_retry(self, filename):
+        # Повторная обработка файла после ошибки; пауза удваивается с каждой неудачной попыткой.
+        with self.queued_lock:
+            attempts = self.attempts.get(filename, 0) + 1
+            self.attempts[filename] = attempts
+            delay = min(RETRY_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+            self.retry_at[filename] = time.monotonic() + delay
+        logging.warning(f"Файл {filename} будет обработан повторно через {delay:.0f} с (попытка {attempts + 1})")
+
+    def enqueue_retries(self):
+        # Постановка в очередь файлов, время повторной обработки которых наступило.
+        now = time.monotonic()
+        with self.queued_lock:
+            due = [filename for filename, retry_at in self.retry_at.items() if retry_at <= now]
+        for filename in due:
+            path, _ = split_archive_path(os.path.join(self.input_folder, filename))
+            if not os.path.exists(path):
+                with self.queued_lock:
+                    self.retry_at.pop(filename, None)  # Файл удален: повторять нечего
+                    self.attempts.pop(filename, None)
+                continue
+            if self.enqueue(filename):
+                with self.queued_lock:
+                    self.retry_at.pop(filename, None)
+
+    def remember(self, filename, path):
+        try:
+            stat = os.stat(path)
+            self.seen[filename] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            self.seen.pop(filename, None)
+
+    def consume(self, pool):
+        # Поток обработки: разбор файлов из очереди и сохранение документов до получения признака остановки.
+        # Файл, который не удалось разобрать или сохранить, не отмечается в журнале и обрабатывается повторно.
+        while True:
+            filename = self.queue.get()
+            try:
+                if filename is None:
+                    return
+                if self.process(pool, filename):
+                    with self.queued_lock:
+                        self.attempts.pop(filename, None)
+                else:
+                    self.schedule_retry(filename)
+            finally:
+                with self.queued_lock:
+                    self.queued.discard(filename)
+                self.queue.task_done()
+
+    def process(self, pool, filename):
+        # Разбор и сохранение одного файла.
+        # Возвращает:
+        #   bool: True, если документы файла сохранены
+
+        try:
+            path = os.path.join(self.input_folder, filename)
+            file_hash = self.manifest.capture(path) if self.manifest is not None else None
+            if pool is not None:
+                _, documents = pdf_parser.pdf_file_shards_result(filename, pool.submit(
+                    filename, self.input_folder, self.backend, self.shard_pages, file_hash))
+            else:
+                _, documents = pdf_parser.process_pdf_file_safe(filename, self.input_folder, self.backend,
+                                                                file_hash=file_hash)
+            if documents is None or not self.handle_documents(filename, documents):
+                return False
+            if self.manifest is not None:
+                self.manifest.mark_processed([path])
+            return True
+        except Exception as e:
+            logging.error(f"Ошибка при обработке файла {filename} в режиме службы: {e}")
+            return False
+
+    def run(self):
+        # Запуск службы до получения SIGINT/SIGTERM или вызова stop().
+        # Файлы, уже поставленные в очередь, обрабатываются до конца перед выходом; файлы, запись которых
+        # не завершилась, не попадают в журнал и будут обработаны при следующем запуске.
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        watcher = None
+        if self.use_inotify:
+            try:
+                watcher = InotifyWatcher(self.input_folder)
+                logging.info(f"Наблюдение за папкой {self.input_folder} через inotify")
+            except OSError as e:
+                logging.warning(f"inotify недоступен ({e}), используется опрос папки")
+        if watcher is None:
+            logging.info(f"Наблюдение за папкой {self.input_folder} опросом каждые {self.poll_interval} с")
+
+        pool = pdf_parser.ParserPool(self.workers) if self.workers > 1 else None
+        consumers = [threading.Thread(target=self.consume, args=(pool,), name=f"pdf-consumer-{i}")
+                     for i in range(self.workers)]
+        for consumer in consumers:
+            consumer.start()
+
+        try:
+            self.scan_folder()  # Файлы, появившиеся до запуска службы
+            while not self.stop_event.is_set():
+                if watcher is not None:
+                    names, overflow = watcher.poll(self.poll_interval)
+                    if overflow:
+                        self.scan_folder()
+                    for name in names:
+                        if is_watched(name):
+                            self.debouncer.touch(os.path.join(self.input_folder, name))
+                else:
+                    self.stop_event.wait(self.poll_interval)
+                    self.scan_folder()
+                self.enqueue_ready()
+                self.enqueue_retries()
+        finally:
+            if watcher is not None:
+                watcher.close()
+            for _ in consumers:
+                self.queue.put(None)  # Признак остановки после уже поставленных в очередь файлов
+            for consumer in consumers:
+                consumer.join()
+            if pool is not None:
+                pool.shutdown()
+            logging.info("Служба остановлена")
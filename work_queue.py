@@ -0,0 +1,281 @@
+# work_queue: Распределенная обработка PDF файлов на нескольких узлах через общую таблицу work_queue.
+# Файлы регистрируются в очереди по хешу содержимого, обработчики на любых узлах забирают их с арендой
+# на ограниченное время и продлевают аренду во время обработки. Если обработчик завершился аварийно,
+# аренда истекает и файл забирает другой обработчик; файл, на котором обработчики падают
+# MAX_ATTEMPTS раз подряд, помечается как failed. Захват выполняется условным UPDATE (сравнение
+# с текущим состоянием строки), поэтому одинаково работает в MySQL и SQLite.
+# Время аренды отсчитывается по часам узлов, поэтому часы узлов должны быть синхронизированы (NTP);
+# расхождение должно быть заметно меньше срока аренды.
+
+import logging
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+
+from sqlalchemy import and_, case, func, or_, select, update
+
+import bd
+import pdf_parser
+from file_store import file_sha256
+from metrics import metrics
+from persistence import create_persist
+
+LEASE_SECONDS = 300    # Срок аренды файла
+POLL_INTERVAL = 5.0    # Пауза между попытками получить файл из пустой очереди
+MAX_ATTEMPTS = 3       # Количество попыток обработки файла до пометки failed
+
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+
+work_items = bd.WorkItem.__table__
+
+
+def default_worker_id():
+    # Имя обработчика: узел и номер процесса.
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def register_files(engine, input_folder):
+    # Постановка PDF файлов папки в очередь; файлы с уже зарегистрированным содержимым пропускаются.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок общей базы данных.
+    #   input_folder (str): Папка с PDF файлами, доступная всем узлам по тому же пути.
+
+    # Возвращает:
+    #   int: Количество новых файлов в очереди
+
+    bd.ensure_schema(engine, bd.QUEUE_TABLES)
+    folder = os.path.abspath(input_folder)
+    rows = [{'file_hash': file_sha256(os.path.join(folder, filename)), 'path': os.path.join(folder, filename),
+             'status': PENDING, 'attempts': 0, 'updated_at': time.time()}
+            for filename in pdf_parser.get_pdf_files(folder)]
+    if not rows:
+        return 0
+    with engine.begin() as connection:
+        added = bd.insert_new_rows(connection, work_items, rows, 'file_hash')
+    logging.info(f"Зарегистрировано в очереди файлов: {added} из {len(rows)}")
+    return added
+
+
+def claim(engine, worker_id, lease_seconds=LEASE_SECONDS):
+    # Захват одного файла: ожидающего обработки или с истекшей арендой.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок общей базы данных.
+    #   worker_id (str): Имя обработчика.
+    #   lease_seconds (float): Срок аренды.
+
+    # Возвращает:
+    #   tuple или None: Хеш и путь захваченного файла или None, если свободных файлов нет
+
+    now = time.time()
+    available = or_(work_items.c.status == PENDING,
+                    and_(work_items.c.status == LEASED, work_items.c.lease_expires < now))
+    with engine.begin() as connection:
+        candidates = connection.execute(
+            select(work_items.c.file_hash, work_items.c.path, work_items.c.attempts)
+            .where(available).order_by(work_items.c.updated_at).limit(8)).all()
+    for file_hash, path, attempts in candidates:
+        if attempts >= MAX_ATTEMPTS:
+            # Аренда истекла после последней попытки: обработчики падают на этом файле
+            with engine.begin() as connection:
+                connection.execute(update(work_items).where(work_items.c.file_hash == file_hash, available)
+                                   .values(status=FAILED, owner=None, lease_expires=None, updated_at=now,
+                                           last_error="Аренда истекла после последней попытки"))
+            logging.error(f"Файл {path} помечен как необработанный после {attempts} попыток")
+            continue
+        with engine.begin() as connection:
+            # Условие available повторяется в UPDATE: файл получает только тот обработчик, чей UPDATE изменил строку
+            claimed = connection.execute(
+                update(work_items).where(work_items.c.file_hash == file_hash, available)
+                .values(status=LEASED, owner=worker_id, lease_expires=now + lease_seconds,
+                        attempts=work_items.c.attempts + 1, updated_at=now)).rowcount
+        if claimed:
+            metrics.incr('queue.claimed')
+            return file_hash, path
+    return None
+
+
+def owned(worker_id, file_hash):
+    # Условие строки, аренда которой принадлежит обработчику.
+    return and_(work_items.c.file_hash == file_hash, work_items.c.status == LEASED, work_items.c.owner == worker_id)
+
+
+def heartbeat(engine, worker_id, file_hash, lease_seconds=LEASE_SECONDS):
+    # Продление аренды файла.
+    # Возвращает:
+    #   bool: False, если аренда потеряна (истекла и передана другому обработчику)
+
+    now = time.time()
+    with engine.begin() as connection:
+        return bool(connection.execute(update(work_items).where(owned(worker_id, file_hash))
+                                       .values(lease_expires=now + lease_seconds, updated_at=now)).rowcount)
+
+
+def complete(engine, worker_id, file_hash):
+    # Отметка успешной обработки файла.
+    # Возвращает:
+    #   bool: False, если аренда была потеряна до завершения
+
+    with engine.begin() as connection:
+        return bool(connection.execute(update(work_items).where(owned(worker_id, file_hash))
+                                       .values(status=DONE, lease_expires=None, updated_at=time.time())).rowcount)
+
+
+def release(engine, worker_id, file_hash, error):
+    # Возврат файла в очередь после ошибки или пометка failed после MAX_ATTEMPTS попыток.
+    # Возвращает:
+    #   None
+
+    exhausted = work_items.c.attempts >= MAX_ATTEMPTS
+    with engine.begin() as connection:
+        connection.execute(update(work_items).where(owned(worker_id, file_hash)).values(
+            status=case((exhausted, FAILED), else_=PENDING), owner=None, lease_expires=None,
+            last_error=str(error)[:1024], updated_at=time.time()))
+
+
+def queue_counts(engine):
+    # Количество файлов по состояниям.
+    with engine.connect() as connection:
+        return dict(connection.execute(select(work_items.c.status, func.count()).group_by(work_items.c.status)).all())
+
+
+class Lease:
+    # Продление аренды файла в фоновом потоке на время обработки.
+
+    def __init__(self, engine, worker_id, file_hash, lease_seconds=LEASE_SECONDS):
+        self.engine = engine
+        self.worker_id = worker_id
+        self.file_hash = file_hash
+        self.lease_seconds = lease_seconds
+        self.stop_event = threading.Event()
+        self.lost = threading.Event()
+        self.thread = threading.Thread(target=self.renew, name='lease-heartbeat', daemon=True)
+
+    def renew(self):
+        # Продление через каждую треть срока аренды; ошибка соединения не прерывает обработку файла,
+        # аренда считается потерянной, только если ее продлить уже нельзя.
+        while not self.stop_event.wait(self.lease_seconds / 3):
+            try:
+                if not heartbeat(self.engine, self.worker_id, self.file_hash, self.lease_seconds):
+                    logging.warning(f"Аренда файла {self.file_hash} потеряна обработчиком {self.worker_id}")
+                    metrics.incr('queue.lease_lost')
+                    self.lost.set()
+                    return
+            except Exception as e:
+                logging.error(f"Ошибка продления аренды файла {self.file_hash}: {e}")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+        return False
+
+
+def run_worker(engine, persist, worker_id=None, backend=pdf_parser.DEFAULT_BACKEND, lease_seconds=LEASE_SECONDS,
+               poll_interval=POLL_INTERVAL, stop_event=None, exit_when_empty=True):
+    # Цикл обработчика: захват файла, разбор, сохранение документов и отметка в очереди.
+    # Аргументы:
+    #   engine (sqlalchemy.engine.Engine): Движок общей базы данных.
+    #   persist (callable): Функция (documents) -> bool сохранения документов файла.
+    #   worker_id (str): Имя обработчика; по умолчанию узел и номер процесса.
+    #   backend (str): Название способа чтения PDF.
+    #   lease_seconds (float): Срок аренды.
+    #   poll_interval (float): Пауза между попытками получить файл из пустой очереди.
+    #   stop_event (threading.Event): Событие остановки после текущего файла.
+    #   exit_when_empty (bool): Завершиться, когда в очереди не останется ожидающих и арендованных файлов.
+
+    # Возвращает:
+    #   int: Количество обработанных файлов
+
+    worker_id = worker_id or default_worker_id()
+    bd.ensure_schema(engine, bd.QUEUE_TABLES)
+    processed = 0
+    while stop_event is None or not stop_event.is_set():
+        item = claim(engine, worker_id, lease_seconds)
+        if item is None:
+            counts = queue_counts(engine)
+            if exit_when_empty and not counts.get(PENDING) and not counts.get(LEASED):
+                break
+            time.sleep(poll_interval)  # Файлы в аренде у других обработчиков: ждать завершения или истечения
+            continue
+        file_hash, path = item
+        folder, filename = os.path.split(path)
+        with Lease(engine, worker_id, file_hash, lease_seconds) as lease:
+            _, documents = pdf_parser.process_pdf_file_safe(filename, folder, backend, file_hash=file_hash)
+            saved = documents is not None and persist(documents)
+        if not saved:
+            release(engine, worker_id, file_hash, "Ошибка обработки или сохранения файла")
+            metrics.incr('queue.released')
+            continue
+        if complete(engine, worker_id, file_hash):
+            processed += 1
+            metrics.incr('queue.completed')
+        elif lease.lost.is_set():
+            # Документы уже сохранены; повторная обработка другим обработчиком только пропустит дубликаты
+            logging.warning(f"Файл {path} обработан после потери аренды")
+    logging.info(f"Обработчик {worker_id} завершен, обработано файлов: {processed}")
+    return processed
+
+
+def worker_process(con_string, worker_number, batch_size, backend, lease_seconds, poll_interval, parquet_dir,
+                   normalized, results):
+    # Точка входа процесса обработчика для run_local_workers; движок и соединения создаются в самом процессе.
+    # Метрики процесса передаются основному процессу через очередь results.
+    bd.dispose_engines(close=False)  # Соединения, унаследованные от родителя, не используются
+    engine = bd.get_engine(con_string)
+    persist, _ = create_persist(con_string, batch_size, parquet_dir=parquet_dir, normalized=normalized)
+    metrics.reset()
+    try:
+        run_worker(engine, persist, f"{default_worker_id()}#{worker_number}", backend, lease_seconds, poll_interval)
+    finally:
+        results.put(metrics.snapshot())
+
+
+def run_local_workers(input_folder, con_string, processes=2, batch_size=1000, backend=pdf_parser.DEFAULT_BACKEND,
+                      lease_seconds=LEASE_SECONDS, poll_interval=POLL_INTERVAL, parquet_dir=None,
+                      normalized=False):
+    # Регистрация файлов папки (если задана) и запуск нескольких обработчиков на этом узле до опустошения очереди.
+    # На других узлах запускается то же самое с той же базой данных; файлы делятся между всеми обработчиками.
+    # Аргументы:
+    #   input_folder (str): Папка с PDF файлами; None - только обработка уже зарегистрированных файлов.
+    #   con_string (str): Строка подключения к общей базе данных.
+    #   processes (int): Количество процессов-обработчиков на этом узле.
+    #   batch_size (int): Количество строк в одном пакете вставки.
+    #   backend (str): Название способа чтения PDF.
+    #   lease_seconds (float): Срок аренды.
+    #   poll_interval (float): Пауза между попытками получить файл из пустой очереди.
+    #   parquet_dir (str): Папка набора Parquet для документов; None - запись в ту же базу данных.
+    #   normalized (bool): Нормализованное хранение документов (см. normalized).
+
+    # Возвращает:
+    #   dict: Количество файлов в очереди по состояниям после завершения обработчиков
+
+    engine = bd.get_engine(con_string)
+    if input_folder:
+        register_files(engine, input_folder)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker_process, name=f"queue-worker-{number}",
+                                       args=(con_string, number, batch_size, backend, lease_seconds,
+                                             poll_interval, parquet_dir, normalized, results))
+               for number in range(processes)]
+    for worker in workers:
+        worker.start()
+    finished = 0
+    while finished < len(workers):
+        # Метрики читаются до join: процесс не завершается, пока его данные не забраны из очереди
+        try:
+            metrics.merge(results.get(timeout=1))
+            finished += 1
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers) and results.empty():
+                break  # Аварийно завершившийся процесс метрик не передает
+    for worker in workers:
+        worker.join()
+    counts = queue_counts(engine)
+    logging.info(f"Очередь: {', '.join(f'{status} {count}' for status, count in sorted(counts.items()))}")
+    return counts